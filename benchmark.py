@@ -0,0 +1,254 @@
+"""Воспроизводимый замер производительности запросов проекта.
+
+Для каждого масштаба база заполняется генератором (generate_empolyyees.py, массовая загрузка
+с фиксированным сидом), после чего каждая форма запроса CLI и оконного приложения выполняется
+заданное число раз. Результат - JSON с задержками p50/p95/p99 и пропускной способностью;
+его можно сравнить с сохраненным базовым результатом.
+
+    python benchmark.py --scales 50000,500000 --output bench.json --baseline bench_baseline.json
+
+Замер пересоздает базу, поэтому по умолчанию используется отдельная база employees_bench.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import psycopg2
+
+import db
+import db_schema
+import employees_cli
+from db_schema import EMPLOYEES_QUERY, HIERARCHY_CHILDREN_QUERY
+
+DEFAULT_SCALES = [50000, 500000, 5000000]
+
+# Фильтры команды list: по одному на каждое поле и оператор
+LIST_FILTERS = [
+    ["id<=1000"],
+    ["salary>250000"],
+    ["salary<=60000"],
+    ["boss_id=2"],
+    ["boss_id!=2"],
+    ["hire_date>2023-06-01"],
+    ["position=Тимлид"],
+    ["full_name>=Я"],
+    ["salary>250000", "hire_date>2023-06-01"],
+]
+
+# Запросы изменения данных, как в командах add, update, delete
+ADD_QUERY = """
+    INSERT INTO employees (full_name, position, hire_date, salary, boss_id)
+    VALUES (%s, %s, %s, %s, %s)
+    RETURNING id
+"""
+UPDATE_QUERY = "UPDATE employees SET salary = %s WHERE id = %s"
+DELETE_QUERY = "DELETE FROM employees WHERE id = %s"
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу (values отсортированы)"""
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(latencies, rows):
+    """Статистика задержек одной формы запроса (мс) и пропускная способность (запросов/с)"""
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        "runs": len(latencies),
+        "rows": rows,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(total / len(latencies) * 1000, 3),
+        "throughput_qps": round(len(latencies) / total, 1) if total else None
+    }
+
+
+def read_shapes(scale):
+    """Формы запросов чтения: (название, запрос, параметры)"""
+    shapes = []
+    # CLI: list с каждой сортировкой (страница) и каждым фильтром (весь результат)
+    for sort_by in employees_cli.EMPLOYEE_COLUMNS:
+        query, params = employees_cli.build_list_query(sort_by, None, 100)
+        shapes.append((f"cli: list --sort {sort_by} --limit 100", query, params))
+    for filters in LIST_FILTERS:
+        query, params = employees_cli.build_list_query("id", filters)
+        shapes.append(("cli: list " + " ".join(f"--filter {f}" for f in filters), query, params))
+
+    # Оконное приложение: количество, первая и последняя страница виртуальной таблицы
+    # (последняя читается с конца результата), страница по ключу строки соседней загруженной страницы
+    shapes += [
+        ("gui: количество записей", "SELECT count(*) FROM employees e", None),
+        ("gui: первая страница", EMPLOYEES_QUERY + " ORDER BY e.id LIMIT %s OFFSET %s", (100, 0)),
+        ("gui: последняя страница", EMPLOYEES_QUERY + " ORDER BY e.id DESC LIMIT %s OFFSET %s", (100, 0)),
+        ("gui: страница после загруженной",
+         EMPLOYEES_QUERY + " WHERE e.id > %s ORDER BY e.id LIMIT %s OFFSET %s", (scale // 2, 100, 0)),
+        ("gui: страница, сортировка по зарплате",
+         EMPLOYEES_QUERY + " ORDER BY e.salary DESC, e.id LIMIT %s OFFSET %s", (100, 0)),
+        ("gui: страница, фильтр по должности",
+         EMPLOYEES_QUERY + " WHERE e.position ILIKE %s ORDER BY e.id LIMIT %s OFFSET %s", ("%Тимлид%", 100, 0)),
+        ("gui: корень окна иерархии", HIERARCHY_CHILDREN_QUERY + " WHERE e.id = %s", (2,)),
+        ("gui: прямые подчиненные в окне иерархии",
+         HIERARCHY_CHILDREN_QUERY + " WHERE e.boss_id = %s ORDER BY e.id", (2,)),
+    ]
+    # Формы запросов из отчета EXPLAIN (в том числе рекурсивные CTE подчиненных и иерархии)
+    shapes += [("explain: " + name, query, params) for name, query, params in db_schema.QUERY_SHAPES]
+    return shapes
+
+
+def time_reads(conn, shapes, repeat, warmup):
+    """Замер запросов чтения; выполняются так же, как в приложении (через кэш подготовленных запросов)"""
+    results = {}
+    with conn.cursor() as cursor:
+        for name, query, params in shapes:
+            latencies = []
+            rows = 0
+            try:
+                for run in range(warmup + repeat):
+                    started = time.perf_counter()
+                    db.execute_prepared(cursor, query, params)
+                    rows = len(cursor.fetchall())
+                    elapsed = time.perf_counter() - started
+                    conn.rollback()
+                    if run >= warmup:
+                        latencies.append(elapsed)
+            except psycopg2.Error as e:
+                conn.rollback()
+                results[name] = {"error": str(e).strip()}
+                print(f"  {name}: ошибка - {str(e).strip()}")
+                continue
+            results[name] = summarize(latencies, rows)
+            print(f"  {name}: p50 {results[name]['p50_ms']} мс, p99 {results[name]['p99_ms']} мс")
+    return results
+
+
+def time_writes(conn, repeat):
+    """Замер добавления, изменения и удаления одного сотрудника (каждое - отдельная транзакция)"""
+    latencies = {"cli: add": [], "cli: update": [], "cli: delete": []}
+    with conn.cursor() as cursor:
+        for run in range(repeat):
+            started = time.perf_counter()
+            db.execute_prepared(cursor, ADD_QUERY, ("Замер Производительности", "Разработчик", "2024-01-15", 80000, 2))
+            new_id = cursor.fetchone()[0]
+            conn.commit()
+            latencies["cli: add"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            db.execute_prepared(cursor, UPDATE_QUERY, (80000 + run, new_id))
+            conn.commit()
+            latencies["cli: update"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            db.execute_prepared(cursor, DELETE_QUERY, (new_id,))
+            conn.commit()
+            latencies["cli: delete"].append(time.perf_counter() - started)
+    return {name: summarize(values, 1) for name, values in latencies.items()}
+
+
+def seed_database(scale, seed, workers, reuse):
+    """Заполнение базы генератором; при reuse база с нужным количеством строк не пересоздается"""
+    import generate_empolyyees  # Имя базы генератор берет из окружения при импорте
+
+    if reuse:
+        try:
+            with db.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("SELECT count(*) FROM employees")
+                if cursor.fetchone()[0] == scale:
+                    print(f"База уже содержит {scale} сотрудников, заполнение пропущено")
+                    return
+        except psycopg2.Error:
+            pass  # Базы или таблицы еще нет
+    # Генератор пересоздает базу - соединения пула к старой базе закрываются
+    db.close_pool()
+    generate_empolyyees.generate_employees_bulk(scale, 50000, workers, seed)
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Сравнение p50 с базовым результатом, возвращает количество замедлений больше tolerance"""
+    regressions = 0
+    for scale, shapes in results.items():
+        for name, stats in shapes.items():
+            base = baseline.get("results", {}).get(scale, {}).get(name)
+            if not base or "p50_ms" not in base or "p50_ms" not in stats or not base["p50_ms"]:
+                continue
+            ratio = stats["p50_ms"] / base["p50_ms"]
+            if ratio > 1 + tolerance:
+                regressions += 1
+                mark = "МЕДЛЕННЕЕ"
+            elif ratio < 1 - tolerance:
+                mark = "быстрее"
+            else:
+                continue
+            print(f"{mark}: [{scale}] {name}: {base['p50_ms']} -> {stats['p50_ms']} мс ({ratio:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер производительности запросов")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)),
+                        help="Количество сотрудников через запятую")
+    parser.add_argument("--repeat", type=int, default=20, help="Количество замеров каждого запроса")
+    parser.add_argument("--warmup", type=int, default=2, help="Количество прогревочных запусков")
+    parser.add_argument("--seed", type=int, default=42, help="Сид генератора данных")
+    parser.add_argument("--workers", type=int, default=1, help="Количество процессов генератора")
+    parser.add_argument("--dbname", default="employees_bench", help="База для замера (пересоздается)")
+    parser.add_argument("--reuse", action="store_true",
+                        help="Не пересоздавать базу, если в ней уже нужное количество сотрудников")
+    parser.add_argument("--output", default="bench.json", help="Файл результатов JSON")
+    parser.add_argument("--baseline", help="Базовый результат для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Допустимое замедление p50 относительно базового результата (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    # Генератор и пул соединений берут имя базы из окружения
+    os.environ[db.ENV_VARIABLES["dbname"]] = args.dbname
+
+    scales = [int(scale) for scale in args.scales.split(",")]
+    results = {}
+    for scale in scales:
+        print(f"Масштаб {scale}: заполнение базы {args.dbname}")
+        seed_database(scale, args.seed, args.workers, args.reuse)
+        with db.connection() as conn:
+            print(f"Масштаб {scale}: запросы чтения")
+            shape_results = time_reads(conn, read_shapes(scale), args.repeat, args.warmup)
+            print(f"Масштаб {scale}: добавление, изменение, удаление")
+            shape_results.update(time_writes(conn, args.repeat))
+            with conn.cursor() as cursor:
+                cursor.execute("SHOW server_version")
+                server_version = cursor.fetchone()[0]
+            conn.rollback()
+        results[str(scale)] = shape_results
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "scales": scales,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "postgres": server_version,
+            "python": platform.python_version(),
+            "platform": platform.platform()
+        },
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(report, output, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        print(f"Замедлений больше {args.tolerance:.0%}: {regressions}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""Общий слой доступа к БД для CLI, оконного приложения и генератора данных.
+
+Параметры подключения берутся (по возрастанию приоритета) из значений по умолчанию,
+файла db_config.ini (секция [database], путь можно задать в EMPLOYEES_DB_CONFIG)
+и переменных окружения EMPLOYEES_DB_NAME, EMPLOYEES_DB_USER, EMPLOYEES_DB_PASSWORD,
+EMPLOYEES_DB_HOST, EMPLOYEES_DB_PORT.
+"""
+import atexit
+import configparser
+import os
+import queue
+import re
+import select
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import errorcodes, extensions, pool
+
+# Параметры подключения по умолчанию
+DEFAULT_CONFIG = {
+    "dbname": "employees_db",
+    "user": "postgres",
+    "password": None,  # Пароль из db_config.ini, окружения или ~/.pgpass
+    "host": "localhost",
+    "port": "5432"
+}
+
+# Соответствие параметров подключения переменным окружения
+ENV_VARIABLES = {
+    "dbname": "EMPLOYEES_DB_NAME",
+    "user": "EMPLOYEES_DB_USER",
+    "password": "EMPLOYEES_DB_PASSWORD",
+    "host": "EMPLOYEES_DB_HOST",
+    "port": "EMPLOYEES_DB_PORT"
+}
+
+CONFIG_FILE = os.environ.get(
+    "EMPLOYEES_DB_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "db_config.ini"))
+
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 10
+# Соединение, простаивавшее дольше этого времени (с), проверяется запросом SELECT 1 перед выдачей
+HEALTH_CHECK_INTERVAL = 30
+# Количество подготовленных запросов, хранимых на сервере для одного соединения
+STATEMENT_CACHE_SIZE = 64
+
+_pool = None
+_pool_lock = threading.Lock()
+_statement_caches = weakref.WeakSet()  # Кэши всех открытых соединений (для общей статистики)
+_schema_generation = 0  # Увеличивается после изменения схемы: подготовленные запросы устаревают
+
+
+class StatementCache:
+    """LRU-кэш запросов, подготовленных на сервере (PREPARE/EXECUTE), для одного соединения.
+
+    Ключ - текст запроса с параметрами %s, то есть форма запроса: набор полей и операторов
+    фильтра и поле сортировки; значения передаются параметрами и в ключ не входят.
+    """
+
+    def __init__(self, capacity=STATEMENT_CACHE_SIZE):
+        self.capacity = capacity
+        self.statements = OrderedDict()  # Текст запроса -> имя подготовленного запроса
+        self.counter = 0  # Счетчик для уникальных имен
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = _schema_generation
+        _statement_caches.add(self)
+
+    def execute(self, cursor, query, params=()):
+        """Выполнение запроса через EXECUTE; при первом обращении запрос подготавливается"""
+        if not isinstance(query, str):
+            query = query.as_string(cursor)  # sql.Composed
+        # Первый запрос транзакции можно повторить после отката, ничего не потеряв
+        first_in_transaction = cursor.connection.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+        if self.generation != _schema_generation:
+            # Схема изменилась (migrate): запросы, подготовленные до изменения, удаляются на сервере
+            cursor.execute("DEALLOCATE ALL")
+            self.clear()
+            self.generation = _schema_generation
+        try:
+            self.run(cursor, query, params)
+        except psycopg2.Error as e:
+            # Схему изменил другой процесс: "cached plan must not change result type"
+            if e.pgcode != errorcodes.FEATURE_NOT_SUPPORTED or query not in self.statements:
+                raise
+            name = self.statements.pop(query)
+            if not first_in_transaction:
+                raise  # Запрос будет подготовлен заново при следующем выполнении
+            cursor.connection.rollback()
+            cursor.execute(f"DEALLOCATE {name}")
+            self.run(cursor, query, params)
+
+    def run(self, cursor, query, params):
+        """Подготовка (при первом обращении) и выполнение запроса"""
+        name = self.statements.get(query)
+        if name is not None:
+            self.hits += 1
+            self.statements.move_to_end(query)
+        else:
+            self.misses += 1
+            if len(self.statements) >= self.capacity:
+                _, evicted = self.statements.popitem(last=False)
+                cursor.execute(f"DEALLOCATE {evicted}")
+                self.evictions += 1
+            self.counter += 1
+            name = f"employees_stmt_{self.counter}"
+            cursor.execute(f"PREPARE {name} AS {to_positional(query)}")
+            self.statements[query] = name
+
+        if params:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", tuple(params))
+        else:
+            cursor.execute(f"EXECUTE {name}")
+
+    def clear(self):
+        """Запросы на сервере потеряны (например, после DISCARD ALL)"""
+        self.statements.clear()
+
+
+def invalidate_statements():
+    """Изменение схемы: каждое соединение заново подготовит запросы при следующем выполнении"""
+    global _schema_generation
+    _schema_generation += 1
+
+
+class EmployeesConnection(extensions.connection):
+    """Соединение с временем последнего использования для проверки перед выдачей из пула"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_used = time.monotonic()
+        # Подготовленные запросы живут до конца сессии и сохраняются при возврате соединения в пул
+        self.statements = StatementCache()
+
+
+def to_positional(query):
+    """Замена параметров %s на $1, $2, ... для PREPARE (%% - литерал %)"""
+    numbers = iter(range(1, query.count("%s") + 1))
+    return re.sub(r"%[s%]", lambda match: "%" if match.group() == "%%" else f"${next(numbers)}", query)
+
+
+def load_config():
+    """Параметры подключения с учетом файла конфигурации и переменных окружения"""
+    config = dict(DEFAULT_CONFIG)
+
+    parser = configparser.ConfigParser()
+    if parser.read(CONFIG_FILE, encoding="utf-8") and parser.has_section("database"):
+        for key in DEFAULT_CONFIG:
+            if parser.has_option("database", key):
+                config[key] = parser.get("database", key)
+
+    for key, variable in ENV_VARIABLES.items():
+        if os.environ.get(variable):
+            config[key] = os.environ[variable]
+
+    return {key: value for key, value in config.items() if value is not None}
+
+
+def connect(**overrides):
+    """Отдельное соединение вне пула (например, к системной БД postgres)"""
+    params = load_config()
+    params.update(overrides)
+    return psycopg2.connect(connection_factory=EmployeesConnection, **params)
+
+
+def get_pool():
+    """Пул соединений процесса (создается при первом обращении)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pool.ThreadedConnectionPool(
+                POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS,
+                connection_factory=EmployeesConnection, **load_config())
+        return _pool
+
+
+def is_healthy(conn):
+    """Проверка, что соединение живо"""
+    if conn.closed:
+        return False
+    if time.monotonic() - conn.last_used < HEALTH_CHECK_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        return False
+
+
+def get_connection():
+    """Соединение из пула; разорванные соединения заменяются новыми"""
+    connection_pool = get_pool()
+    # Попыток на одну больше размера пула: все соединения в нем могут оказаться разорванными
+    for _ in range(POOL_MAX_CONNECTIONS + 1):
+        conn = connection_pool.getconn()
+        if is_healthy(conn):
+            return conn
+        connection_pool.putconn(conn, close=True)  # Переподключение при следующей выдаче
+    raise psycopg2.OperationalError("Не удалось получить рабочее соединение с базой данных")
+
+
+def release_connection(conn):
+    """Возврат соединения в пул; незавершенная транзакция откатывается"""
+    if conn.closed:
+        get_pool().putconn(conn, close=True)
+        return
+    try:
+        if conn.status != extensions.STATUS_READY:
+            conn.rollback()
+        conn.last_used = time.monotonic()
+        get_pool().putconn(conn)
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        get_pool().putconn(conn, close=True)
+
+
+def copy_value(value):
+    """Экранирование значения для текстового формата COPY"""
+    if value is None:
+        return "\\N"  # NULL в формате COPY
+    text = value.isoformat() if hasattr(value, "isoformat") else str(value)
+    return (text.replace("\\", "\\\\")
+                .replace("\t", "\\t")
+                .replace("\n", "\\n")
+                .replace("\r", "\\r"))
+
+
+def execute_prepared(cursor, query, params=()):
+    """Выполнение запроса через кэш подготовленных запросов соединения курсора"""
+    cursor.connection.statements.execute(cursor, query, params)
+
+
+def statement_cache_stats():
+    """Суммарные счетчики кэшей подготовленных запросов: попадания, промахи, вытеснения"""
+    caches = list(_statement_caches)
+    return {
+        "hits": sum(cache.hits for cache in caches),
+        "misses": sum(cache.misses for cache in caches),
+        "evictions": sum(cache.evictions for cache in caches),
+        "statements": sum(len(cache.statements) for cache in caches),
+    }
+
+
+class NotificationListener:
+    """Прием уведомлений NOTIFY на отдельном соединении вне пула в фоновом потоке.
+
+    Полученные payload складываются в очередь notifications; при разрыве соединения
+    поток переподключается через reconnect_interval секунд.
+    """
+
+    def __init__(self, channel, reconnect_interval=5):
+        self.channel = channel
+        self.reconnect_interval = reconnect_interval
+        self.notifications = queue.Queue()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            conn = None
+            try:
+                conn = connect()
+                conn.autocommit = True  # LISTEN действует сразу, без фиксации транзакции
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                while not self.stopped.is_set():
+                    # Ожидание данных на сокете соединения с таймаутом для проверки остановки
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.notifications.put(conn.notifies.pop(0).payload)
+            except (psycopg2.Error, OSError):
+                self.stopped.wait(self.reconnect_interval)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+
+    def stop(self):
+        """Остановка потока"""
+        self.stopped.set()
+
+
+@contextmanager
+def connection():
+    """Соединение из пула на время блока with"""
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+
+
+def close_pool():
+    """Закрытие всех соединений пула"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+
+
+atexit.register(close_pool)
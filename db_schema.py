@@ -0,0 +1,518 @@
+import re  # Разбор времени выполнения из планов EXPLAIN
+from datetime import datetime  # Отметка времени отчета
+
+import psycopg2  # Библиотека для работы с PostgreSQL
+
+import db  # Сброс кэша подготовленных запросов после миграций
+
+# Заполнение путей в иерархии для всех строк (после загрузки с отключенными триггерами)
+PATH_BACKFILL = """
+    WITH RECURSIVE tree AS (
+        SELECT id, text2ltree(id::text) AS path
+        FROM employees
+        WHERE boss_id IS NULL
+        UNION ALL
+        SELECT e.id, t.path || text2ltree(e.id::text)
+        FROM employees e
+        INNER JOIN tree t ON e.boss_id = t.id
+    )
+    UPDATE employees e SET path = tree.path FROM tree WHERE e.id = tree.id
+"""
+
+# Количество и фонд оплаты труда всех подчиненных (включая непрямых) каждого руководителя
+SUBTREE_PAYROLL = """
+    SELECT ltree2text(subpath(e.path, g.level, 1))::integer AS manager_id,
+           count(*) AS subordinates,
+           sum(e.salary) AS subordinates_payroll
+    FROM employees e
+    CROSS JOIN LATERAL generate_series(0, nlevel(e.path) - 2) AS g(level)
+    GROUP BY 1
+"""
+
+
+def refresh_subtree_payroll(cursor):
+    """Пересчет представления employees_subtree_payroll после массовой загрузки (если миграция 004 применена)"""
+    cursor.execute("SELECT to_regclass('employees_subtree_payroll')")
+    if cursor.fetchone()[0] is not None:
+        cursor.execute("REFRESH MATERIALIZED VIEW employees_subtree_payroll")
+
+
+# Поиск по ФИО: нечеткое совпадение слов (pg_trgm, оператор <%) или совпадение словоформ
+# (полнотекстовый поиск со словарем russian). Оба условия проверяются по GIN-индексам миграции 005.
+# Параметры: строка поиска дважды.
+NAME_SEARCH_CONDITION = (
+    "(%s <%% e.full_name OR to_tsvector('russian', e.full_name) @@ plainto_tsquery('russian', %s))"
+)
+
+# Лучшие совпадения по ФИО: оценка - наибольшая из похожести слов и ранга полнотекстового поиска.
+# Параметры: строка поиска трижды и количество строк.
+NAME_SEARCH_QUERY = """
+    SELECT e.id, e.full_name, e.position, e.hire_date, e.salary, e.boss_id,
+           round(greatest(word_similarity(%s, e.full_name),
+                          ts_rank(to_tsvector('russian', e.full_name), plainto_tsquery('russian', %s)))::numeric,
+                 3) AS score
+    FROM employees e
+    WHERE """ + NAME_SEARCH_CONDITION + """
+    ORDER BY score DESC, e.id
+    LIMIT %s
+"""
+
+
+def name_search_params(text, limit=None):
+    """Параметры NAME_SEARCH_QUERY (или NAME_SEARCH_CONDITION, если limit не задан)"""
+    if limit is None:
+        return text, text
+    return text, text, text, text, limit
+
+
+# Уведомления об изменении строк: команда, изменившая не больше стольких строк, присылает
+# уведомление на каждую строку, иначе - одно уведомление {"op": "reload"}
+ROW_NOTIFY_LIMIT = 100
+
+
+def row_json(alias):
+    """JSON строки сотрудника с именем руководителя (колонки таблицы оконного приложения)"""
+    return (f"json_build_object('id', {alias}.id, 'full_name', {alias}.full_name, 'position', {alias}.position, "
+            f"'hire_date', {alias}.hire_date, 'salary', {alias}.salary, "
+            f"'boss_name', (SELECT b.full_name FROM employees b WHERE b.id = {alias}.boss_id), "
+            f"'boss_id', {alias}.boss_id)")
+
+
+# Параметр сеанса, отключающий построчные триггеры путей на время команды reorg (миграция 007)
+REORG_SETTING = "employees.reorg"
+
+
+# Миграции схемы применяются по порядку и учитываются в таблице schema_migrations.
+# Каждая миграция - список SQL-команд; команды с CREATE INDEX выполняются
+# с CONCURRENTLY, если миграция запущена на работающей базе.
+MIGRATIONS = [
+    ("001_filter_sort_indexes", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        # Рекурсивные запросы по иерархии соединяют таблицу по boss_id
+        "CREATE INDEX {concurrently} IF NOT EXISTS employees_boss_id_idx ON employees (boss_id)",
+        # Фильтры и сортировки по зарплате и дате приема (id - для однозначного порядка и keyset-пагинации)
+        "CREATE INDEX {concurrently} IF NOT EXISTS employees_salary_id_idx ON employees (salary, id)",
+        "CREATE INDEX {concurrently} IF NOT EXISTS employees_hire_date_id_idx ON employees (hire_date, id)",
+        # Фильтр position ILIKE '%...%' в оконном приложении
+        "CREATE INDEX {concurrently} IF NOT EXISTS employees_position_trgm_idx "
+        "ON employees USING gin (position gin_trgm_ops)",
+    ]),
+    # Материализованный путь в иерархии (ltree): путь сотрудника - ID всех его руководителей
+    # от CEO и его собственный ID, например 1.4.57.812. Поддерево руководителя X - это
+    # все строки с path <@ path(X), что проверяется одним предикатом по GiST-индексу.
+    ("002_hierarchy_path", [
+        "CREATE EXTENSION IF NOT EXISTS ltree",
+        "ALTER TABLE employees ADD COLUMN IF NOT EXISTS path ltree",
+        # Заполнение путей для уже существующих строк
+        PATH_BACKFILL,
+        # Путь новой строки или строки со сменой руководителя строится из пути руководителя
+        """
+        CREATE OR REPLACE FUNCTION employees_set_path() RETURNS trigger AS $$
+        DECLARE
+            parent_path ltree;
+        BEGIN
+            IF NEW.boss_id IS NULL THEN
+                NEW.path := text2ltree(NEW.id::text);
+            ELSE
+                SELECT path INTO parent_path FROM employees WHERE id = NEW.boss_id;
+                IF parent_path IS NULL THEN
+                    RAISE EXCEPTION 'Руководитель с ID % не найден', NEW.boss_id
+                        USING ERRCODE = 'foreign_key_violation';
+                END IF;
+                NEW.path := parent_path || text2ltree(NEW.id::text);
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        # После смены руководителя переносим все поддерево: меняется только префикс путей
+        """
+        CREATE OR REPLACE FUNCTION employees_move_subtree() RETURNS trigger AS $$
+        BEGIN
+            UPDATE employees
+            SET path = NEW.path || subpath(path, nlevel(OLD.path))
+            WHERE path <@ OLD.path AND id <> NEW.id;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS employees_path_insert ON employees",
+        """
+        CREATE TRIGGER employees_path_insert
+        BEFORE INSERT ON employees
+        FOR EACH ROW EXECUTE FUNCTION employees_set_path()
+        """,
+        "DROP TRIGGER IF EXISTS employees_path_update ON employees",
+        """
+        CREATE TRIGGER employees_path_update
+        BEFORE UPDATE OF boss_id ON employees
+        FOR EACH ROW WHEN (OLD.boss_id IS DISTINCT FROM NEW.boss_id)
+        EXECUTE FUNCTION employees_set_path()
+        """,
+        "DROP TRIGGER IF EXISTS employees_path_subtree ON employees",
+        """
+        CREATE TRIGGER employees_path_subtree
+        AFTER UPDATE OF boss_id ON employees
+        FOR EACH ROW WHEN (OLD.path IS DISTINCT FROM NEW.path)
+        EXECUTE FUNCTION employees_move_subtree()
+        """,
+        # Удаление отдельного триггера не требует: внешний ключ boss_id не дает удалить
+        # руководителя, у которого есть подчиненные, поэтому пути остальных строк не меняются
+        "CREATE INDEX {concurrently} IF NOT EXISTS employees_path_gist_idx ON employees USING gist (path)",
+    ]),
+    # Уведомление клиентов об изменении таблицы: одно на команду, payload - PID изменившего сеанса,
+    # чтобы клиент мог пропустить собственные изменения. Одинаковые уведомления в транзакции
+    # PostgreSQL объединяет, поэтому пакетная загрузка дает одно уведомление на транзакцию.
+    ("003_change_notify", [
+        """
+        CREATE OR REPLACE FUNCTION employees_notify_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('employees_changed', pg_backend_pid()::text);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS employees_notify_change ON employees",
+        """
+        CREATE TRIGGER employees_notify_change
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON employees
+        FOR EACH STATEMENT EXECUTE FUNCTION employees_notify_change()
+        """,
+    ]),
+    # Фонд оплаты труда поддерева каждого руководителя (для report --subtree). Каждый сотрудник
+    # учитывается у всех руководителей из своего пути, поэтому все поддеревья считаются одним
+    # проходом по таблице. Представление обновляется командой report --subtree --refresh.
+    ("004_subtree_payroll_view", [
+        "CREATE MATERIALIZED VIEW IF NOT EXISTS employees_subtree_payroll AS " + SUBTREE_PAYROLL,
+        # Уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+        "CREATE UNIQUE INDEX IF NOT EXISTS employees_subtree_payroll_manager_idx "
+        "ON employees_subtree_payroll (manager_id)",
+    ]),
+    # Поиск по ФИО (search в CLI, поле "Поиск по ФИО" в оконном приложении): триграммы для
+    # нечеткого совпадения и опечаток, полнотекстовый индекс - для словоформ (Иванов, Иванова).
+    # Выражение индекса должно совпадать с выражением в NAME_SEARCH_CONDITION.
+    ("005_name_search", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX {concurrently} IF NOT EXISTS employees_full_name_trgm_idx "
+        "ON employees USING gin (full_name gin_trgm_ops)",
+        "CREATE INDEX {concurrently} IF NOT EXISTS employees_full_name_tsv_idx "
+        "ON employees USING gin (to_tsvector('russian', full_name))",
+    ]),
+    # Уведомления об изменении отдельных строк (вместо одного уведомления на команду из миграции 003):
+    # payload - JSON {"pid", "op": insert|update|delete, "id", "old", "new"} со строкой до и после изменения,
+    # поэтому оконное приложение обновляет таблицу без запросов к БД. Строки команды берутся из таблиц
+    # переходов (REFERENCING), массовые изменения присылают одно уведомление {"op": "reload"}.
+    # Изменения, не затрагивающие колонок таблицы (например, перенос path поддерева), не присылаются.
+    ("006_row_change_notify", [
+        f"""
+        CREATE OR REPLACE FUNCTION employees_notify_rows() RETURNS trigger AS $$
+        DECLARE
+            changed bigint;
+            payload text;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT count(*) INTO changed FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT count(*) INTO changed FROM old_rows;
+            ELSE
+                SELECT count(*) INTO changed
+                FROM new_rows n INNER JOIN old_rows o ON o.id = n.id
+                WHERE (n.full_name, n.position, n.hire_date, n.salary, n.boss_id)
+                      IS DISTINCT FROM (o.full_name, o.position, o.hire_date, o.salary, o.boss_id);
+            END IF;
+
+            IF changed = 0 THEN
+                RETURN NULL;
+            ELSIF changed > {ROW_NOTIFY_LIMIT} THEN
+                PERFORM pg_notify('employees_changed',
+                                  json_build_object('pid', pg_backend_pid(), 'op', 'reload')::text);
+                RETURN NULL;
+            END IF;
+
+            IF TG_OP = 'INSERT' THEN
+                FOR payload IN
+                    SELECT json_build_object('pid', pg_backend_pid(), 'op', 'insert', 'id', n.id,
+                                             'new', {row_json("n")})::text
+                    FROM new_rows n
+                LOOP
+                    PERFORM pg_notify('employees_changed', payload);
+                END LOOP;
+            ELSIF TG_OP = 'DELETE' THEN
+                FOR payload IN
+                    SELECT json_build_object('pid', pg_backend_pid(), 'op', 'delete', 'id', o.id,
+                                             'old', {row_json("o")})::text
+                    FROM old_rows o
+                LOOP
+                    PERFORM pg_notify('employees_changed', payload);
+                END LOOP;
+            ELSE
+                FOR payload IN
+                    SELECT json_build_object('pid', pg_backend_pid(), 'op', 'update', 'id', n.id,
+                                             'old', {row_json("o")}, 'new', {row_json("n")})::text
+                    FROM new_rows n INNER JOIN old_rows o ON o.id = n.id
+                    WHERE (n.full_name, n.position, n.hire_date, n.salary, n.boss_id)
+                          IS DISTINCT FROM (o.full_name, o.position, o.hire_date, o.salary, o.boss_id)
+                LOOP
+                    PERFORM pg_notify('employees_changed', payload);
+                END LOOP;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        # Таблицы переходов допускаются только в триггерах на одно событие
+        "DROP TRIGGER IF EXISTS employees_notify_change ON employees",
+        "DROP TRIGGER IF EXISTS employees_notify_insert ON employees",
+        """
+        CREATE TRIGGER employees_notify_insert
+        AFTER INSERT ON employees REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION employees_notify_rows()
+        """,
+        "DROP TRIGGER IF EXISTS employees_notify_update ON employees",
+        """
+        CREATE TRIGGER employees_notify_update
+        AFTER UPDATE ON employees REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION employees_notify_rows()
+        """,
+        "DROP TRIGGER IF EXISTS employees_notify_delete ON employees",
+        """
+        CREATE TRIGGER employees_notify_delete
+        AFTER DELETE ON employees REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION employees_notify_rows()
+        """,
+        # После TRUNCATE - прежнее уведомление с PID сеанса (клиенты перезагружают таблицу)
+        "DROP TRIGGER IF EXISTS employees_notify_truncate ON employees",
+        """
+        CREATE TRIGGER employees_notify_truncate
+        AFTER TRUNCATE ON employees
+        FOR EACH STATEMENT EXECUTE FUNCTION employees_notify_change()
+        """,
+    ]),
+    # Защита иерархии: руководителем нельзя назначить самого сотрудника или его подчиненного
+    # (иначе рекурсивные запросы иерархии не завершаются). Команда reorg переносит пути сама,
+    # одним запросом для всех перемещений, поэтому при установленном employees.reorg = on
+    # построчные триггеры путей не срабатывают.
+    ("007_hierarchy_guard", [
+        """
+        CREATE OR REPLACE FUNCTION employees_set_path() RETURNS trigger AS $$
+        DECLARE
+            parent_path ltree;
+        BEGIN
+            IF NEW.boss_id IS NULL THEN
+                NEW.path := text2ltree(NEW.id::text);
+            ELSE
+                SELECT path INTO parent_path FROM employees WHERE id = NEW.boss_id;
+                IF parent_path IS NULL THEN
+                    RAISE EXCEPTION 'Руководитель с ID % не найден', NEW.boss_id
+                        USING ERRCODE = 'foreign_key_violation';
+                END IF;
+                IF TG_OP = 'UPDATE' AND parent_path <@ OLD.path THEN
+                    RAISE EXCEPTION 'Сотрудник % не может подчиняться своему подчиненному %', NEW.id, NEW.boss_id
+                        USING ERRCODE = 'check_violation';
+                END IF;
+                NEW.path := parent_path || text2ltree(NEW.id::text);
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS employees_path_update ON employees",
+        f"""
+        CREATE TRIGGER employees_path_update
+        BEFORE UPDATE OF boss_id ON employees
+        FOR EACH ROW WHEN (OLD.boss_id IS DISTINCT FROM NEW.boss_id
+                           AND current_setting('{REORG_SETTING}', true) IS DISTINCT FROM 'on')
+        EXECUTE FUNCTION employees_set_path()
+        """,
+        "DROP TRIGGER IF EXISTS employees_path_subtree ON employees",
+        f"""
+        CREATE TRIGGER employees_path_subtree
+        AFTER UPDATE OF boss_id ON employees
+        FOR EACH ROW WHEN (OLD.path IS DISTINCT FROM NEW.path
+                           AND current_setting('{REORG_SETTING}', true) IS DISTINCT FROM 'on')
+        EXECUTE FUNCTION employees_move_subtree()
+        """,
+    ]),
+    # Сортировка таблицы оконного приложения по ФИО и должности: текст сравнивается побайтово
+    # (COLLATE "C"), в том же порядке, что и строки Python при сортировке загруженного результата
+    ("008_text_sort_indexes", [
+        'CREATE INDEX {concurrently} IF NOT EXISTS employees_full_name_c_id_idx ON employees (full_name COLLATE "C", id)',
+        'CREATE INDEX {concurrently} IF NOT EXISTS employees_position_c_id_idx ON employees (position COLLATE "C", id)',
+    ]),
+]
+
+# Канал уведомлений об изменениях таблицы employees (миграция 003_change_notify)
+CHANGE_CHANNEL = "employees_changed"
+
+# Колонки таблицы employees, выводимые командой list (без служебной колонки path)
+EMPLOYEE_COLUMNS = ["id", "full_name", "position", "hire_date", "salary", "boss_id"]
+
+# Запросы оконного приложения здесь, а не в prog_man_db.py: benchmark.py использует их без tkinter.
+# Основной запрос таблицы сотрудников с именем руководителя
+# (boss_id не отображается - нужен для обновления имени руководителя у загруженных строк)
+EMPLOYEES_QUERY = """
+  SELECT e.id, e.full_name, e.position, e.hire_date, e.salary,
+         b.full_name AS boss_name, e.boss_id
+  FROM employees e
+  LEFT JOIN employees b ON e.boss_id = b.id
+  """
+
+# Сотрудники с количеством прямых подчиненных (для ленивой загрузки окна иерархии)
+HIERARCHY_CHILDREN_QUERY = """
+  SELECT e.id, e.full_name, e.position,
+         (SELECT count(*) FROM employees c WHERE c.boss_id = e.id) AS subordinates
+  FROM employees e
+  """
+
+# Запрос команды list без условий и сортировки
+LIST_QUERY = f"SELECT {', '.join(EMPLOYEE_COLUMNS)} FROM employees"
+
+# Формы запросов CLI и оконного приложения для отчета EXPLAIN ANALYZE:
+# (название, запрос, параметры)
+QUERY_SHAPES = [
+    ("cli: list --sort salary --limit 100",
+     LIST_QUERY + " ORDER BY salary, id LIMIT 100", None),
+    ("cli: list --sort salary --limit 100 --after",
+     LIST_QUERY + " WHERE (salary, id) > (%s, %s) ORDER BY salary, id LIMIT 100", (200000, 0)),
+    ("cli: list --filter salary>250000 --sort hire_date",
+     LIST_QUERY + " WHERE salary > %s ORDER BY hire_date, id", (250000,)),
+    ("cli: list --filter boss_id=2",
+     LIST_QUERY + " WHERE boss_id = %s ORDER BY id", (2,)),
+    ("cli: list --filter hire_date>'2023-06-01'",
+     LIST_QUERY + " WHERE hire_date > %s ORDER BY id", ("2023-06-01",)),
+    ("gui: количество записей (Должность)",
+     "SELECT count(*) FROM employees e WHERE e.position ILIKE %s", ("%Тимлид%",)),
+    ("gui: страница (Должность)",
+     "SELECT e.id, e.full_name, e.position, e.hire_date, e.salary, b.full_name AS boss_name "
+     "FROM employees e LEFT JOIN employees b ON e.boss_id = b.id "
+     "WHERE e.position ILIKE %s ORDER BY e.id LIMIT 100 OFFSET 0", ("%Тимлид%",)),
+    ("gui: страница (Зарплата между, сортировка по зарплате)",
+     "SELECT e.id, e.full_name, e.position, e.hire_date, e.salary, b.full_name AS boss_name "
+     "FROM employees e LEFT JOIN employees b ON e.boss_id = b.id "
+     "WHERE e.salary BETWEEN %s AND %s ORDER BY e.salary DESC, e.id LIMIT 100 OFFSET 0", (100000, 120000)),
+    ("gui: страница (Дата приема >, сортировка по дате)",
+     "SELECT e.id, e.full_name, e.position, e.hire_date, e.salary, b.full_name AS boss_name "
+     "FROM employees e LEFT JOIN employees b ON e.boss_id = b.id "
+     "WHERE e.hire_date > %s ORDER BY e.hire_date ASC, e.id LIMIT 100 OFFSET 0", ("2023-01-01",)),
+    ("gui: подчиненные руководителя (WITH RECURSIVE subordinates)",
+     "WITH RECURSIVE subordinates AS ("
+     " SELECT id FROM employees WHERE boss_id = %s"
+     " UNION ALL"
+     " SELECT e.id FROM employees e INNER JOIN subordinates s ON e.boss_id = s.id"
+     ") SELECT id FROM subordinates", (2,)),
+    ("gui: подчиненные руководителя (ltree path)",
+     "SELECT count(*) FROM employees e "
+     "WHERE e.path <@ (SELECT path FROM employees WHERE id = %s) AND e.id <> %s", (2, 2)),
+    ("gui: окно иерархии (прямые подчиненные с количеством)",
+     "SELECT e.id, e.full_name, e.position,"
+     " (SELECT count(*) FROM employees c WHERE c.boss_id = e.id) AS subordinates"
+     " FROM employees e WHERE e.boss_id = %s ORDER BY e.id", (7,)),
+    ("gui: окно иерархии (WITH RECURSIVE employee_hierarchy)",
+     "WITH RECURSIVE employee_hierarchy AS ("
+     " SELECT id, full_name, position, boss_id, 1 AS level FROM employees WHERE id = %s"
+     " UNION ALL"
+     " SELECT e.id, e.full_name, e.position, e.boss_id, eh.level + 1"
+     " FROM employees e INNER JOIN employee_hierarchy eh ON e.boss_id = eh.id"
+     ") SELECT id, full_name, position, boss_id, level FROM employee_hierarchy ORDER BY level, id", (7,)),
+    ("cli: search Иванов --limit 20",
+     NAME_SEARCH_QUERY, name_search_params("Иванов", 20)),
+    ("gui: количество записей (Поиск по ФИО)",
+     "SELECT count(*) FROM employees e WHERE " + NAME_SEARCH_CONDITION, name_search_params("Иванов")),
+    ("cli: report --by position",
+     "SELECT position, count(*), sum(salary), round(avg(salary)),"
+     " percentile_cont(0.5) WITHIN GROUP (ORDER BY salary)"
+     " FROM employees GROUP BY position ORDER BY position", None),
+]
+
+
+def ensure_migrations_table(cursor):
+    """Создание таблицы учета примененных миграций"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name TEXT PRIMARY KEY,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def pending_migrations(cursor):
+    """Миграции, которые еще не применены"""
+    ensure_migrations_table(cursor)
+    cursor.execute("SELECT name FROM schema_migrations")
+    applied = {row[0] for row in cursor.fetchall()}
+    return [(name, statements) for name, statements in MIGRATIONS if name not in applied]
+
+
+def migrate(conn, concurrently=False):
+    """Применение всех непримененных миграций, возвращает список их названий.
+
+    При concurrently=True индексы строятся без блокировки записи (CREATE INDEX CONCURRENTLY),
+    для этого команды выполняются вне транзакции.
+    """
+    applied = []
+    with conn.cursor() as cursor:
+        pending = pending_migrations(cursor)
+        conn.commit()
+
+        conn.autocommit = concurrently
+        try:
+            for name, statements in pending:
+                for statement in statements:
+                    cursor.execute(statement.replace("{concurrently}", "CONCURRENTLY" if concurrently else ""))
+                cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+                if not concurrently:
+                    conn.commit()  # Каждая миграция - отдельная транзакция
+                applied.append(name)
+            cursor.execute("ANALYZE employees")
+            conn.commit()
+        except Exception:
+            if not conn.autocommit:
+                conn.rollback()
+            raise
+        finally:
+            conn.autocommit = False
+            if applied:
+                # Запросы, подготовленные до миграции (например, SELECT * до колонки path), устарели
+                db.invalidate_statements()
+    return applied
+
+
+def explain_query_shapes(conn):
+    """EXPLAIN (ANALYZE, BUFFERS) для каждой формы запроса: {название: (время мс, план)}"""
+    results = {}
+    with conn.cursor() as cursor:
+        for name, query, params in QUERY_SHAPES:
+            try:
+                cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+            except psycopg2.Error as e:
+                # Форма может требовать еще не примененной миграции (например, колонки path)
+                conn.rollback()
+                results[name] = (None, f"Ошибка: {e}")
+                continue
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+            match = re.search(r"Execution Time: ([\d.]+) ms", plan)
+            results[name] = (float(match.group(1)) if match else None, plan)
+            conn.rollback()
+    return results
+
+
+def format_explain_report(before, after, applied):
+    """Отчет в формате Markdown: время выполнения и планы до и после миграции"""
+    lines = [
+        "# Отчет EXPLAIN ANALYZE до и после миграции индексов",
+        "",
+        f"Дата: {datetime.now():%Y-%m-%d %H:%M}",
+        f"Примененные миграции: {', '.join(applied) or 'нет (схема уже актуальна)'}",
+        "",
+        "| Запрос | До, мс | После, мс | Ускорение |",
+        "|---|---:|---:|---:|",
+    ]
+    for name, _, _ in QUERY_SHAPES:
+        before_ms, after_ms = before[name][0], after[name][0]
+        speedup = f"{before_ms / after_ms:.1f}x" if before_ms and after_ms else "-"
+        lines.append(f"| {name} | {before_ms} | {after_ms} | {speedup} |")
+
+    for name, _, _ in QUERY_SHAPES:
+        lines += ["", f"## {name}", "", "До:", "", "```", before[name][1], "```",
+                  "", "После:", "", "```", after[name][1], "```"]
+    return "\n".join(lines) + "\n"
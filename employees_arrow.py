@@ -0,0 +1,204 @@
+"""Двоичный формат выгрузки таблицы employees: файл Arrow IPC (Feather v2).
+
+Строки выгружаются пакетами (record batch) из серверного курсора, должности кодируются
+словарем (пополняемым от пакета к пакету). Несжатый файл читается с отображением в память
+без копирования, поэтому CLI может фильтровать выгрузку, не обращаясь к БД.
+"""
+import io
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+import db_schema
+
+# Типы колонок соответствуют типам в PostgreSQL, поэтому значения восстанавливаются без потерь
+SCHEMA = pa.schema([
+    pa.field("id", pa.int32(), nullable=False),
+    pa.field("full_name", pa.string(), nullable=False),
+    pa.field("position", pa.dictionary(pa.int16(), pa.string()), nullable=False),
+    pa.field("hire_date", pa.date32(), nullable=False),
+    pa.field("salary", pa.int32(), nullable=False),
+    pa.field("boss_id", pa.int32()),
+])
+COLUMNS = SCHEMA.names
+COMPRESSIONS = ["none", "lz4", "zstd"]
+
+EXPORT_QUERY = "SELECT id, full_name, position, hire_date, salary, boss_id FROM employees ORDER BY id"
+
+# Операторы фильтров CLI
+FILTER_OPERATORS = {
+    "=": pc.equal,
+    "!=": pc.not_equal,
+    ">": pc.greater,
+    "<": pc.less,
+    ">=": pc.greater_equal,
+    "<=": pc.less_equal
+}
+
+
+def rows_to_batch(rows, positions, codes):
+    """Пакет Arrow из строк курсора; новые должности добавляются в словарь"""
+    columns = list(zip(*rows))
+    position_codes = []
+    for position in columns[2]:
+        if position not in codes:
+            codes[position] = len(positions)
+            positions.append(position)
+        position_codes.append(codes[position])
+    arrays = [
+        pa.array(columns[0], pa.int32()),
+        pa.array(columns[1], pa.string()),
+        pa.DictionaryArray.from_arrays(pa.array(position_codes, pa.int16()), pa.array(positions, pa.string())),
+        pa.array(columns[3], pa.date32()),
+        pa.array(columns[4], pa.int32()),
+        pa.array(columns[5], pa.int32()),
+    ]
+    return pa.record_batch(arrays, schema=SCHEMA)
+
+
+def export_table(conn, path, batch_size=50000, compression="none"):
+    """Выгрузка таблицы в файл Arrow IPC пакетами из серверного курсора, возвращает число строк"""
+    options = pa.ipc.IpcWriteOptions(
+        compression=None if compression == "none" else compression,
+        emit_dictionary_deltas=True  # Словарь должностей передается приращениями
+    )
+    positions, codes = [], {}
+    count = 0
+    with conn.cursor(name="employees_export") as cursor, pa.OSFile(path, "wb") as sink:
+        cursor.itersize = batch_size
+        cursor.execute(EXPORT_QUERY)
+        with pa.ipc.new_file(sink, SCHEMA, options=options) as writer:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                writer.write_batch(rows_to_batch(rows, positions, codes))
+                count += len(rows)
+    conn.commit()
+    return count
+
+
+def read_table(path):
+    """Таблица из файла с отображением в память (несжатые буферы не копируются)"""
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def verify_table(conn, path, batch_size=50000):
+    """Сравнение файла с таблицей в БД построчно; возвращает None или описание первого расхождения"""
+    table = read_table(path)
+    with conn.cursor(name="employees_verify") as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(EXPORT_QUERY)
+        offset = 0
+        for batch in table.to_batches(batch_size):
+            file_rows = list(zip(*(batch.column(name).to_pylist() for name in COLUMNS)))
+            db_rows = cursor.fetchmany(len(file_rows))
+            for file_row, db_row in zip(file_rows, db_rows):
+                if file_row != tuple(db_row):
+                    conn.rollback()
+                    return f"строка {offset + 1}: в файле {file_row}, в БД {tuple(db_row)}"
+                offset += 1
+            if len(db_rows) < len(file_rows):
+                conn.rollback()
+                return f"в БД меньше строк, чем в файле ({offset} из {table.num_rows})"
+        if cursor.fetchone() is not None:
+            conn.rollback()
+            return f"в БД больше строк, чем в файле ({table.num_rows})"
+    conn.rollback()
+    return None
+
+
+class CsvBatchStream(io.RawIOBase):
+    """Файловый объект для COPY: CSV формируется по пакетам по мере чтения сервером"""
+
+    def __init__(self, table):
+        super().__init__()
+        self.chunks = (batch_to_csv(batch) for batch in table.to_batches())
+        self.chunk = memoryview(b"")
+        self.offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.offset >= len(self.chunk):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.chunk, self.offset = memoryview(chunk), 0
+        size = min(len(buffer), len(self.chunk) - self.offset)
+        buffer[:size] = self.chunk[self.offset:self.offset + size]
+        self.offset += size
+        return size
+
+
+def batch_to_csv(batch):
+    """CSV пакета без заголовка: словарь раскрывается в строки, NULL - пустое значение без кавычек"""
+    batch = batch.set_column(2, "position", pc.cast(batch.column("position"), pa.string()))
+    buffer = io.BytesIO()
+    pa_csv.write_csv(batch, buffer, pa_csv.WriteOptions(include_header=False))
+    return buffer.getvalue()
+
+
+def restore_table(conn, path):
+    """Замена содержимого таблицы строками из файла (COPY CSV), возвращает число строк.
+
+    Пользовательские триггеры на время загрузки отключаются, пути в иерархии
+    заполняются одним запросом после загрузки. Все выполняется в одной транзакции.
+    Все пакеты загружаются одной командой COPY: внешний ключ boss_id (системный триггер)
+    проверяется в конце команды, а руководитель может идти в файле позже подчиненного.
+    """
+    table = read_table(path)
+    with conn.cursor() as cursor:
+        cursor.execute("ALTER TABLE employees DISABLE TRIGGER USER")
+        cursor.execute("TRUNCATE employees")
+        cursor.copy_expert(
+            "COPY employees (id, full_name, position, hire_date, salary, boss_id) FROM STDIN WITH (FORMAT csv)",
+            CsvBatchStream(table))
+
+        cursor.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'employees' AND column_name = 'path'
+        """)
+        if cursor.fetchone():
+            cursor.execute(db_schema.PATH_BACKFILL)
+        cursor.execute("ALTER TABLE employees ENABLE TRIGGER USER")
+        cursor.execute("""
+            SELECT setval(pg_get_serial_sequence('employees', 'id'),
+                          greatest((SELECT max(id) FROM employees), 1))
+        """)
+        cursor.execute("SELECT count(*) FROM employees")
+        count = cursor.fetchone()[0]
+        if count != table.num_rows:
+            raise ValueError(f"загружено {count} строк из {table.num_rows}")
+        db_schema.refresh_subtree_payroll(cursor)
+        # Триггер уведомлений был отключен - сообщаем клиентам об изменении явно
+        cursor.execute("SELECT pg_notify(%s, pg_backend_pid()::text)", (db_schema.CHANGE_CHANNEL,))
+    conn.commit()
+    return count
+
+
+def filter_table(table, conditions, sort_by="id", limit=None):
+    """Фильтрация и сортировка выгрузки (как SELECT * ... ORDER BY sort_by, id), строки списком кортежей"""
+    mask = None
+    for field, op, value in conditions:
+        column = table.column(field)
+        if field == "hire_date":
+            value = pa.scalar(value).cast(pa.date32())
+        elif field == "position":
+            column = pc.cast(column, pa.string())
+        condition = FILTER_OPERATORS[op](column, value)
+        mask = condition if mask is None else pc.and_(mask, condition)
+    if mask is not None:
+        # NULL в результате сравнения (boss_id) - строка не подходит, как в SQL
+        table = table.filter(mask, null_selection_behavior="drop")
+
+    if sort_by == "position":
+        table = table.set_column(table.schema.get_field_index("position"), "position",
+                                 pc.cast(table.column("position"), pa.string()))
+    if sort_by != "id":
+        table = table.sort_by([(sort_by, "ascending"), ("id", "ascending")])
+    if limit:
+        table = table.slice(0, limit)
+    return list(zip(*(table.column(name).to_pylist() for name in COLUMNS)))
@@ -2,99 +2,380 @@ import psycopg2
 from psycopg2 import sql
 from tabulate import tabulate
 import argparse
+import base64
+import csv
+import functools
+import io
+import json
+import os
+import shlex
 import sys
+import time
+from datetime import date
 
-# Конфигурация подключения к БД
-DB_CONFIG = {
-    "dbname": "employees_db",
-    "user": "postgres",
-    "password": "_____",  # Замените на ваш пароль
-    "host": "localhost",
-    "port": "5432"
-}
+import db
+import db_schema
+import filter_lang
+import instrumentation
+import reorg
+from db_schema import EMPLOYEE_COLUMNS  # Колонки таблицы employees
 
 
 def get_connection():
-    """Установка соединения с базой данных"""
-    return psycopg2.connect(**DB_CONFIG)
+    """Соединение с базой данных из общего пула (параметры - в db_config.ini или окружении)"""
+    return db.get_connection()
 
 
-def list_employees(sort_by="id", filters=None, output_format="table"):
-    """Получение списка сотрудников с сортировкой и фильтрацией"""
+# Колонки, допускающие NULL (NULL при сортировке по возрастанию идут последними)
+NULLABLE_COLUMNS = {"boss_id"}
+
+# Каталог локального снимка таблицы по умолчанию (snapshot.py)
+DEFAULT_SNAPSHOT_PATH = "employees_snapshot"
+
+# Ширины колонок для потокового табличного вывода
+STREAM_COLUMN_WIDTHS = {
+    "id": 7,
+    "full_name": 40,
+    "position": 20,
+    "hire_date": 10,
+    "salary": 9,
+    "boss_id": 7
+}
+
+
+def parse_filters(filters):
+    """Разбор выражений --filter (соединяются AND) в дерево filter_lang (None - без фильтра).
+
+    При ошибке выводит сообщение и возвращает False.
+    """
+    try:
+        return filter_lang.parse_all(filters)
+    except filter_lang.FilterError as e:
+        print(f"Некорректный фильтр: {e}")
+        print("Пример: \"salary > 100000 AND (position IN ('Тимлид', 'Архитектор') OR under(2))\"")
+        return False
+
+
+def build_filter_conditions(filters):
+    """Разбор фильтров в SQL-условия и параметры (None при ошибке)"""
+    node = parse_filters(filters)
+    if node is False:
+        return None
+    if node is None:
+        return [], []
+
+    # Все выражение - одно параметризованное условие: OR, IN, BETWEEN, LIKE, under(...) за один запрос
+    condition, params = filter_lang.compile_sql(node)
+    # Скобки: к условию могут добавляться другие через AND (например, продолжение страницы)
+    return [sql.SQL("({})").format(condition)], params
+
+
+def query_offline(node, query, sort_by, limit):
+    """Строки локального источника (снимок или выгрузка): query(условия, сортировка, limit) -> строки.
+
+    Сравнения, соединенные AND, проверяются векторно; OR, IN, LIKE, under(...) - построчно.
+    """
+    conditions = filter_lang.simple_conditions(node)
+    if conditions is not None:
+        return query(conditions, sort_by, limit)
+    results = filter_lang.filter_rows(node, query([], sort_by, None), EMPLOYEE_COLUMNS)
+    return results[:limit] if limit else results
+
+
+def format_stream_line(values, widths):
+    """Строка таблицы в стиле grid с фиксированными ширинами колонок"""
+    cells = []
+    for value, width in zip(values, widths):
+        text = "" if value is None else str(value)
+        # Числа выравниваем по правому краю, остальное - по левому
+        text = text.rjust(width) if isinstance(value, int) else text.ljust(width)
+        cells.append(f" {text} ")
+    return "|" + "|".join(cells) + "|"
+
+
+def stream_results(cursor, output_format):
+    """Потоковый вывод результатов по мере получения строк с сервера"""
+    count = 0
+    last_row = None
+    header_printed = False
+    widths = []
+    separator = ""
+
+    for row in cursor:
+        if not header_printed:
+            colnames = [desc[0] for desc in cursor.description]
+            if output_format == "table":
+                widths = [max(len(name), STREAM_COLUMN_WIDTHS.get(name, 10)) for name in colnames]
+                separator = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+                print(separator)
+                print(format_stream_line(colnames, widths))
+                print(separator.replace("-", "="))
+            elif output_format == "csv":
+                print(",".join(colnames))
+            header_printed = True
+
+        if output_format == "table":
+            print(format_stream_line(row, widths))
+            print(separator)
+        elif output_format == "csv":
+            print(",".join(map(str, row)))
+        count += 1
+        last_row = row
+
+    print(f"Найдено записей: {count}")
+    return count, last_row
+
+
+def encode_page_cursor(sort_by, row, colnames):
+    """Упаковка ключа последней строки страницы в непрозрачный токен"""
+    value = row[colnames.index(sort_by)]
+    if isinstance(value, date):
+        value = {"date": value.isoformat()}
+    key = [sort_by, value, row[colnames.index("id")]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_page_cursor(token, sort_by):
+    """Распаковка токена страницы в (значение сортировки, id) или None при ошибке"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        cursor_sort, value, last_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if isinstance(value, dict):
+            value = date.fromisoformat(value["date"])
+        # bool - подкласс int, но в токене, созданном encode_page_cursor, его быть не может
+        if type(last_id) is not int:
+            raise TypeError("id последней строки должен быть целым числом")
+    except (ValueError, TypeError, KeyError):
+        print(f"Некорректный курсор страницы: {token}")
+        return None
+    if cursor_sort != sort_by:
+        print(f"Курсор относится к сортировке по {cursor_sort}, а не по {sort_by}")
+        return None
+    return value, last_id
+
+
+def build_keyset_condition(sort_by, value, last_id):
+    """Условие keyset-пагинации по паре (поле сортировки, id)"""
+    if sort_by == "id":
+        return sql.SQL("id > %s"), [last_id]
+    column = sql.Identifier(sort_by)
+    if value is None:
+        # Страница закончилась на NULL: дальше идут только NULL с большим id
+        return sql.SQL("{} IS NULL AND id > %s").format(column), [last_id]
+    condition = sql.SQL("({}, id) > (%s, %s)").format(column)
+    if sort_by in NULLABLE_COLUMNS:
+        condition = sql.SQL("({} OR {} IS NULL)").format(condition, column)
+    return condition, [value, last_id]
+
+
+def print_results(results, colnames, output_format):
+    """Вывод полученных строк таблицей или в CSV"""
+    if output_format == "table":
+        print(tabulate(results, headers=colnames, tablefmt="grid"))
+    elif output_format == "csv":
+        print(",".join(colnames))
+        for row in results:
+            print(",".join(map(str, row)))
+    print(f"Найдено записей: {len(results)}")
+
+
+def list_from_snapshot(snapshot_path, sort_by, filters, output_format, limit):
+    """Фильтрация и сортировка по локальному снимку без обращения к БД"""
+    from snapshot import EmployeeSnapshot  # NumPy нужен только для работы со снимком
+
+    node = parse_filters(filters)
+    if node is False:
+        return
+    try:
+        snapshot = EmployeeSnapshot.open(snapshot_path)
+    except FileNotFoundError:
+        print(f"Снимок не найден: {snapshot_path}. Создайте его командой: snapshot create --path {snapshot_path}")
+        return
+    try:
+        results = query_offline(node, snapshot.query, sort_by, limit)
+    except ValueError as e:
+        print(f"Некорректное значение фильтра: {e}")
+        return
+    print_results(results, EMPLOYEE_COLUMNS, output_format)
+
+
+def list_from_file(path, sort_by, filters, output_format, limit):
+    """Фильтрация и сортировка файла выгрузки Arrow без обращения к БД"""
+    import employees_arrow  # pyarrow нужен только для работы с выгрузкой
+
+    node = parse_filters(filters)
+    if node is False:
+        return
+    try:
+        table = employees_arrow.read_table(path)
+        results = query_offline(node, functools.partial(employees_arrow.filter_table, table), sort_by, limit)
+    except (OSError, ValueError) as e:  # ArrowInvalid - подкласс ValueError
+        print(f"Ошибка чтения выгрузки {path}: {e}")
+        return
+    print_results(results, EMPLOYEE_COLUMNS, output_format)
+
+
+def export_employees(path, batch_size=50000, compression="none", verify=False):
+    """Выгрузка таблицы в файл Arrow IPC"""
+    import employees_arrow
+
     conn = get_connection()
-    cursor = conn.cursor()
+    try:
+        started = time.perf_counter()
+        count = employees_arrow.export_table(conn, path, batch_size, compression)
+        elapsed = time.perf_counter() - started
+        print(f"Выгружено {count} записей в {path} за {elapsed:.2f} с "
+              f"({count / max(elapsed, 1e-9):,.0f} строк/с, {os.path.getsize(path):,} байт)")
+        if verify:
+            mismatch = employees_arrow.verify_table(conn, path, batch_size)
+            print("Проверка: файл совпадает с таблицей" if mismatch is None else f"Проверка не пройдена: {mismatch}")
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"Ошибка при выгрузке: {e}")
+    finally:
+        db.release_connection(conn)
 
-    # Базовый запрос
-    query = sql.SQL("SELECT * FROM employees")
-    params = []
-    conditions = []
-
-    # Добавление фильтров
-    if filters:
-        for filter_expr in filters:
-            # Поддерживаемые операторы: =, !=, >, <, >=, <=
-            operators = ['!=', '>=', '<=', '=', '>', '<']
-            found = False
-
-            for op in operators:
-                if op in filter_expr:
-                    field, value = filter_expr.split(op, 1)
-                    field = field.strip()
-                    value = value.strip()
-
-                    # Для числовых полей преобразуем значение
-                    if field in ['id', 'salary', 'boss_id']:
-                        try:
-                            value = int(value)
-                        except ValueError:
-                            print(f"Некорректное числовое значение для {field}: {value}")
-                            return
-
-                    # Формируем условие SQL
-                    condition = sql.SQL("{} {} %s").format(
-                        sql.Identifier(field),
-                        sql.SQL(op)
-                    )
-
-                    conditions.append(condition)
-                    params.append(value)
-                    found = True
-                    break
 
-            if not found:
-                print(f"Некорректный фильтр: {filter_expr}")
-                print("Поддерживаемые операторы: =, !=, >, <, >=, <=")
-                return
+def restore_employees(path):
+    """Замена содержимого таблицы данными из файла Arrow IPC"""
+    import employees_arrow
+
+    conn = get_connection()
+    try:
+        started = time.perf_counter()
+        count = employees_arrow.restore_table(conn, path)
+        elapsed = time.perf_counter() - started
+        print(f"Загружено {count} записей из {path} за {elapsed:.2f} с ({count / max(elapsed, 1e-9):,.0f} строк/с)")
+    except (psycopg2.Error, OSError, ValueError) as e:
+        conn.rollback()
+        print(f"Ошибка при загрузке: {e}")
+    finally:
+        db.release_connection(conn)
+
+
+def update_snapshot(action, snapshot_path):
+    """Создание или инкрементальное обновление локального снимка"""
+    from snapshot import EmployeeSnapshot
+
+    conn = get_connection()
+    started = time.perf_counter()
+    try:
+        if action == "refresh" and os.path.exists(snapshot_path):
+            snapshot = EmployeeSnapshot.open(snapshot_path)
+            changed, deleted = snapshot.refresh(conn)
+            print(f"Снимок обновлен: изменено {changed}, удалено {deleted}, всего {len(snapshot)} записей "
+                  f"за {time.perf_counter() - started:.2f} с")
+        else:
+            snapshot = EmployeeSnapshot.create(conn, snapshot_path)
+            print(f"Снимок создан: {len(snapshot)} записей за {time.perf_counter() - started:.2f} с ({snapshot_path})")
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"Ошибка при загрузке снимка: {e}")
+    finally:
+        db.release_connection(conn)
+
+
+def build_list_query(sort_by="id", filters=None, limit=None, after=None):
+    """Запрос команды list и его параметры (None при ошибке в фильтрах или курсоре)"""
+    parsed = build_filter_conditions(filters)
+    if parsed is None:
+        return None
+    conditions, params = parsed
+
+    # Продолжение с места, на котором закончилась предыдущая страница
+    if after:
+        page_key = decode_page_cursor(after, sort_by)
+        if page_key is None:
+            return None
+        condition, keyset_params = build_keyset_condition(sort_by, *page_key)
+        conditions.append(condition)
+        params.extend(keyset_params)
+
+    # Базовый запрос: только колонки сотрудника (без служебной колонки path), как в --snapshot и --from-file
+    query = sql.SQL("SELECT {} FROM employees").format(sql.SQL(", ").join(map(sql.Identifier, EMPLOYEE_COLUMNS)))
 
     # Объединяем условия фильтрации
     if conditions:
         query = sql.SQL("{} WHERE {}").format(query, sql.SQL(" AND ").join(conditions))
 
-    # Добавление сортировки
-    try:
-        query = sql.SQL("{} ORDER BY {}").format(query, sql.Identifier(sort_by))
-    except:
+    # Добавление сортировки (id делает порядок однозначным для постраничного вывода)
+    if sort_by == "id":
+        query = sql.SQL("{} ORDER BY id").format(query)
+    else:
+        query = sql.SQL("{} ORDER BY {}, id").format(query, sql.Identifier(sort_by))
+
+    if limit:
+        query = sql.SQL("{} LIMIT %s").format(query)
+        params.append(limit)
+
+    return query, params
+
+
+def list_employees(sort_by="id", filters=None, output_format="table", stream=False, itersize=2000,
+                   limit=None, after=None, snapshot_path=None, from_file=None):
+    """Получение списка сотрудников с сортировкой и фильтрацией"""
+    if sort_by not in EMPLOYEE_COLUMNS:
         print(f"Некорректное поле для сортировки: {sort_by}")
         return
 
+    if snapshot_path or from_file:
+        if stream or after:
+            print("Для снимка и файла выгрузки --stream и --after не поддерживаются")
+            return
+        if snapshot_path:
+            list_from_snapshot(snapshot_path, sort_by, filters, output_format, limit)
+        else:
+            list_from_file(from_file, sort_by, filters, output_format, limit)
+        return
+
+    built = build_list_query(sort_by, filters, limit, after)
+    if built is None:
+        return
+    query, params = built
+
+    conn = get_connection()
+    if stream:
+        # Именованный (серверный) курсор передает строки порциями по itersize
+        cursor = conn.cursor(name="employees_list")
+        cursor.itersize = itersize
+    else:
+        cursor = conn.cursor()
+
+    timer = instrumentation.QueryTimer("cli: list", query, params)
     try:
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        colnames = [desc[0] for desc in cursor.description]
+        if stream:
+            # DECLARE CURSOR не поддерживает EXECUTE, поэтому потоковый запрос не подготавливается
+            timer.execute(cursor, prepared=False)
+            started = time.perf_counter()
+            count, last_row = stream_results(cursor, output_format)
+            # Получение и вывод строк при потоковом выводе чередуются, поэтому замеряются вместе
+            timer.fetched(count, time.perf_counter() - started)
+            # Потоковый запрос не выполняется повторно: его результат может быть сколь угодно большим
+            with conn.cursor() as explain_cursor:
+                timer.explain_if_slow(explain_cursor, analyze=False)
+            timer.finish()
+        else:
+            # Одинаковые формы запроса (поля фильтра, операторы, сортировка) планируются один раз на соединение
+            timer.execute(cursor)
+            results = timer.fetchall(cursor)
+            timer.explain_if_slow(cursor)
+            started = time.perf_counter()
+            colnames = [desc[0] for desc in cursor.description]
+            print_results(results, colnames, output_format)
+            timer.finish(render_seconds=time.perf_counter() - started)
+            count, last_row = len(results), results[-1] if results else None
 
-        if output_format == "table":
-            print(tabulate(results, headers=colnames, tablefmt="grid"))
-        elif output_format == "csv":
-            print(",".join(colnames))
-            for row in results:
-                print(",".join(map(str, row)))
-        print(f"Найдено записей: {len(results)}")
+        # Полная страница - выводим токен для продолжения
+        if limit and count == limit:
+            colnames = [desc[0] for desc in cursor.description]
+            print(f"Следующая страница: --after {encode_page_cursor(sort_by, last_row, colnames)}")
 
     except psycopg2.Error as e:
+        timer.finish(error=e)
         print(f"Ошибка при выполнении запроса: {e}")
     finally:
         cursor.close()
-        conn.close()
+        db.release_connection(conn)
 
 
 def add_employee(full_name, position, hire_date, salary, boss_id=None):
@@ -108,17 +389,21 @@ def add_employee(full_name, position, hire_date, salary, boss_id=None):
         RETURNING id
     """)
 
+    timer = instrumentation.QueryTimer("cli: add", query, (full_name, position, hire_date, salary, boss_id))
     try:
-        cursor.execute(query, (full_name, position, hire_date, salary, boss_id))
+        timer.execute(cursor)
         new_id = cursor.fetchone()[0]
         conn.commit()
+        timer.rows = 1
+        timer.finish()
         print(f"Добавлен новый сотрудник с ID: {new_id}")
     except psycopg2.Error as e:
         conn.rollback()
+        timer.finish(error=e)
         print(f"Ошибка при добавлении сотрудника: {e}")
     finally:
         cursor.close()
-        conn.close()
+        db.release_connection(conn)
 
 
 def update_employee(employee_id, **kwargs):
@@ -143,8 +428,12 @@ def update_employee(employee_id, **kwargs):
 
     values = list(kwargs.values()) + [employee_id]
 
+    timer = instrumentation.QueryTimer("cli: update", query, values)
     try:
-        cursor.execute(query, values)
+        # Для каждого набора обновляемых полей - свой подготовленный запрос
+        timer.execute(cursor)
+        timer.rows = cursor.rowcount
+        timer.finish()
         if cursor.rowcount > 0:
             conn.commit()
             print(f"Обновлен сотрудник с ID: {employee_id}")
@@ -152,10 +441,11 @@ def update_employee(employee_id, **kwargs):
             print("Сотрудник не найден")
     except psycopg2.Error as e:
         conn.rollback()
+        timer.finish(error=e)
         print(f"Ошибка при обновлении сотрудника: {e}")
     finally:
         cursor.close()
-        conn.close()
+        db.release_connection(conn)
 
 
 def delete_employee(employee_id):
@@ -165,8 +455,11 @@ def delete_employee(employee_id):
 
     query = sql.SQL("DELETE FROM employees WHERE id = %s")
 
+    timer = instrumentation.QueryTimer("cli: delete", query, (employee_id,))
     try:
-        cursor.execute(query, (employee_id,))
+        timer.execute(cursor)
+        timer.rows = cursor.rowcount
+        timer.finish()
         if cursor.rowcount > 0:
             conn.commit()
             print(f"Удален сотрудник с ID: {employee_id}")
@@ -174,22 +467,543 @@ def delete_employee(employee_id):
             print("Сотрудник не найден")
     except psycopg2.Error as e:
         conn.rollback()
+        timer.finish(error=e)
         print(f"Ошибка при удалении сотрудника: {e}")
     finally:
         cursor.close()
-        conn.close()
+        db.release_connection(conn)
 
 
-def main():
-    """Основной парсер командной строки"""
+# Группировки отчета: выражение SQL и название колонки
+REPORT_GROUPS = {
+    "position": ("position", "position"),
+    "boss": ("boss_id", "boss_id"),
+    "hire_year": ("extract(year FROM hire_date)::integer", "hire_year"),
+    "hire_month": ("to_char(hire_date, 'YYYY-MM')", "hire_month"),
+    "level": ("nlevel(path)", "level")  # Уровень в иерархии (колонка path, миграция 002)
+}
+
+# Агрегаты отчета по зарплате, вычисляемые на сервере
+REPORT_AGGREGATES = """
+    count(*) AS headcount,
+    sum(salary) AS payroll,
+    round(avg(salary)) AS avg_salary,
+    min(salary) AS min_salary,
+    max(salary) AS max_salary,
+    round(percentile_cont(0.5) WITHIN GROUP (ORDER BY salary)::numeric) AS median_salary,
+    round(percentile_cont(0.9) WITHIN GROUP (ORDER BY salary)::numeric) AS p90_salary
+"""
+
+
+def search_employees(text, limit=20, output_format="table"):
+    """Поиск сотрудников по ФИО: лучшие совпадения по убыванию оценки"""
+    text = text.strip()
+    if not text:
+        print("Не указана строка поиска")
+        return
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    params = db_schema.name_search_params(text, limit)
+    timer = instrumentation.QueryTimer("cli: search", db_schema.NAME_SEARCH_QUERY, params)
+    try:
+        # Форма запроса одна для любой строки поиска - подготавливается один раз на соединение
+        timer.execute(cursor)
+        results = timer.fetchall(cursor)
+        timer.explain_if_slow(cursor)
+        started = time.perf_counter()
+        if results:
+            colnames = [desc[0] for desc in cursor.description]
+            print_results(results, colnames, output_format)
+        else:
+            print("Совпадений не найдено")
+        timer.finish(render_seconds=time.perf_counter() - started)
+    except psycopg2.Error as e:
+        conn.rollback()
+        timer.finish(error=e)
+        print(f"Ошибка при поиске (выполните migrate): {e}")
+    finally:
+        cursor.close()
+        db.release_connection(conn)
+
+
+def report_employees(group_by=None, filters=None, output_format="table"):
+    """Сводный отчет по группам сотрудников; в клиент передаются только агрегаты"""
+    group_by = group_by or ["position"]
+    parsed = build_filter_conditions(filters)
+    if parsed is None:
+        return
+    conditions, params = parsed
+
+    groups = [REPORT_GROUPS[name] for name in group_by]
+    positions = sql.SQL(", ").join(sql.SQL(str(number)) for number in range(1, len(groups) + 1))
+    query = sql.SQL("SELECT {}, {} FROM employees").format(
+        sql.SQL(", ").join(sql.SQL(f"{expression} AS {alias}") for expression, alias in groups),
+        sql.SQL(REPORT_AGGREGATES))
+    if conditions:
+        query = sql.SQL("{} WHERE {}").format(query, sql.SQL(" AND ").join(conditions))
+    query = sql.SQL("{} GROUP BY {} ORDER BY {}").format(query, positions, positions)
+    if "boss" in group_by:
+        # Имя руководителя добавляется к уже сгруппированному (небольшому) результату
+        query = sql.SQL("SELECT b.full_name AS boss_name, r.* FROM ({}) r "
+                        "LEFT JOIN employees b ON b.id = r.boss_id ORDER BY {}").format(
+            query, sql.SQL(", ").join(sql.SQL(f"r.{alias}") for _, alias in groups))
+
+    run_report(query, params, output_format)
+
+
+def report_subtree_payroll(filters=None, output_format="table", limit=None, live=False, refresh=False):
+    """Фонд оплаты труда поддерева каждого руководителя (по представлению employees_subtree_payroll)"""
+    parsed = build_filter_conditions(filters)
+    if parsed is None:
+        return
+    conditions, params = parsed
+
+    if refresh:
+        conn = get_connection()
+        try:
+            started = time.perf_counter()
+            with conn.cursor() as cursor:
+                cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY employees_subtree_payroll")
+            conn.commit()
+            print(f"Представление employees_subtree_payroll обновлено за {time.perf_counter() - started:.2f} с")
+        except psycopg2.Error as e:
+            conn.rollback()
+            print(f"Ошибка при обновлении представления (выполните migrate): {e}")
+            return
+        finally:
+            db.release_connection(conn)
+
+    source = sql.SQL(f"({db_schema.SUBTREE_PAYROLL})" if live else "employees_subtree_payroll")
+    query = sql.SQL("""
+        SELECT id, full_name, position, subordinates, subordinates_payroll,
+               subordinates_payroll + salary AS total_payroll
+        FROM {} s
+        INNER JOIN employees m ON m.id = s.manager_id
+    """).format(source)
+    # Фильтры относятся к руководителю: колонки подзапроса с колонками employees не пересекаются
+    if conditions:
+        query = sql.SQL("{} WHERE {}").format(query, sql.SQL(" AND ").join(conditions))
+    query = sql.SQL("{} ORDER BY total_payroll DESC, id").format(query)
+    if limit:
+        query = sql.SQL("{} LIMIT %s").format(query)
+        params.append(limit)
+
+    run_report(query, params, output_format)
+
+
+def run_report(query, params, output_format):
+    """Выполнение запроса отчета и вывод результата"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    timer = instrumentation.QueryTimer("cli: report", query, params)
+    try:
+        started = time.perf_counter()
+        timer.execute(cursor, prepared=False)
+        results = timer.fetchall(cursor)
+        timer.explain_if_slow(cursor)
+        render_started = time.perf_counter()
+        colnames = [desc[0] for desc in cursor.description]
+        print_results(results, colnames, output_format)
+        timer.finish(render_seconds=time.perf_counter() - render_started)
+        print(f"Отчет построен за {time.perf_counter() - started:.2f} с")
+    except psycopg2.Error as e:
+        conn.rollback()
+        timer.finish(error=e)
+        print(f"Ошибка при построении отчета: {e}")
+    finally:
+        cursor.close()
+        db.release_connection(conn)
+
+
+# Колонки файла импорта: op - операция (upsert по умолчанию или delete)
+IMPORT_COLUMNS = ["op", "id", "full_name", "position", "hire_date", "salary", "boss_id"]
+# Поля, которые upsert изменяет у существующего сотрудника, только если они есть в записи
+IMPORT_UPDATE_COLUMNS = IMPORT_COLUMNS[2:]
+IMPORT_OPERATIONS = {"upsert", "delete"}
+# Количество ошибок проверки, выводимых для одного пакета
+MAX_REPORTED_ERRORS = 20
+
+
+def read_import_records(stream, input_format, start_line=1):
+    """Чтение записей импорта из CSV или JSONL: (номер строки, словарь); строки до start_line пропускаются"""
+    if input_format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            if reader.line_num >= start_line:
+                yield reader.line_num, record
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if line_number >= start_line and line.strip():
+                yield line_number, json.loads(line)
+
+
+def normalize_import_record(line_number, record):
+    """Приведение записи к строке промежуточной таблицы (пустые значения - NULL).
+
+    Последняя колонка - массив полей, присутствующих в записи (ключи JSONL или заголовок CSV):
+    у существующего сотрудника изменяются только они, в том числе на NULL.
+    """
+    values = {key: (None if value in ("", None) else value) for key, value in record.items()}
+    op = (values.get("op") or "upsert").lower()
+    if op not in IMPORT_OPERATIONS:
+        raise ValueError(f"строка {line_number}: неизвестная операция {op}")
+    if op == "delete" and values.get("id") is None:
+        raise ValueError(f"строка {line_number}: для удаления нужен id")
+    fields = "{" + ",".join(column for column in IMPORT_UPDATE_COLUMNS if column in values) + "}"
+    return (line_number, op) + tuple(values.get(column) for column in IMPORT_COLUMNS[1:]) + (fields,)
+
+
+def validate_import_batch(cursor):
+    """Проверка пакета в промежуточной таблице одним проходом, возвращает список ошибок"""
+    cursor.execute("""
+        -- Повторяющиеся id в пакете
+        SELECT min(line), 'id ' || id || ' встречается в пакете несколько раз'
+        FROM employees_import
+        WHERE id IS NOT NULL
+        GROUP BY id
+        HAVING count(*) > 1
+        UNION ALL
+        -- Новые сотрудники должны иметь все обязательные поля
+        SELECT s.line, 'для нового сотрудника нужны full_name, position, hire_date и salary'
+        FROM employees_import s
+        WHERE s.op = 'upsert'
+          AND (s.full_name IS NULL OR s.position IS NULL OR s.hire_date IS NULL OR s.salary IS NULL)
+          AND NOT EXISTS (SELECT 1 FROM employees e WHERE e.id = s.id)
+        UNION ALL
+        -- Обязательные поля существующего сотрудника нельзя очистить
+        SELECT s.line, 'full_name, position, hire_date и salary не могут быть пустыми'
+        FROM employees_import s
+        WHERE s.op = 'upsert'
+          AND ((s.full_name IS NULL AND 'full_name' = ANY(s.fields))
+               OR (s.position IS NULL AND 'position' = ANY(s.fields))
+               OR (s.hire_date IS NULL AND 'hire_date' = ANY(s.fields))
+               OR (s.salary IS NULL AND 'salary' = ANY(s.fields)))
+          AND EXISTS (SELECT 1 FROM employees e WHERE e.id = s.id)
+        UNION ALL
+        -- Руководитель должен существовать в таблице или добавляться в этом же пакете
+        SELECT s.line, 'руководитель с ID ' || s.boss_id || ' не найден'
+        FROM employees_import s
+        WHERE s.op = 'upsert' AND s.boss_id IS NOT NULL
+          AND (
+              (NOT EXISTS (SELECT 1 FROM employees e WHERE e.id = s.boss_id)
+               AND NOT EXISTS (SELECT 1 FROM employees_import t WHERE t.id = s.boss_id AND t.op = 'upsert'))
+              OR EXISTS (SELECT 1 FROM employees_import d WHERE d.id = s.boss_id AND d.op = 'delete')
+          )
+        UNION ALL
+        -- Ссылки на руководителей внутри пакета не должны образовывать цикл
+        SELECT s.line, 'циклическая ссылка на руководителя внутри пакета'
+        FROM employees_import s
+        WHERE s.op = 'upsert' AND s.wave IS NULL
+        ORDER BY 1
+    """)
+    return cursor.fetchall()
+
+
+def assign_import_waves(cursor):
+    """Порядок применения: руководитель, добавляемый в пакете, применяется раньше подчиненных.
+
+    Триггер пути в иерархии читает путь руководителя в момент вставки строки,
+    поэтому строки применяются волнами: 0 - не зависят от других строк пакета, 1 - от волны 0 и т.д.
+    """
+    # chain - ID руководителей по цепочке: строка, уже встречавшаяся в цепочке, означает цикл,
+    # поэтому рекурсия завершается при любой глубине иерархии в пакете
+    cursor.execute("""
+        WITH RECURSIVE waves AS (
+            SELECT s.line, 0 AS wave, ARRAY[s.id] AS chain
+            FROM employees_import s
+            WHERE s.op = 'delete' OR s.boss_id IS NULL OR NOT EXISTS (
+                SELECT 1 FROM employees_import b
+                WHERE b.id = s.boss_id AND b.op = 'upsert' AND b.line <> s.line
+            )
+            UNION ALL
+            SELECT s.line, w.wave + 1, w.chain || s.id
+            FROM employees_import s
+            INNER JOIN employees_import b ON b.id = s.boss_id AND b.op = 'upsert' AND b.line <> s.line
+            INNER JOIN waves w ON w.line = b.line
+            WHERE s.op = 'upsert' AND (s.id IS NULL OR s.id <> ALL(w.chain))
+        )
+        UPDATE employees_import s
+        SET wave = w.wave
+        FROM (SELECT line, max(wave) AS wave FROM waves GROUP BY line) w
+        WHERE s.line = w.line
+    """)
+    cursor.execute("SELECT coalesce(max(wave), -1) FROM employees_import")
+    return cursor.fetchone()[0]
+
+
+def apply_import_batch(conn, cursor, rows):
+    """Загрузка пакета через COPY и применение одним MERGE на волну; возвращает счетчики или None"""
+    cursor.execute("TRUNCATE employees_import")
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(db.copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor.copy_expert(
+        "COPY employees_import (line, op, id, full_name, position, hire_date, salary, boss_id, fields) FROM STDIN",
+        buffer)
+
+    last_wave = assign_import_waves(cursor)
+    errors = validate_import_batch(cursor)
+    if errors:
+        conn.rollback()
+        for line, message in errors[:MAX_REPORTED_ERRORS]:
+            print(f"  строка {line}: {message}")
+        if len(errors) > MAX_REPORTED_ERRORS:
+            print(f"  ... и еще {len(errors) - MAX_REPORTED_ERRORS} ошибок")
+        return None
+
+    # Счетчики операций до применения
+    cursor.execute("""
+        SELECT count(*) FILTER (WHERE s.op = 'upsert' AND e.id IS NULL),
+               count(*) FILTER (WHERE s.op = 'upsert' AND e.id IS NOT NULL),
+               count(*) FILTER (WHERE s.op = 'delete' AND e.id IS NOT NULL)
+        FROM employees_import s
+        LEFT JOIN employees e ON e.id = s.id
+    """)
+    counts = cursor.fetchone()
+
+    # Последовательность сдвигается за явно заданные ID до MERGE: иначе nextval для строки без id
+    # может выдать ID, заданный другой строкой того же пакета. setval не откатывается вместе
+    # с транзакцией, поэтому последовательность остается впереди и при ошибке в следующих пакетах
+    cursor.execute("""
+        SELECT setval(q.seq, k.max_id)
+        FROM (SELECT pg_get_serial_sequence('employees', 'id')::regclass AS seq) q,
+             (SELECT greatest((SELECT max(id) FROM employees_import WHERE op = 'upsert'),
+                              (SELECT max(id) FROM employees)) AS max_id) k
+        WHERE k.max_id > coalesce(pg_sequence_last_value(q.seq), 0)
+    """)
+
+    # Поле, отсутствующее в записи, сохраняет прежнее значение; присутствующее пустое - становится NULL
+    for wave in range(last_wave + 1):
+        cursor.execute("""
+            MERGE INTO employees e
+            USING (SELECT * FROM employees_import WHERE wave = %s) s
+            ON e.id = s.id
+            WHEN MATCHED AND s.op = 'delete' THEN
+                DELETE
+            WHEN MATCHED THEN
+                UPDATE SET full_name = CASE WHEN 'full_name' = ANY(s.fields) THEN s.full_name ELSE e.full_name END,
+                           position = CASE WHEN 'position' = ANY(s.fields) THEN s.position ELSE e.position END,
+                           hire_date = CASE WHEN 'hire_date' = ANY(s.fields) THEN s.hire_date ELSE e.hire_date END,
+                           salary = CASE WHEN 'salary' = ANY(s.fields) THEN s.salary ELSE e.salary END,
+                           boss_id = CASE WHEN 'boss_id' = ANY(s.fields) THEN s.boss_id ELSE e.boss_id END
+            WHEN NOT MATCHED AND s.op = 'upsert' THEN
+                INSERT (id, full_name, position, hire_date, salary, boss_id)
+                VALUES (coalesce(s.id, nextval(pg_get_serial_sequence('employees', 'id'))),
+                        s.full_name, s.position, s.hire_date, s.salary, s.boss_id)
+        """, (wave,))
+    conn.commit()
+    return counts
+
+
+def report_import_progress(source, batch_number, last_line):
+    """Сообщение о сохраненной части файла после ошибки импорта и команда для продолжения"""
+    if last_line is None:
+        print("Ни один пакет не сохранен")
+    else:
+        print(f"Сохранены пакеты 1-{batch_number} (строки файла по {last_line} включительно); "
+              f"продолжение: import {source} --start-line {last_line + 1}")
+
+
+def import_employees(source, input_format=None, batch_size=10000, start_line=1):
+    """Пакетный импорт (добавление, обновление, удаление) из CSV/JSONL через COPY и MERGE"""
+    if input_format is None:
+        input_format = "jsonl" if source.endswith((".jsonl", ".json")) else "csv"
+    stream = sys.stdin if source == "-" else open(source, encoding="utf-8", newline="")
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    totals = [0, 0, 0]
+    batch_number = 0
+    # Последний сохраненный пакет и номер его последней строки в файле
+    committed_batch, committed_line = 0, None
+    started = time.perf_counter()
+    try:
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS employees_import (
+                line INTEGER PRIMARY KEY,
+                op TEXT NOT NULL,
+                id INTEGER,
+                full_name VARCHAR(100),
+                position VARCHAR(50),
+                hire_date DATE,
+                salary INTEGER,
+                boss_id INTEGER,
+                fields TEXT[] NOT NULL,
+                wave INTEGER
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS employees_import_id_idx ON employees_import (id)")
+
+        records = read_import_records(stream, input_format, start_line)
+        while True:
+            rows = []
+            for line_number, record in records:
+                rows.append(normalize_import_record(line_number, record))
+                if len(rows) == batch_size:
+                    break
+            if not rows:
+                break
+
+            batch_number += 1
+            batch_started = time.perf_counter()
+            counts = apply_import_batch(conn, cursor, rows)
+            if counts is None:
+                print(f"Пакет {batch_number} не применен из-за ошибок")
+                report_import_progress(source, committed_batch, committed_line)
+                return
+            committed_batch, committed_line = batch_number, rows[-1][0]
+            elapsed = time.perf_counter() - batch_started
+            totals = [total + count for total, count in zip(totals, counts)]
+            print(f"Пакет {batch_number}: {len(rows)} строк за {elapsed:.2f} с "
+                  f"({len(rows) / max(elapsed, 1e-9):,.0f} строк/с) - "
+                  f"добавлено {counts[0]}, обновлено {counts[1]}, удалено {counts[2]}")
+
+        elapsed = time.perf_counter() - started
+        processed = sum(totals)
+        print(f"Импорт завершен за {elapsed:.2f} с: добавлено {totals[0]}, обновлено {totals[1]}, "
+              f"удалено {totals[2]} ({processed / max(elapsed, 1e-9):,.0f} строк/с)")
+    except (ValueError, csv.Error) as e:
+        conn.rollback()
+        print(f"Ошибка в файле импорта: {e}")
+        report_import_progress(source, committed_batch, committed_line)
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"Ошибка при импорте: {e}")
+        report_import_progress(source, committed_batch, committed_line)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        cursor.close()
+        db.release_connection(conn)
+
+
+def parse_reorg_moves(pairs, source=None, input_format=None):
+    """Перемещения из аргументов ID=BOSS_ID и файла CSV/JSONL (id, boss_id): словарь или None при ошибке.
+
+    Пустой BOSS_ID или none - сотрудник остается без руководителя.
+    """
+    records = []
+    for pair in pairs or []:
+        employee_id, separator, boss_id = pair.partition("=")
+        if not separator:
+            print(f"Некорректное перемещение: {pair} (ожидается ID=BOSS_ID)")
+            return None
+        records.append((pair, employee_id, boss_id))
+    if source:
+        if input_format is None:
+            input_format = "jsonl" if source.endswith((".jsonl", ".json")) else "csv"
+        stream = sys.stdin if source == "-" else open(source, encoding="utf-8", newline="")
+        try:
+            for line_number, record in read_import_records(stream, input_format):
+                records.append((f"строка {line_number}", record.get("id"), record.get("boss_id")))
+        except (OSError, ValueError, csv.Error) as e:
+            print(f"Ошибка в файле перемещений: {e}")
+            return None
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    moves = {}
+    for origin, employee_id, boss_id in records:
+        try:
+            employee_id = int(employee_id)
+            boss_id = None if boss_id in (None, "") or str(boss_id).lower() == "none" else int(boss_id)
+        except (TypeError, ValueError):
+            print(f"Некорректное перемещение: {origin}")
+            return None
+        if moves.get(employee_id, boss_id) != boss_id:
+            print(f"Для сотрудника {employee_id} указано несколько руководителей")
+            return None
+        moves[employee_id] = boss_id
+    if not moves:
+        print("Не указаны перемещения")
+        return None
+    return moves
+
+
+def reorg_employees(pairs, source=None, input_format=None, max_depth=reorg.MAX_DEPTH, dry_run=False):
+    """Перевод сотрудников к новым руководителям одной транзакцией с проверкой циклов и глубины"""
+    moves = parse_reorg_moves(pairs, source, input_format)
+    if moves is None:
+        return
+
+    conn = get_connection()
+    started = time.perf_counter()
+    try:
+        moved, updated = reorg.reorganize(conn, moves, max_depth, dry_run)
+        elapsed = time.perf_counter() - started
+        if dry_run:
+            print(f"Проверка пройдена: сменится руководитель у {moved} сотрудников, "
+                  f"путь в иерархии - у {updated} строк (изменения не применены)")
+        else:
+            print(f"Реорганизация выполнена за {elapsed:.2f} с: сменился руководитель у {moved} сотрудников, "
+                  f"обновлен путь в иерархии у {updated} строк")
+    except reorg.ReorgError as e:
+        print("Реорганизация не выполнена:")
+        for employee_id, message in e.problems[:MAX_REPORTED_ERRORS]:
+            print(f"  сотрудник {employee_id}: {message}")
+        if len(e.problems) > MAX_REPORTED_ERRORS:
+            print(f"  ... и еще {len(e.problems) - MAX_REPORTED_ERRORS} ошибок")
+    except psycopg2.Error as e:
+        print(f"Ошибка при реорганизации (выполните migrate): {e}")
+    finally:
+        db.release_connection(conn)
+
+
+def migrate_database(report_path=None, concurrently=False):
+    """Применение миграций схемы (индексы) с отчетом EXPLAIN ANALYZE до и после"""
+    conn = get_connection()
+    try:
+        before = db_schema.explain_query_shapes(conn) if report_path else None
+        applied = db_schema.migrate(conn, concurrently=concurrently)
+        if applied:
+            for name in applied:
+                print(f"Применена миграция: {name}")
+        else:
+            print("Схема базы данных актуальна")
+
+        if report_path:
+            after = db_schema.explain_query_shapes(conn)
+            with open(report_path, "w", encoding="utf-8") as report:
+                report.write(db_schema.format_explain_report(before, after, applied))
+            print(f"Отчет EXPLAIN ANALYZE сохранен в {report_path}")
+    except psycopg2.Error as e:
+        print(f"Ошибка при применении миграций: {e}")
+    finally:
+        db.release_connection(conn)
+
+
+def build_parser():
+    """Парсер команд (общий для командной строки и режима shell)"""
     parser = argparse.ArgumentParser(description="Управление базой данных сотрудников")
+    parser.add_argument("--log-queries", nargs="?", const=instrumentation.DEFAULT_LOG_FILE, metavar="FILE",
+                        help="Записывать время выполнения запросов в журнал JSONL (с ротацией)")
+    parser.add_argument("--explain", action="store_true",
+                        help="Сохранять в журнал EXPLAIN (ANALYZE, BUFFERS) медленных запросов (включает журнал)")
+    parser.add_argument("--slow-ms", type=float, default=instrumentation.DEFAULT_SLOW_MS,
+                        help="Порог медленного запроса для --explain, мс")
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     # Парсер для команды list
     list_parser = subparsers.add_parser("list", help="Просмотр сотрудников")
-    list_parser.add_argument("--sort", default="id", help="Поле для сортировки")
-    list_parser.add_argument("--filter", action="append", help="Фильтр в формате поле=значение")
+    list_parser.add_argument("--sort", default="id", choices=EMPLOYEE_COLUMNS, help="Поле для сортировки")
+    list_parser.add_argument("--filter", action="append",
+                             help="Фильтр: поле=значение или выражение с AND/OR/NOT, IN, BETWEEN, LIKE, under(ID) "
+                                  "(несколько --filter соединяются AND)")
     list_parser.add_argument("--output", choices=["table", "csv"], default="table", help="Формат вывода")
+    list_parser.add_argument("--stream", action="store_true",
+                             help="Потоковый вывод через серверный курсор без загрузки всей таблицы в память")
+    list_parser.add_argument("--itersize", type=int, default=2000,
+                             help="Количество строк, получаемых с сервера за один раз (для --stream)")
+    list_parser.add_argument("--limit", type=int, help="Количество записей на странице")
+    list_parser.add_argument("--after", help="Курсор страницы, выведенный предыдущим запуском (--after)")
+    list_parser.add_argument("--snapshot", nargs="?", const=DEFAULT_SNAPSHOT_PATH, metavar="PATH",
+                             help="Фильтровать локальный снимок вместо запроса к БД")
+    list_parser.add_argument("--from-file", metavar="FILE",
+                             help="Фильтровать файл выгрузки Arrow (команда export) вместо запроса к БД")
 
     # Парсер для команды add
     add_parser = subparsers.add_parser("add", help="Добавить нового сотрудника")
@@ -212,13 +1026,93 @@ def main():
     delete_parser = subparsers.add_parser("delete", help="Удалить сотрудника")
     delete_parser.add_argument("id", type=int, help="ID сотрудника")
 
-    args = parser.parse_args()
+    # Парсер для команды migrate
+    migrate_parser = subparsers.add_parser("migrate", help="Применить миграции схемы (индексы)")
+    migrate_parser.add_argument("--report", help="Файл для отчета EXPLAIN ANALYZE до и после миграции")
+    migrate_parser.add_argument("--concurrently", action="store_true",
+                                help="Строить индексы без блокировки записи (CREATE INDEX CONCURRENTLY)")
+
+    # Парсер для команды import
+    import_parser = subparsers.add_parser("import", help="Пакетный импорт сотрудников из CSV/JSONL")
+    import_parser.add_argument("file", help="Файл CSV/JSONL или - для чтения из stdin")
+    import_parser.add_argument("--format", choices=["csv", "jsonl"],
+                               help="Формат данных (по умолчанию - по расширению файла)")
+    import_parser.add_argument("--batch-size", type=int, default=10000, help="Количество строк в пакете")
+    import_parser.add_argument("--start-line", type=int, default=1,
+                               help="Номер строки файла, с которой продолжить импорт после ошибки")
+
+    # Парсер для команды reorg
+    reorg_parser = subparsers.add_parser("reorg", help="Перевести сотрудников к новым руководителям одной транзакцией")
+    reorg_parser.add_argument("moves", nargs="*", metavar="ID=BOSS_ID",
+                              help="Сотрудник и новый руководитель (BOSS_ID none - без руководителя)")
+    reorg_parser.add_argument("--file", help="Файл CSV/JSONL с колонками id и boss_id или - для чтения из stdin")
+    reorg_parser.add_argument("--format", choices=["csv", "jsonl"],
+                              help="Формат файла (по умолчанию - по расширению)")
+    reorg_parser.add_argument("--max-depth", type=int, default=reorg.MAX_DEPTH,
+                              help="Допустимое количество уровней иерархии после перемещений")
+    reorg_parser.add_argument("--dry-run", action="store_true", help="Только проверить перемещения")
+
+    # Парсер для команды snapshot
+    snapshot_parser = subparsers.add_parser("snapshot", help="Локальный колоночный снимок таблицы (NumPy)")
+    snapshot_parser.add_argument("action", choices=["create", "refresh"],
+                                 help="create - полная загрузка, refresh - только изменения с прошлой загрузки")
+    snapshot_parser.add_argument("--path", default=DEFAULT_SNAPSHOT_PATH, help="Каталог снимка")
+
+    # Парсер для команды search
+    search_parser = subparsers.add_parser("search", help="Поиск сотрудников по ФИО (нечеткий, со словоформами)")
+    search_parser.add_argument("text", help="Строка поиска, например: Иванов или \"Петров Сергей\"")
+    search_parser.add_argument("--limit", type=int, default=20, help="Количество лучших совпадений")
+    search_parser.add_argument("--output", choices=["table", "csv"], default="table", help="Формат вывода")
+
+    # Парсер для команды report
+    report_parser = subparsers.add_parser("report", help="Сводный отчет по численности и зарплатам")
+    report_parser.add_argument("--by", action="append", choices=list(REPORT_GROUPS),
+                               help="Группировка (можно указать несколько), по умолчанию position")
+    report_parser.add_argument("--filter", action="append", help="Фильтр, как в list")
+    report_parser.add_argument("--output", choices=["table", "csv"], default="table", help="Формат вывода")
+    report_parser.add_argument("--subtree", action="store_true",
+                               help="Фонд оплаты труда всех подчиненных каждого руководителя")
+    report_parser.add_argument("--limit", type=int, help="Количество руководителей (для --subtree)")
+    report_parser.add_argument("--live", action="store_true",
+                               help="Считать поддеревья по таблице, а не по материализованному представлению")
+    report_parser.add_argument("--refresh", action="store_true",
+                               help="Обновить материализованное представление перед отчетом --subtree")
+
+    # Парсер для команды export
+    export_parser = subparsers.add_parser("export", help="Выгрузка таблицы в двоичный файл Arrow IPC")
+    export_parser.add_argument("file", help="Файл выгрузки (.arrow)")
+    export_parser.add_argument("--batch-size", type=int, default=50000, help="Количество строк в пакете")
+    export_parser.add_argument("--compression", choices=["none", "lz4", "zstd"], default="none",
+                               help="Сжатие (несжатый файл читается с отображением в память без копирования)")
+    export_parser.add_argument("--verify", action="store_true", help="Сравнить файл с таблицей после выгрузки")
+
+    # Парсер для команды restore
+    restore_parser = subparsers.add_parser("restore", help="Заменить содержимое таблицы данными из файла Arrow")
+    restore_parser.add_argument("file", help="Файл выгрузки (.arrow)")
+
+    # Парсер для команды shell
+    shell_parser = subparsers.add_parser("shell", help="Интерактивный режим: команды читаются из stdin")
+    shell_parser.add_argument("--no-timing", action="store_true", help="Не выводить время выполнения команд")
+
+    return parser
+
+
+def run_command(args):
+    """Выполнение разобранной команды"""
+    if args.log_queries or args.explain:
+        instrumentation.configure(path=args.log_queries, explain=args.explain, slow_ms=args.slow_ms)
 
     if args.command == "list":
         list_employees(
             sort_by=args.sort,
             filters=args.filter,
-            output_format=args.output
+            output_format=args.output,
+            stream=args.stream,
+            itersize=args.itersize,
+            limit=args.limit,
+            after=args.after,
+            snapshot_path=args.snapshot,
+            from_file=args.from_file
         )
     elif args.command == "add":
         add_employee(
@@ -229,11 +1123,101 @@ def main():
             boss_id=args.boss_id
         )
     elif args.command == "update":
+        # Только поля сотрудника: общие параметры (--log-queries, --slow-ms, ...) в запрос не попадают
         update_params = {k: v for k, v in vars(args).items()
-                         if v is not None and k not in ["command", "id"]}
+                         if v is not None and k in EMPLOYEE_COLUMNS and k != "id"}
         update_employee(args.id, **update_params)
     elif args.command == "delete":
         delete_employee(args.id)
+    elif args.command == "search":
+        search_employees(args.text, args.limit, args.output)
+    elif args.command == "report":
+        if args.subtree:
+            report_subtree_payroll(args.filter, args.output, args.limit, args.live, args.refresh)
+        else:
+            report_employees(args.by, args.filter, args.output)
+    elif args.command == "export":
+        export_employees(args.file, args.batch_size, args.compression, args.verify)
+    elif args.command == "restore":
+        restore_employees(args.file)
+    elif args.command == "snapshot":
+        update_snapshot(args.action, args.path)
+    elif args.command == "import":
+        import_employees(args.file, args.format, args.batch_size, args.start_line)
+    elif args.command == "reorg":
+        reorg_employees(args.moves, args.file, args.format, args.max_depth, args.dry_run)
+    elif args.command == "migrate":
+        migrate_database(args.report, args.concurrently)
+
+
+def run_shell(parser, timing=True):
+    """Режим shell: команды list/add/update/delete/... построчно из stdin в одном процессе.
+
+    Интерпретатор, tabulate и парсер загружаются один раз, соединение из пула и
+    подготовленные на сервере запросы сохраняются между командами.
+    """
+    interactive = sys.stdin.isatty()
+    if interactive:
+        print("Режим shell: введите команду (например, list --sort salary --limit 10), help или exit")
+
+    executed = 0
+    started = time.perf_counter()
+    while True:
+        try:
+            line = input("employees> " if interactive else "")
+        except EOFError:
+            break
+        except KeyboardInterrupt:
+            print()
+            continue
+
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line in ("exit", "quit"):
+            break
+        if line == "help":
+            parser.print_help()
+            continue
+
+        try:
+            args = parser.parse_args(shlex.split(line))
+        except ValueError as e:  # Незакрытая кавычка
+            print(f"Некорректная команда: {e}")
+            continue
+        except SystemExit:
+            continue  # argparse уже вывел сообщение об ошибке или справку
+        if args.command == "shell":
+            print("Команда shell уже выполняется")
+            continue
+
+        command_started = time.perf_counter()
+        try:
+            run_command(args)
+        except psycopg2.Error as e:  # Например, недоступный сервер: сессия продолжается
+            print(f"Ошибка подключения к базе данных: {e}")
+        except KeyboardInterrupt:
+            print("Команда прервана")
+        executed += 1
+        if timing:
+            print(f"[{args.command}: {(time.perf_counter() - command_started) * 1000:.1f} мс]")
+        sys.stdout.flush()  # При работе через конвейер вывод команды не задерживается в буфере
+
+    if timing:
+        print(f"Выполнено команд: {executed} за {time.perf_counter() - started:.2f} с")
+        stats = db.statement_cache_stats()
+        print(f"Подготовленные запросы: попаданий {stats['hits']}, промахов {stats['misses']}, "
+              f"вытеснено {stats['evictions']}")
+
+
+def main():
+    """Основной парсер командной строки"""
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.command == "shell":
+        run_shell(parser, timing=not args.no_timing)
+    else:
+        run_command(args)
 
 
 if __name__ == "__main__":
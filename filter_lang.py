@@ -0,0 +1,489 @@
+"""Язык фильтров сотрудников: выражение разбирается один раз в дерево (AST),
+которое компилируется в одно параметризованное условие SQL (psycopg2.sql)
+или проверяется в Python для строк локального снимка и выгрузки.
+
+    salary > 250000 AND (position IN ('Тимлид', 'Архитектор') OR hire_date BETWEEN 2023-01-01 AND 2023-12-31)
+    NOT full_name LIKE 'Иван%' AND under(2)
+    boss_id IS NULL
+
+Операторы сравнения: =, !=, <>, >, <, >=, <=; [NOT] IN (...), [NOT] BETWEEN ... AND ...,
+[NOT] LIKE / ILIKE (% - любая строка, _ - один символ), IS [NOT] NULL. under(ID) - все подчиненные
+(включая непрямых) руководителя ID по материализованному пути в иерархии (ltree, миграция 002).
+Строки без пробелов и даты можно не заключать в кавычки; значения приводятся к типу поля.
+"""
+import re
+from datetime import date
+
+from psycopg2 import sql
+
+# Поля фильтра и типы их значений
+FIELD_TYPES = {
+    "id": int,
+    "full_name": str,
+    "position": str,
+    "hire_date": date,
+    "salary": int,
+    "boss_id": int
+}
+
+COMPARISON_OPERATORS = {"=", "!=", ">", "<", ">=", "<="}
+KEYWORDS = {"and", "or", "not", "in", "between", "like", "ilike", "is", "null"}
+
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")
+      | (?P<op>!=|<>|>=|<=|=|>|<)
+      | (?P<punct>[(),])
+      | (?P<word>[^\s()',"=<>!]+)
+    )""", re.VERBOSE)
+
+
+class FilterError(ValueError):
+    """Ошибка в выражении фильтра"""
+
+
+class Token:
+    """Лексема выражения: вид (string, op, punct, word) и текст"""
+
+    def __init__(self, kind, text, position):
+        self.kind = kind
+        self.text = text
+        self.position = position  # Позиция в выражении для сообщений об ошибках
+
+    def is_keyword(self, *words):
+        return self.kind == "word" and self.text.lower() in words
+
+
+def tokenize(text):
+    """Разбиение выражения на лексемы"""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if not match:
+            # Позиция первого непробельного символа, а не пробелов перед ним
+            position = len(text) - len(text[position:].lstrip())
+            raise FilterError(f"непонятный символ в позиции {position + 1}: {text[position:position + 10]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            quote = value[0]
+            value = value[1:-1].replace(quote * 2, quote)
+        elif kind == "op" and value == "<>":
+            value = "!="
+        tokens.append(Token(kind, value, match.start(kind)))
+        position = match.end()
+    return tokens
+
+
+def convert_value(field, value):
+    """Приведение значения к типу поля"""
+    field_type = FIELD_TYPES[field]
+    if field_type is int:
+        try:
+            return int(value)
+        except ValueError:
+            raise FilterError(f"некорректное числовое значение для {field}: {value}") from None
+    if field_type is date:
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise FilterError(f"некорректная дата для {field} (формат ГГГГ-ММ-ДД): {value}") from None
+    return value
+
+
+def sql_column(field, alias):
+    """Колонка с псевдонимом таблицы (e.salary) или без него"""
+    return sql.Identifier(alias, field) if alias else sql.Identifier(field)
+
+
+# Узлы дерева. to_sql возвращает (условие, параметры); matches - True, False или None
+# (неизвестно, как NULL в SQL: строка подходит, только если результат True).
+
+class Comparison:
+    """Сравнение поля со значением"""
+
+    def __init__(self, field, op, value):
+        self.field = field
+        self.op = op
+        self.value = value
+
+    def to_sql(self, alias):
+        return sql.SQL("{} {} %s").format(sql_column(self.field, alias), sql.SQL(self.op)), [self.value]
+
+    def matches(self, row, context):
+        value = row[context.index[self.field]]
+        if value is None:
+            return None
+        return {
+            "=": value == self.value,
+            "!=": value != self.value,
+            ">": value > self.value,
+            "<": value < self.value,
+            ">=": value >= self.value,
+            "<=": value <= self.value
+        }[self.op]
+
+
+class InList:
+    """Поле [NOT] IN (значения)"""
+
+    def __init__(self, field, values, negated=False):
+        self.field = field
+        self.values = values
+        self.negated = negated
+
+    def to_sql(self, alias):
+        # Один параметр-массив: форма запроса не зависит от длины списка
+        template = "NOT ({} = ANY(%s))" if self.negated else "{} = ANY(%s)"
+        return sql.SQL(template).format(sql_column(self.field, alias)), [list(self.values)]
+
+    def matches(self, row, context):
+        value = row[context.index[self.field]]
+        if value is None:
+            return None
+        return (value in self.values) != self.negated
+
+
+class Between:
+    """Поле [NOT] BETWEEN нижняя AND верхняя граница (включительно)"""
+
+    def __init__(self, field, low, high, negated=False):
+        self.field = field
+        self.low = low
+        self.high = high
+        self.negated = negated
+
+    def to_sql(self, alias):
+        template = "{} NOT BETWEEN %s AND %s" if self.negated else "{} BETWEEN %s AND %s"
+        return sql.SQL(template).format(sql_column(self.field, alias)), [self.low, self.high]
+
+    def matches(self, row, context):
+        value = row[context.index[self.field]]
+        if value is None:
+            return None
+        return (self.low <= value <= self.high) != self.negated
+
+
+class Like:
+    """Поле [NOT] LIKE/ILIKE шаблон"""
+
+    def __init__(self, field, pattern, negated=False, ignore_case=False):
+        self.field = field
+        self.pattern = pattern
+        self.negated = negated
+        self.ignore_case = ignore_case
+        regex = "".join(".*" if char == "%" else "." if char == "_" else re.escape(char) for char in pattern)
+        self.regex = re.compile(regex, re.DOTALL | (re.IGNORECASE if ignore_case else 0))
+
+    def to_sql(self, alias):
+        operator = ("NOT " if self.negated else "") + ("ILIKE" if self.ignore_case else "LIKE")
+        return sql.SQL("{} {} %s").format(sql_column(self.field, alias), sql.SQL(operator)), [self.pattern]
+
+    def matches(self, row, context):
+        value = row[context.index[self.field]]
+        if value is None:
+            return None
+        return bool(self.regex.fullmatch(str(value))) != self.negated
+
+
+class IsNull:
+    """Поле IS [NOT] NULL"""
+
+    def __init__(self, field, negated=False):
+        self.field = field
+        self.negated = negated
+
+    def to_sql(self, alias):
+        template = "{} IS NOT NULL" if self.negated else "{} IS NULL"
+        return sql.SQL(template).format(sql_column(self.field, alias)), []
+
+    def matches(self, row, context):
+        return (row[context.index[self.field]] is None) != self.negated
+
+
+class Under:
+    """Все подчиненные (включая непрямых) руководителя, сам руководитель не входит"""
+
+    def __init__(self, boss_id):
+        self.boss_id = boss_id
+
+    def to_sql(self, alias):
+        condition = sql.SQL("{} <@ (SELECT path FROM employees WHERE id = %s) AND {} <> %s").format(
+            sql_column("path", alias), sql_column("id", alias))
+        return condition, [self.boss_id, self.boss_id]
+
+    def matches(self, row, context):
+        return row[context.index["id"]] in context.subordinates(self.boss_id)
+
+
+class And:
+    """Все условия"""
+
+    def __init__(self, items):
+        self.items = items
+
+    def to_sql(self, alias):
+        return join_sql(self.items, alias, " AND ")
+
+    def matches(self, row, context):
+        result = True
+        for item in self.items:
+            value = item.matches(row, context)
+            if value is False:
+                return False
+            if value is None:
+                result = None
+        return result
+
+
+class Or:
+    """Хотя бы одно из условий"""
+
+    def __init__(self, items):
+        self.items = items
+
+    def to_sql(self, alias):
+        return join_sql(self.items, alias, " OR ")
+
+    def matches(self, row, context):
+        result = False
+        for item in self.items:
+            value = item.matches(row, context)
+            if value is True:
+                return True
+            if value is None:
+                result = None
+        return result
+
+
+class Not:
+    """Отрицание условия"""
+
+    def __init__(self, item):
+        self.item = item
+
+    def to_sql(self, alias):
+        condition, params = self.item.to_sql(alias)
+        return sql.SQL("NOT ({})").format(condition), params
+
+    def matches(self, row, context):
+        value = self.item.matches(row, context)
+        return None if value is None else not value
+
+
+def join_sql(items, alias, separator):
+    """Условия в скобках, соединенные AND или OR"""
+    conditions, params = [], []
+    for item in items:
+        condition, item_params = item.to_sql(alias)
+        conditions.append(sql.SQL("({})").format(condition))
+        params.extend(item_params)
+    return sql.SQL(separator).join(conditions), params
+
+
+class Parser:
+    """Рекурсивный спуск: or -> and -> not -> условие"""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def next(self, expected=None):
+        token = self.peek()
+        if token is None:
+            raise FilterError(f"неожиданный конец выражения{', ожидалось ' + expected if expected else ''}")
+        self.position += 1
+        return token
+
+    def expect(self, kind, text, description):
+        token = self.next(description)
+        if token.kind != kind or token.text.lower() != text:
+            raise FilterError(f"ожидалось {description} в позиции {token.position + 1}, найдено {token.text!r}")
+
+    def parse(self):
+        if not self.tokens:
+            raise FilterError("пустое выражение")
+        node = self.parse_or()
+        token = self.peek()
+        if token is not None:
+            raise FilterError(f"лишний текст в позиции {token.position + 1}: {token.text!r}")
+        return node
+
+    def parse_or(self):
+        items = [self.parse_and()]
+        while self.peek() is not None and self.peek().is_keyword("or"):
+            self.next()
+            items.append(self.parse_and())
+        return items[0] if len(items) == 1 else Or(items)
+
+    def parse_and(self):
+        items = [self.parse_not()]
+        while self.peek() is not None and self.peek().is_keyword("and"):
+            self.next()
+            items.append(self.parse_not())
+        return items[0] if len(items) == 1 else And(items)
+
+    def parse_not(self):
+        token = self.peek()
+        if token is not None and token.is_keyword("not"):
+            self.next()
+            return Not(self.parse_not())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        token = self.next("условие")
+        if token.kind == "punct" and token.text == "(":
+            node = self.parse_or()
+            self.expect("punct", ")", "')'")
+            return node
+        if token.kind != "word" or token.text.lower() in KEYWORDS:
+            raise FilterError(f"ожидалось поле в позиции {token.position + 1}, найдено {token.text!r}")
+        if token.text.lower() == "under":
+            self.expect("punct", "(", "'(' после under")
+            boss_id = self.parse_value("id")
+            self.expect("punct", ")", "')'")
+            return Under(boss_id)
+
+        field = token.text
+        if field not in FIELD_TYPES:
+            raise FilterError(f"некорректное поле фильтра: {field} (допустимы: {', '.join(FIELD_TYPES)})")
+        return self.parse_condition(field)
+
+    def parse_condition(self, field):
+        token = self.next("оператор")
+        if token.kind == "op":
+            return Comparison(field, token.text, self.parse_value(field))
+        if token.is_keyword("is"):
+            negated = self.peek() is not None and self.peek().is_keyword("not")
+            if negated:
+                self.next()
+            self.expect("word", "null", "NULL")
+            return IsNull(field, negated)
+
+        negated = token.is_keyword("not")
+        if negated:
+            token = self.next("IN, BETWEEN или LIKE после NOT")
+        if token.is_keyword("in"):
+            self.expect("punct", "(", "'(' после IN")
+            values = [self.parse_value(field)]
+            while self.peek() is not None and self.peek().kind == "punct" and self.peek().text == ",":
+                self.next()
+                values.append(self.parse_value(field))
+            self.expect("punct", ")", "')'")
+            return InList(field, values, negated)
+        if token.is_keyword("between"):
+            low = self.parse_value(field)
+            self.expect("word", "and", "AND в BETWEEN")
+            high = self.parse_value(field)
+            return Between(field, low, high, negated)
+        if token.is_keyword("like", "ilike"):
+            if FIELD_TYPES[field] is not str:
+                raise FilterError(f"LIKE применим только к текстовым полям, а не к {field}")
+            return Like(field, self.parse_value(field), negated, token.text.lower() == "ilike")
+        raise FilterError(f"ожидался оператор после {field} в позиции {token.position + 1}, найдено {token.text!r}")
+
+    def parse_value(self, field):
+        """Значение: строка в кавычках или слова без кавычек до ключевого слова, оператора или скобки"""
+        token = self.next("значение")
+        if token.kind == "string":
+            return convert_value(field, token.text)
+        if token.kind != "word" or token.text.lower() in KEYWORDS:
+            raise FilterError(f"ожидалось значение {field} в позиции {token.position + 1}, найдено {token.text!r}")
+        words = [token.text]
+        # Значение из нескольких слов без кавычек: position=Старший разработчик
+        while (self.peek() is not None and self.peek().kind == "word"
+               and self.peek().text.lower() not in KEYWORDS):
+            words.append(self.next().text)
+        return convert_value(field, " ".join(words))
+
+
+def parse(text):
+    """Разбор выражения фильтра в дерево (FilterError при ошибке)"""
+    return Parser(text).parse()
+
+
+def parse_all(expressions):
+    """Разбор нескольких выражений (например, повторяющихся --filter), соединенных AND; None - без фильтра"""
+    nodes = [parse(expression) for expression in expressions or []]
+    if not nodes:
+        return None
+    return nodes[0] if len(nodes) == 1 else And(nodes)
+
+
+def compile_sql(node, alias=None):
+    """Условие SQL (psycopg2.sql.Composed) и список параметров; alias - псевдоним таблицы employees"""
+    return node.to_sql(alias)
+
+
+def is_row_local(node):
+    """Можно ли проверить условие по одной строке (under требует всей иерархии)"""
+    if isinstance(node, Under):
+        return False
+    if isinstance(node, (And, Or)):
+        return all(is_row_local(item) for item in node.items)
+    if isinstance(node, Not):
+        return is_row_local(node.item)
+    return True
+
+
+def simple_conditions(node):
+    """Список (поле, оператор, значение), если дерево - только сравнения, соединенные AND; иначе None.
+
+    Такие фильтры снимок и выгрузка Arrow проверяют векторно.
+    """
+    if node is None:
+        return []
+    items = node.items if isinstance(node, And) else [node]
+    conditions = []
+    for item in items:
+        if isinstance(item, And):
+            nested = simple_conditions(item)
+            if nested is None:
+                return None
+            conditions.extend(nested)
+        elif isinstance(item, Comparison):
+            conditions.append((item.field, item.op, item.value))
+        else:
+            return None
+    return conditions
+
+
+class RowContext:
+    """Контекст проверки строк в Python: индексы колонок и подчиненные руководителей"""
+
+    def __init__(self, columns, rows):
+        self.index = {name: number for number, name in enumerate(columns)}
+        self.rows = rows
+        self.children = None  # Руководитель -> список ID прямых подчиненных (строится при первом under)
+        self.subtrees = {}
+
+    def subordinates(self, boss_id):
+        """ID всех подчиненных руководителя среди строк контекста"""
+        if boss_id not in self.subtrees:
+            if self.children is None:
+                self.children = {}
+                id_index, boss_index = self.index["id"], self.index["boss_id"]
+                for row in self.rows:
+                    self.children.setdefault(row[boss_index], []).append(row[id_index])
+            found, stack = set(), [boss_id]
+            while stack:
+                for child in self.children.get(stack.pop(), []):
+                    if child not in found:
+                        found.add(child)
+                        stack.append(child)
+            self.subtrees[boss_id] = found
+        return self.subtrees[boss_id]
+
+
+def filter_rows(node, rows, columns):
+    """Строки, для которых условие истинно (порядок сохраняется)"""
+    if node is None:
+        return list(rows)
+    context = RowContext(columns, rows)
+    return [row for row in rows if node.matches(row, context) is True]
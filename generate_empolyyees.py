@@ -1,46 +1,49 @@
 # Импорт необходимых библиотек
 import psycopg2  # Для работы с PostgreSQL
+from psycopg2 import sql  # Безопасная подстановка имени базы данных
 from mimesis import Person, Generic, Field  # Генерация реалистичных данных
 from mimesis.enums import Gender  # Гендер для генерации имен
 from datetime import datetime, timedelta  # Работа с датами
 import random  # Генерация случайных чисел
+import argparse  # Разбор аргументов командной строки
+import io  # Буфер для потоковой передачи данных в COPY
+import time  # Замер скорости загрузки
+import multiprocessing  # Параллельная генерация данных
+import db  # Общий слой доступа к БД
+import db_schema  # Миграции схемы (индексы)
 
-# Параметры подключения к PostgreSQL
-DB_NAME = "employees_db"  # Название базы данных
-DB_USER = "postgres"  # Имя пользователя БД
-DB_PASSWORD = "_______"  # Пароль (заменить на реальный)
-DB_HOST = "localhost"  # Хост базы данных
-DB_PORT = "5432"  # Порт PostgreSQL
+# Параметры подключения к PostgreSQL - общие для всех скриптов (db_config.ini или окружение)
+DB_NAME = db.load_config()["dbname"]  # Название базы данных
+
+# Словарь должностей по уровням иерархии
+POSITIONS = {
+    1: "CEO",  # Уровень 1
+    2: "Менеджер",  # Уровень 2
+    3: "Тимлид",  # Уровень 3
+    4: "Старший разработчик",  # Уровень 4
+    5: "Разработчик"  # Уровень 5
+}
+
+# Колонки таблицы в порядке передачи через COPY
+COPY_COLUMNS = ("id", "full_name", "position", "hire_date", "salary", "boss_id", "path")
 
 
 # Функция создания структуры базы данных
 def create_database_structure():
     # Подключение к системной БД для создания новой БД
-    conn = psycopg2.connect(
-        dbname="postgres",  # Системная БД по умолчанию
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT
-    )
+    conn = db.connect(dbname="postgres")  # Системная БД по умолчанию
     conn.autocommit = True  # Разрешаем автоматическое подтверждение операций
     cursor = conn.cursor()  # Создаем курсор для выполнения SQL-запросов
 
     # Удаляем старую базу данных если существует
-    cursor.execute(f"DROP DATABASE IF EXISTS {DB_NAME}")
+    cursor.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(DB_NAME)))
     # Создаем новую базу данных
-    cursor.execute(f"CREATE DATABASE {DB_NAME}")
+    cursor.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(DB_NAME)))
     cursor.close()  # Закрываем курсор
     conn.close()  # Закрываем соединение
 
     # Подключаемся к только что созданной базе данных
-    conn = psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT
-    )
+    conn = db.connect()
     cursor = conn.cursor()  # Создаем новый курсор
 
     # Создаем таблицу сотрудников
@@ -55,9 +58,20 @@ def create_database_structure():
     );
     """)
     conn.commit()  # Фиксируем изменения в БД
+    db_schema.migrate(conn)  # Индексы для фильтров и сортировок
     return conn, cursor  # Возвращаем соединение и курсор
 
 
+# Распределение сотрудников по уровням иерархии
+def get_level_counts(total_employees):
+    return {
+        2: 5,  # 5 менеджеров
+        3: 50,  # 50 тимлидов
+        4: 500,  # 500 старших разработчиков
+        5: total_employees - 556  # Остальные разработчики (50000 - 1-4 уровни)
+    }
+
+
 # Функция генерации сотрудников
 def generate_employees(total_employees=50000):
     # Создаем структуру БД и получаем соединение
@@ -66,14 +80,7 @@ def generate_employees(total_employees=50000):
     person = Person('ru')  # Генератор персональных данных (русские имена)
     generic = Generic('ru')  # Универсальный генератор данных
 
-    # Словарь должностей по уровням иерархии
-    positions = {
-        1: "CEO",  # Уровень 1
-        2: "Менеджер",  # Уровень 2
-        3: "Тимлид",  # Уровень 3
-        4: "Старший разработчик",  # Уровень 4
-        5: "Разработчик"  # Уровень 5
-    }
+    positions = POSITIONS  # Должности по уровням иерархии
 
     # Словарь для хранения ID сотрудников по уровням
     hierarchy = {1: [], 2: [], 3: [], 4: [], 5: []}
@@ -96,12 +103,7 @@ def generate_employees(total_employees=50000):
     conn.commit()  # Фиксируем изменения
 
     # Распределение сотрудников по уровням
-    level_counts = {
-        2: 5,  # 5 менеджеров
-        3: 50,  # 50 тимлидов
-        4: 500,  # 500 старших разработчиков
-        5: total_employees - 556  # Остальные разработчики (50000 - 1-4 уровни)
-    }
+    level_counts = get_level_counts(total_employees)
 
     # Функция для добавления сотрудников определенного уровня
     def add_employees(level, count, boss_level):
@@ -133,12 +135,206 @@ def generate_employees(total_employees=50000):
     add_employees(4, level_counts[4], 3)  # Senior → подчиняются тимлидам (уровень 3)
     add_employees(5, level_counts[5], 4)  # Разработчики → подчиняются Senior (уровень 4)
 
+    # Представление фонда оплаты труда создано миграцией по пустой таблице
+    db_schema.refresh_subtree_payroll(cursor)
     conn.commit()  # Фиксируем все изменения
     cursor.close()  # Закрываем курсор
     conn.close()  # Закрываем соединение
     print(f"Сгенерировано {total_employees} сотрудников с 5 уровнями иерархии")
 
 
+# Детерминированный сид для части уровня иерархии
+def derive_seed(seed, level, part):
+    return (seed * 1_000_003 + level * 10_007 + part) % (2 ** 32)
+
+
+# Генерация части уровня иерархии (выполняется в отдельном процессе)
+def generate_level_chunk(task):
+    level, first_id, count, boss_first, boss_last, seed = task
+    rng = random.Random(seed)  # Собственный генератор случайных чисел воркера
+    person = Person('ru', seed=seed)
+    generic = Generic('ru', seed=seed)
+
+    rows = []
+    for emp_id in range(first_id, first_id + count):
+        if level == 1:
+            # CEO: мужское ФИО, дата приема 2000-2023, зарплата 300-500 тыс., без начальника
+            rows.append((
+                emp_id,
+                person.full_name(gender=Gender.MALE),
+                POSITIONS[1],
+                generic.datetime.date(start=2000, end=2023),
+                rng.randint(300000, 500000),
+                None
+            ))
+        else:
+            rows.append((
+                emp_id,
+                person.full_name(),
+                POSITIONS[level],
+                generic.datetime.date(start=2015, end=2023),
+                rng.randint(100000, 300000) if level < 5 else rng.randint(50000, 150000),
+                # ID руководителей предыдущего уровня идут подряд, выбираем случайный
+                rng.randint(boss_first, boss_last)
+            ))
+    return rows
+
+
+# Построение иерархии сотрудников в памяти с назначением ID на стороне клиента
+def build_employee_rows(total_employees, seed, workers=1):
+    counts = {1: 1}  # CEO всегда один и получает ID 1
+    counts.update(get_level_counts(total_employees))
+
+    # Разбиваем каждый уровень на части по числу воркеров
+    tasks = []
+    first_ids = {}  # Первый ID каждого уровня
+    next_id = 1
+    for level, count in counts.items():
+        first_ids[level] = next_id
+        boss_first = first_ids.get(level - 1)  # Диапазон ID руководителей
+        boss_last = next_id - 1
+        # Округление вверх; пустой уровень (например, всего 556 сотрудников) не дает задач
+        part_size = max(1, -(-count // workers))
+        for part, start in enumerate(range(0, count, part_size)):
+            part_count = min(part_size, count - start)
+            tasks.append((level, next_id + start, part_count, boss_first, boss_last,
+                          derive_seed(seed, level, part)))
+        next_id += count
+
+    # Результаты собираются в порядке задач, поэтому загрузка остается упорядоченной
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            chunks = pool.map(generate_level_chunk, tasks)
+    else:
+        chunks = map(generate_level_chunk, tasks)
+    return [row for chunk in chunks for row in chunk]
+
+
+# Добавление материализованного пути в иерархии (ltree) к каждой строке.
+# Строки идут по уровням, поэтому путь руководителя всегда вычислен раньше
+def add_hierarchy_paths(rows):
+    paths = {}
+    result = []
+    for row in rows:
+        emp_id, boss_id = row[0], row[5]
+        path = str(emp_id) if boss_id is None else f"{paths[boss_id]}.{emp_id}"
+        paths[emp_id] = path
+        result.append(row + (path,))
+    return result
+
+
+# Удаление внешних ключей, первичного ключа и индексов перед массовой загрузкой
+def drop_constraints_and_indexes(cursor):
+    # Сначала внешние ключи ('f'), затем первичный ключ ('p')
+    cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = 'employees'::regclass AND contype IN ('f', 'p')
+        ORDER BY contype
+    """)
+    constraints = cursor.fetchall()
+    # Индексы, не являющиеся частью ограничений
+    cursor.execute("""
+        SELECT indexname, indexdef
+        FROM pg_indexes
+        WHERE schemaname = current_schema() AND tablename = 'employees'
+          AND indexname NOT IN (
+              SELECT conname FROM pg_constraint WHERE conrelid = 'employees'::regclass
+          )
+    """)
+    indexes = cursor.fetchall()
+
+    for name, _ in constraints:
+        cursor.execute(f'ALTER TABLE employees DROP CONSTRAINT "{name}"')
+    for name, _ in indexes:
+        cursor.execute(f'DROP INDEX "{name}"')
+    # Пользовательские триггеры (пути в иерархии) не нужны: пути вычислены на стороне клиента
+    cursor.execute("ALTER TABLE employees DISABLE TRIGGER USER")
+    return constraints, indexes
+
+
+# Восстановление ограничений и индексов после загрузки
+def restore_constraints_and_indexes(cursor, constraints, indexes):
+    # Первичный ключ нужен раньше внешнего ключа, поэтому восстанавливаем в обратном порядке
+    for name, definition in reversed(constraints):
+        cursor.execute(f'ALTER TABLE employees ADD CONSTRAINT "{name}" {definition}')
+    for _, definition in indexes:
+        cursor.execute(definition)
+    cursor.execute("ALTER TABLE employees ENABLE TRIGGER USER")
+
+
+# Потоковая загрузка строк через COPY FROM STDIN с фиксацией по частям
+def copy_employees(conn, cursor, rows, chunk_size):
+    copy_sql = f"COPY employees ({', '.join(COPY_COLUMNS)}) FROM STDIN"
+    for start in range(0, len(rows), chunk_size):
+        buffer = io.StringIO()  # Буфер текущей порции
+        for row in rows[start:start + chunk_size]:
+            buffer.write("\t".join(db.copy_value(value) for value in row))
+            buffer.write("\n")
+        buffer.seek(0)
+        cursor.copy_expert(copy_sql, buffer)
+        conn.commit()  # Фиксируем порцию
+
+
+# Массовая генерация сотрудников через COPY
+def generate_employees_bulk(total_employees=50000, chunk_size=10000, workers=1, seed=None):
+    if seed is None:
+        seed = random.randrange(2 ** 32)  # Случайный сид, который выводим для повторения запуска
+    conn, cursor = create_database_structure()
+
+    started = time.perf_counter()
+    rows = add_hierarchy_paths(build_employee_rows(total_employees, seed, workers))
+    generated = time.perf_counter()
+
+    # Снимаем ограничения и индексы на время загрузки
+    constraints, indexes = drop_constraints_and_indexes(cursor)
+    conn.commit()
+
+    copy_employees(conn, cursor, rows, chunk_size)
+    loaded = time.perf_counter()
+
+    restore_constraints_and_indexes(cursor, constraints, indexes)
+    # Последовательность должна продолжаться после заранее назначенных ID
+    cursor.execute("SELECT setval(pg_get_serial_sequence('employees', 'id'), %s)", (len(rows),))
+    # Представление фонда оплаты труда создано миграцией по пустой таблице
+    db_schema.refresh_subtree_payroll(cursor)
+    conn.commit()
+    cursor.execute("ANALYZE employees")
+    conn.commit()
+    finished = time.perf_counter()
+
+    cursor.close()
+    conn.close()
+
+    total_time = finished - started
+    print(f"Сгенерировано {len(rows)} сотрудников с 5 уровнями иерархии "
+          f"(сид: {seed}, воркеров: {workers})")
+    print(f"Генерация: {generated - started:.2f} с, "
+          f"COPY: {loaded - generated:.2f} с ({len(rows) / max(loaded - generated, 1e-9):,.0f} строк/с), "
+          f"индексы и ограничения: {finished - loaded:.2f} с")
+    print(f"Итого: {total_time:.2f} с ({len(rows) / max(total_time, 1e-9):,.0f} строк/с)")
+
+
 # Точка входа в программу
 if __name__ == "__main__":
-    generate_employees()  # Запуск генерации данных
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Генерация тестовой базы сотрудников")
+    parser.add_argument("--total", type=int, default=50000, help="Общее количество сотрудников")
+    parser.add_argument("--bulk", action="store_true", help="Массовая загрузка через COPY")
+    parser.add_argument("--chunk-size", type=int, default=10000,
+                        help="Количество строк в одной фиксируемой порции (для --bulk)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Количество процессов для генерации данных (включает --bulk)")
+    parser.add_argument("--seed", type=int, help="Сид для воспроизводимой генерации (для --bulk)")
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error("--workers должен быть не меньше 1")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size должен быть не меньше 1")
+    if args.total < 556:
+        parser.error("--total должен быть не меньше 556 (CEO и руководители уровней 2-4)")
+    if args.bulk or args.workers > 1 or args.seed is not None:
+        # Массовая загрузка
+        generate_employees_bulk(args.total, args.chunk_size, args.workers, args.seed)
+    else:
+        generate_employees(args.total)  # Запуск генерации данных
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""Журнал выполнения запросов CLI и оконного приложения.
+
+Для каждого запроса в файл JSONL (с ротацией) записываются: нормализованная форма запроса,
+количество параметров, количество строк, время выполнения (execute - сервер и сеть),
+время получения строк (fetch) и время вывода (render). Для медленных запросов чтения
+можно дополнительно сохранять план EXPLAIN (ANALYZE, BUFFERS) с временем выполнения на сервере.
+
+Журнал выключен по умолчанию; включается configure() (CLI: --log-queries, --explain;
+оконное приложение: меню "Отладка") или переменной окружения EMPLOYEES_QUERY_LOG.
+"""
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+import psycopg2
+
+import db
+
+DEFAULT_LOG_FILE = "query_log.jsonl"
+LOG_MAX_BYTES = 5 * 1024 * 1024  # Размер файла до ротации
+LOG_BACKUP_COUNT = 3  # Количество хранимых старых файлов
+DEFAULT_SLOW_MS = 200  # Порог медленного запроса для EXPLAIN
+
+_settings = {
+    "enabled": False,
+    "explain": False,
+    "slow_ms": DEFAULT_SLOW_MS,
+    "path": None
+}
+_lock = threading.Lock()
+_logger = logging.getLogger("employees.queries")
+_logger.propagate = False
+_logger.setLevel(logging.INFO)
+
+
+def configure(enabled=True, path=None, explain=None, slow_ms=None):
+    """Включение/выключение журнала и EXPLAIN для медленных запросов"""
+    with _lock:
+        path = path or _settings["path"] or DEFAULT_LOG_FILE
+        if enabled and path != _settings["path"]:
+            for handler in list(_logger.handlers):
+                _logger.removeHandler(handler)
+                handler.close()
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _logger.addHandler(handler)
+            _settings["path"] = path
+        _settings["enabled"] = enabled
+        if explain is not None:
+            _settings["explain"] = explain
+        if slow_ms is not None:
+            _settings["slow_ms"] = slow_ms
+
+
+def is_enabled():
+    """Включен ли журнал"""
+    return _settings["enabled"]
+
+
+def explain_enabled():
+    """Сохраняется ли EXPLAIN медленных запросов"""
+    return _settings["explain"]
+
+
+def log_path():
+    """Путь к файлу журнала"""
+    return _settings["path"] or DEFAULT_LOG_FILE
+
+
+def normalize(query):
+    """Форма запроса: текст с параметрами без лишних пробелов"""
+    return re.sub(r"\s+", " ", query).strip()
+
+
+class QueryTimer:
+    """Замер одного запроса: execute, fetch и render записываются одной строкой журнала"""
+
+    def __init__(self, source, query, params=None):
+        self.source = source  # cli, gui, ...
+        self.query = query
+        self.params = params
+        self.shape = None
+        self.rows = None
+        self.execute_ms = None
+        self.fetch_ms = None
+        self.explain = None
+
+    def execute(self, cursor, prepared=True):
+        """Выполнение запроса (через кэш подготовленных запросов, если prepared)"""
+        if self.shape is None:
+            self.shape = normalize(self.query if isinstance(self.query, str) else self.query.as_string(cursor))
+        started = time.perf_counter()
+        if prepared:
+            db.execute_prepared(cursor, self.query, self.params)
+        else:
+            cursor.execute(self.query, self.params)
+        self.execute_ms = (time.perf_counter() - started) * 1000
+
+    def fetchall(self, cursor):
+        """Получение всех строк с замером"""
+        started = time.perf_counter()
+        rows = cursor.fetchall()
+        self.fetch_ms = (time.perf_counter() - started) * 1000
+        self.rows = len(rows)
+        return rows
+
+    def fetched(self, rows, fetch_seconds):
+        """Строки получены вызывающим кодом (например, потоковый вывод)"""
+        self.rows = rows
+        self.fetch_ms = fetch_seconds * 1000
+
+    def explain_if_slow(self, cursor, analyze=True):
+        """EXPLAIN (ANALYZE, BUFFERS) медленного запроса чтения в той же транзакции.
+
+        analyze=False - только план без повторного выполнения (для потокового вывода: запрос
+        с большим результатом не выполняется второй раз; server_ms в журнале при этом нет).
+        """
+        if not (_settings["enabled"] and _settings["explain"]) or self.shape is None:
+            return
+        elapsed = (self.execute_ms or 0) + (self.fetch_ms or 0)
+        # Запросы изменения данных (в том числе WITH ... INSERT/UPDATE/DELETE ... RETURNING) повторно не выполняются
+        if (elapsed < _settings["slow_ms"] or not re.match(r"(SELECT|WITH)\b", self.shape, re.IGNORECASE)
+                or re.search(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", self.shape, re.IGNORECASE)):
+            return
+        # Точка сохранения: ошибка EXPLAIN не прерывает транзакцию основного запроса
+        cursor.execute("SAVEPOINT query_explain")
+        try:
+            options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+            cursor.execute(f"EXPLAIN ({options}) " + self.shape, self.params)
+            self.explain = cursor.fetchone()[0][0]
+            cursor.execute("RELEASE SAVEPOINT query_explain")
+        except psycopg2.Error as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT query_explain")
+            self.explain = {"error": str(e).strip()}
+
+    def finish(self, render_seconds=None, error=None):
+        """Запись строки журнала"""
+        if not _settings["enabled"] or self.shape is None:
+            return
+        record = {
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "source": self.source,
+            "shape_id": hashlib.md5(self.shape.encode("utf-8")).hexdigest()[:12],
+            "shape": self.shape,
+            "params": len(self.params or ()),
+            "rows": self.rows,
+            "execute_ms": round(self.execute_ms, 3) if self.execute_ms is not None else None,
+            "fetch_ms": round(self.fetch_ms, 3) if self.fetch_ms is not None else None,
+            "render_ms": round(render_seconds * 1000, 3) if render_seconds is not None else None,
+        }
+        if self.explain is not None:
+            record["server_ms"] = self.explain.get("Execution Time")
+            record["explain"] = self.explain
+        if error is not None:
+            record["error"] = str(error).strip()
+        _logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+# Журнал можно включить без изменения команд запуска
+if os.environ.get("EMPLOYEES_QUERY_LOG"):
+    configure(path=os.environ["EMPLOYEES_QUERY_LOG"],
+              explain=os.environ.get("EMPLOYEES_QUERY_EXPLAIN") == "1")
@@ -1,8 +1,136 @@
+import json  # Разбор уведомлений об изменении строк
+import queue  # Очередь уведомлений об изменениях
+import time  # Замер времени вывода результатов
 import tkinter as tk  # Импорт библиотеки для создания GUI
 from tkinter import ttk, messagebox, simpledialog  # Дополнительные компоненты GUI
 import psycopg2  # Библиотека для работы с PostgreSQL
 from psycopg2 import sql  # Безопасное создание SQL-запросов
-from datetime import datetime  # Работа с датами и временем
+from datetime import date, datetime  # Работа с датами и временем
+from query_executor import QueryExecutor  # Фоновое выполнение запросов
+from result_cache import ResultCache, ResultEntry, sort_rows, split_pages  # Кэш результатов таблицы
+import db  # Общий слой доступа к БД (пул соединений)
+import db_schema  # Канал уведомлений об изменениях таблицы
+from db_schema import EMPLOYEES_QUERY, HIERARCHY_CHILDREN_QUERY  # Запросы таблицы и окна иерархии
+import filter_lang  # Условия фильтров (дерево -> параметризованный SQL)
+import instrumentation  # Журнал времени выполнения запросов
+from render_profiler import RenderProfiler  # Профилирование отрисовки по фазам
+
+
+# Колонки строк EMPLOYEES_QUERY (для проверки фильтра по строке в памяти)
+ROW_COLUMNS = ["id", "full_name", "position", "hire_date", "salary", "boss_name", "boss_id"]
+
+# Измененная строка в формате EMPLOYEES_QUERY: запросы изменения возвращают ее сами (RETURNING),
+# поэтому таблица обновляется без повторного запроса
+WRITTEN_ROW = """
+  SELECT w.id, w.full_name, w.position, w.hire_date, w.salary,
+         b.full_name AS boss_name, w.boss_id
+  FROM written w
+  LEFT JOIN employees b ON w.boss_id = b.id
+  """
+
+ADD_EMPLOYEE_QUERY = """
+  WITH written AS (
+    INSERT INTO employees (full_name, position, hire_date, salary, boss_id)
+    VALUES (%s, %s, %s, %s, %s)
+    RETURNING *
+  )""" + WRITTEN_ROW
+
+# Строка до изменения (o) и после: по старым значениям строка убирается со своего места в таблице
+UPDATE_EMPLOYEE_QUERY = """
+  WITH written AS (
+    UPDATE employees e
+    SET full_name = %s, position = %s, hire_date = %s, salary = %s, boss_id = %s
+    FROM employees o
+    WHERE e.id = o.id AND e.id = %s
+    RETURNING e.*, o.full_name AS old_full_name, o.position AS old_position, o.hire_date AS old_hire_date,
+              o.salary AS old_salary, o.boss_id AS old_boss_id
+  )
+  SELECT w.id, w.full_name, w.position, w.hire_date, w.salary, b.full_name AS boss_name, w.boss_id,
+         w.id, w.old_full_name, w.old_position, w.old_hire_date, w.old_salary, ob.full_name, w.old_boss_id
+  FROM written w
+  LEFT JOIN employees b ON w.boss_id = b.id
+  LEFT JOIN employees ob ON w.old_boss_id = ob.id
+  """
+
+DELETE_EMPLOYEE_QUERY = """
+  WITH written AS (
+    DELETE FROM employees WHERE id = %s
+    RETURNING *
+  )""" + WRITTEN_ROW
+
+# Текстовые колонки сортируются побайтово (COLLATE "C"): порядок байтов UTF-8 совпадает
+# с порядком строк Python, которыми загруженный результат сортируется и дополняется в памяти
+TEXT_SORT_COLUMNS = {"e.full_name", "e.position", "b.full_name"}
+
+# Номер колонки строки EMPLOYEES_QUERY для каждого поля сортировки (сортировка в памяти)
+SORT_COLUMN_INDEX = {
+    "e.id": 0,
+    "e.full_name": 1,
+    "e.position": 2,
+    "e.hire_date": 3,
+    "e.salary": 4,
+    "b.full_name": 5
+}
+
+def parse_change_notification(payload):
+    """Уведомление канала employees_changed: {"pid", "op", "old", "new"} (строки - кортежи ROW_COLUMNS).
+
+    Прежний формат (только PID сеанса) и массовые изменения - op = "reload".
+    """
+    if payload.isdigit():
+        return {"pid": int(payload), "op": "reload", "old": None, "new": None}
+    try:
+        change = json.loads(payload)
+    except ValueError:
+        return {"pid": None, "op": "reload", "old": None, "new": None}
+
+    def to_row(values):
+        if values is None:
+            return None
+        values = dict(values, hire_date=date.fromisoformat(values["hire_date"]))
+        return tuple(values[column] for column in ROW_COLUMNS)
+
+    return {"pid": change.get("pid"), "op": change.get("op", "reload"),
+            "old": to_row(change.get("old")), "new": to_row(change.get("new"))}
+
+
+def sort_expression(column):
+    """Выражение ORDER BY для поля сортировки таблицы"""
+    return f'{column} COLLATE "C"' if column in TEXT_SORT_COLUMNS else column
+
+
+def seek_condition(column, value, row_id, descending, forward):
+    """Условие строк после (forward) или перед строкой (value, row_id) в порядке ORDER BY column [DESC], e.id.
+
+    Возвращает (SQL с %s, параметры). NULL (только имя руководителя) при сортировке по возрастанию
+    идут последними, по убыванию - первыми; при равных значениях порядок по id всегда возрастающий.
+    """
+    id_op = ">" if forward else "<"
+    if column == "e.id":
+        return f"e.id {'>' if forward != descending else '<'} %s", [row_id]
+    expression = sort_expression(column)
+    # NULL стоят в направлении поиска после строк со значением
+    nulls_after = forward != descending
+    if value is None:
+        condition = f"({expression} IS NULL AND e.id {id_op} %s)"
+        if not nulls_after:
+            condition = f"({condition} OR {expression} IS NOT NULL)"
+        return condition, [row_id]
+    value_op = ">" if nulls_after else "<"
+    if value_op == id_op:
+        # Сравнение строк (значение, id) использует индекс (колонка, id)
+        condition, params = f"({expression}, e.id) {value_op} (%s, %s)", [value, row_id]
+    else:
+        condition = f"({expression} {value_op} %s OR ({expression} = %s AND e.id {id_op} %s))"
+        params = [value, value, row_id]
+    if column == "b.full_name" and nulls_after:
+        condition = f"({condition} OR {expression} IS NULL)"
+    return condition, params
+
+
+def hire_date(text):
+    """Дата приема из строки ГГГГ-ММ-ДД (ValueError при ошибке)"""
+    return datetime.strptime(text, "%Y-%m-%d").date()
 
 
 class EmployeeDBApp:
@@ -12,26 +140,45 @@ class EmployeeDBApp:
         self.root.title("Управление базой данных сотрудников")  # Заголовок окна
         self.root.geometry("900x750")  # Увеличим высоту окна для статусной строки
 
-        # Параметры подключения к БД
-        self.db_params = {
-            'dbname': 'employees_db',  # Имя базы данных
-            'user': 'postgres',  # Имя пользователя
-            'password': '_____',  # Пароль
-            'host': 'localhost',  # Хост
-            'port': '5432'  # Порт
-        }
+        # Параметры подключения к БД задаются в db_config.ini или переменных окружения (см. db.py)
         # Добавляем атрибуты для хранения состояния фильтра########
         self.current_filter_condition = None
         self.current_filter_params = None
-        self.conn = None  # Инициализация соединения с БД
-        self.connect_to_db()  # Подключение к БД
+        self.current_filter_node = None  # Дерево условия filter_lang (None - фильтр задан только SQL)
+        self.executor = None  # Фоновый исполнитель запросов
+        self.connect_to_db()  # Проверка подключения к БД
         # Добавляем атрибуты для хранения состояния сортировк######
         self.current_sort_column = None
         self.current_sort_direction = "ASC"
         self.last_sorted_column = None  # Добавляем для отслеживания последнего отсортированного столбца
+        # Состояние виртуальной таблицы: в Treeview только видимое окно,
+        # остальные строки подгружаются из БД страницами по мере прокрутки
+        self.page_size = 100  # Количество строк в одной странице запроса
+        self.buffer_rows = 50  # Запас строк выше и ниже видимой области
+        self.max_cached_pages = 40  # Ограничение памяти под загруженные страницы
+        # Результат не больше стольких строк загружается целиком и не вытесняется: смена сортировки - в памяти
+        self.full_load_rows = 20000
+        self.total_rows = 0  # Общее количество записей (отдельный запрос COUNT)
+        self.view_offset = 0  # Индекс первой видимой строки
+        self.row_pages = {}  # Загруженные страницы: номер -> список строк
+        self.pending_pages = set()  # Страницы, запрошенные в фоне
+        # Результаты по ключу (фильтр, параметры, сортировка); текущий результат - self.result
+        self.result_cache = ResultCache()
+        self.result = None
+        self.own_backend_pids = set()  # PID сеансов пула: свои изменения уже учтены
+        self.listener = None  # Уведомления об изменениях таблицы другими клиентами
+        self.profiler = RenderProfiler(self.root, self.show_profile)  # Меню "Отладка" - "Профилирование отрисовки"
+        self.search_delay = 250  # Пауза ввода перед запросом подсказок (мс)
+        self.search_min_length = 2  # Минимальная длина строки для подсказок
+        self.suggestion_limit = 10  # Количество подсказок
 
         self.create_widgets()  # Создание элементов интерфейса
         self.configure_treeview_style()  # Затем настраиваем стиль
+        # Запросы выполняются в фоновых потоках, результаты возвращаются через root.after
+        self.executor = QueryExecutor(self.root, db.get_connection, db.release_connection,
+                                      on_busy=self.on_busy_changed)
+        self.listener = db.NotificationListener(db_schema.CHANGE_CHANNEL)
+        self.root.after(500, self.poll_notifications)
         self.load_employees()  # Загрузка данных сотрудников
 
 
@@ -39,10 +186,10 @@ class EmployeeDBApp:
 
 
     def connect_to_db(self):
-        """Подключение к базе данных"""
+        """Проверка подключения к базе данных"""
         try:
-            # Установка соединения с использованием параметров
-            self.conn = psycopg2.connect(**self.db_params)
+            # Первое соединение пула остается открытым для фоновых запросов
+            db.release_connection(db.get_connection())
         except psycopg2.Error as e:
             # Обработка ошибки подключения
             messagebox.showerror("Ошибка БД", f"Ошибка подключения к базе данных:\n{str(e)}")
@@ -50,6 +197,25 @@ class EmployeeDBApp:
 
     def create_widgets(self):
         """Создание элементов интерфейса"""
+        # Меню отладки: журнал времени выполнения запросов (instrumentation.py)
+        menubar = tk.Menu(self.root)
+        debug_menu = tk.Menu(menubar, tearoff=0)
+        self.query_log_var = tk.BooleanVar(value=instrumentation.is_enabled())
+        self.query_explain_var = tk.BooleanVar(value=instrumentation.is_enabled() and instrumentation.explain_enabled())
+        debug_menu.add_checkbutton(label="Журнал запросов", variable=self.query_log_var,
+                                   command=self.toggle_query_log)
+        debug_menu.add_checkbutton(label="EXPLAIN медленных запросов", variable=self.query_explain_var,
+                                   command=self.toggle_query_explain)
+        debug_menu.add_separator()
+        self.profile_var = tk.BooleanVar(value=False)
+        self.cprofile_var = tk.BooleanVar(value=False)
+        debug_menu.add_checkbutton(label="Профилирование отрисовки", variable=self.profile_var,
+                                   command=self.toggle_profiler)
+        debug_menu.add_checkbutton(label="Статистика cProfile по действиям", variable=self.cprofile_var,
+                                   command=self.toggle_cprofile)
+        menubar.add_cascade(label="Отладка", menu=debug_menu)
+        self.root.config(menu=menubar)
+
         main_frame = ttk.Frame(self.root)  # Основной фрейм
         main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)  # Размещение с заполнением
 
@@ -112,11 +278,22 @@ class EmployeeDBApp:
                             relief="flat",
                             borderwidth=1)
 
-        # Полоса прокрутки
-        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)  # Привязка скроллбара к таблице
+        # Полоса прокрутки управляет окном записей, а не самим Treeview:
+        # в таблице находятся только видимые строки
+        self.scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.on_table_scroll)
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)  # Размещение таблицы
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)  # Размещение скроллбара
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)  # Размещение скроллбара
+
+        # Прокрутка колесом мыши (Windows/macOS и Linux) и клавиатурой
+        self.tree.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll_rows(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_rows(3))
+        self.tree.bind("<Down>", lambda event: self.on_arrow_key(1))
+        self.tree.bind("<Up>", lambda event: self.on_arrow_key(-1))
+        self.tree.bind("<Next>", lambda event: self.scroll_rows(self.visible_row_count()))
+        self.tree.bind("<Prior>", lambda event: self.scroll_rows(-self.visible_row_count()))
+        # При изменении размеров окна меняется количество видимых строк
+        self.tree.bind("<Configure>", lambda event: self.render_window())
 
         # Фильтры
         ttk.Label(filter_frame, text="Фильтр:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
@@ -132,7 +309,8 @@ class EmployeeDBApp:
             "Дата приема >",
             "Дата приема <",
             "Дата приема между",  # НОВЫЙ ФИЛЬТР ДЛЯ ДИАПАЗОНА ДАТ
-            "Руководитель"
+            "Руководитель",
+            "Выражение"  # Язык фильтров: AND/OR/NOT, IN, BETWEEN, LIKE, under(ID)
         ]
         # Выпадающий список для выбора типа фильтра
         ttk.Combobox(filter_frame, textvariable=self.filter_var, values=filter_options, width=15).grid(
@@ -171,11 +349,42 @@ class EmployeeDBApp:
         ttk.Button(filter_frame, text="Применить сортировку", command=self.apply_sort).grid(
             row=1, column=4, padx=5, pady=5)
 
+        # Поиск по ФИО: подсказки по мере ввода, Enter - все совпадения в таблице
+        ttk.Label(filter_frame, text="Поиск по ФИО:").grid(row=2, column=0, padx=5, pady=5, sticky=tk.W)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(filter_frame, textvariable=self.search_var, width=40)
+        search_entry.grid(row=2, column=1, columnspan=2, padx=5, pady=5, sticky=tk.W)
+        search_entry.bind("<Return>", lambda event: self.apply_name_search())
+        search_entry.bind("<Down>", lambda event: self.focus_suggestions())
+        ttk.Button(filter_frame, text="Найти", command=self.apply_name_search).grid(
+            row=2, column=3, padx=5, pady=5)
+        # Список лучших совпадений (виден, пока есть подсказки)
+        self.search_listbox = tk.Listbox(filter_frame, height=6)
+        self.search_listbox.grid(row=3, column=1, columnspan=4, padx=5, pady=(0, 5), sticky=tk.EW)
+        self.search_listbox.grid_remove()
+        # Выбор щелчком или Enter (стрелки только перемещают выделение)
+        self.search_listbox.bind("<ButtonRelease-1>", lambda event: self.on_suggestion_selected())
+        self.search_listbox.bind("<Return>", lambda event: self.on_suggestion_selected())
+        self.search_suggestions = []  # ID сотрудников в порядке строк списка
+        self.search_after_id = None  # Отложенный запрос подсказок
+        self.search_var.trace_add("write", lambda *args: self.on_search_changed())
+
         # Статусная строка для отображения количества записей
         self.status_var = tk.StringVar()
         self.status_var.set("Всего записей: 0")
-        status_bar = ttk.Label(main_frame, textvariable=self.status_var, anchor=tk.W)
-        status_bar.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=5)
+        status_frame = ttk.Frame(main_frame)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=5)
+        self.status_frame = status_frame
+        status_bar = ttk.Label(status_frame, textvariable=self.status_var, anchor=tk.W)
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        # Разбивка времени последнего обновления по фазам (при включенном профилировании)
+        self.profile_status_var = tk.StringVar()
+        self.profile_status = ttk.Label(main_frame, textvariable=self.profile_status_var, anchor=tk.W,
+                                        foreground="#555555")
+
+        # Индикатор выполнения фоновых запросов и кнопка отмены (видны только во время запроса)
+        self.cancel_button = ttk.Button(status_frame, text="Отмена", command=self.cancel_queries)
+        self.progress = ttk.Progressbar(status_frame, mode="indeterminate", length=120)
 
         # Новый метод для отображения помощи
 
@@ -220,6 +429,16 @@ class EmployeeDBApp:
            - Дата приема <: Сотрудники, принятые ДО указанной даты (формат: ГГГГ-ММ-ДД)
            - Дата приема между: Сотрудники, принятые в диапазоне дат (введите две даты через запятую)
            - Руководитель: Все подчиненные (включая косвенных) для руководителя с указанным ID
+           - Выражение: условие на языке фильтров (как --filter в CLI), например
+             salary > 100000 AND (position IN ('Тимлид', 'Архитектор') OR under(2))
+             Поля: id, full_name, position, hire_date, salary, boss_id; операторы =, !=, >, <, >=, <=,
+             IN (...), BETWEEN ... AND ..., LIKE / ILIKE ('Иван%'), IS NULL, AND, OR, NOT, скобки
+
+           Поиск по ФИО:
+           - Начните вводить фамилию, имя или отчество: после короткой паузы появятся
+             лучшие совпадения (допускаются опечатки и другие словоформы: Иванову, Иванова)
+           - Выберите подсказку, чтобы показать одного сотрудника,
+             или нажмите Enter / "Найти", чтобы показать все совпадения
 
            2. Сортировка данных:
            ---------------------
@@ -288,67 +507,466 @@ class EmployeeDBApp:
         self.tree.tag_configure("gridline", background="#E0E0E0")
 
 
-    def execute_query(self, query, params=None):
-        """Выполнение SQL-запроса"""
-        try:
-            with self.conn.cursor() as cur:  # Создание курсора
-                cur.execute(query, params)  # Выполнение запроса
-                if cur.description:  # Если есть результат (SELECT запрос)
-                    return cur.fetchall()  # Возврат результатов
-                self.conn.commit()  # Фиксация изменений для INSERT/UPDATE/DELETE
-                return True  # Успешное выполнение
-        except psycopg2.Error as e:
-            self.conn.rollback()  # Откат изменений при ошибке
-            messagebox.showerror("Ошибка БД", f"Ошибка выполнения запроса:\n{str(e)}")
-            return None  # Возврат None при ошибке
+    def execute_query(self, query, params=None, on_success=None, group=None, on_error=None):
+        """Выполнение SQL-запроса в фоновом потоке, результат передается в on_success"""
+        timer = instrumentation.QueryTimer("gui", query, params)
 
-    def load_employees(self):
+        def run(conn):
+            self.own_backend_pids.add(conn.get_backend_pid())
+            with conn.cursor() as cur:  # Создание курсора
+                # Запрос подготавливается на сервере один раз на соединение (PREPARE), далее - EXECUTE
+                timer.execute(cur)
+                if cur.description:  # Если есть результат (SELECT запрос)
+                    rows = timer.fetchall(cur)
+                    timer.explain_if_slow(cur)
+                    return rows  # Возврат результатов
+                timer.rows = cur.rowcount
+                return True  # Успешное выполнение (фиксация - в фоновом потоке)
+
+        def on_done(result):
+            # Время вывода - работа обработчика результата в потоке Tk
+            started = time.perf_counter()
+            if on_success:
+                with self.profiler.query_result(timer.execute_ms / 1000,
+                                                timer.fetch_ms / 1000 if timer.fetch_ms is not None else 0):
+                    on_success(result)
+            timer.finish(render_seconds=time.perf_counter() - started)
+
+        def on_failed(error):
+            timer.finish(error=error)
+            (on_error or self.show_db_error)(error)
+
+        return self.executor.submit(run, on_done, on_failed, group)
+
+    def toggle_query_log(self):
+        """Включение/выключение журнала запросов из меню "Отладка" """
+        if not self.query_log_var.get():
+            self.query_explain_var.set(False)
+        self.apply_query_log()
+
+    def toggle_query_explain(self):
+        """Включение/выключение EXPLAIN медленных запросов (план записывается в журнал)"""
+        if self.query_explain_var.get():
+            self.query_log_var.set(True)
+        self.apply_query_log()
+
+    def apply_query_log(self):
+        """Передача настроек меню "Отладка" в журнал запросов"""
+        instrumentation.configure(enabled=self.query_log_var.get(), explain=self.query_explain_var.get())
+        if self.query_log_var.get():
+            self.status_var.set(f"Журнал запросов: {instrumentation.log_path()}")
+
+    def toggle_profiler(self):
+        """Включение/выключение профилирования отрисовки"""
+        if not self.profile_var.get():
+            self.cprofile_var.set(False)
+        self.apply_profiler()
+
+    def toggle_cprofile(self):
+        """Включение/выключение статистики cProfile (требует профилирования отрисовки)"""
+        if self.cprofile_var.get():
+            self.profile_var.set(True)
+        self.apply_profiler()
+
+    def apply_profiler(self):
+        """Передача настроек меню "Отладка" профилировщику"""
+        self.profiler.configure(self.profile_var.get(), self.cprofile_var.get())
+        if self.profile_var.get():
+            self.profile_status_var.set("Профилирование включено: обновите таблицу или прокрутите ее")
+            self.profile_status.pack(side=tk.BOTTOM, fill=tk.X, padx=5, after=self.status_frame)
+        else:
+            self.profile_status.pack_forget()
+
+    def show_profile(self, summary):
+        """Разбивка времени обновления по фазам"""
+        self.profile_status_var.set(summary)
+
+    def show_db_error(self, error):
+        """Сообщение об ошибке фонового запроса"""
+        messagebox.showerror("Ошибка БД", f"Ошибка выполнения запроса:\n{str(error)}")
+
+    def on_busy_changed(self, busy):
+        """Показ/скрытие индикатора выполнения запросов"""
+        if busy:
+            self.cancel_button.pack(side=tk.RIGHT, padx=5)
+            self.progress.pack(side=tk.RIGHT, padx=5)
+            self.progress.start(10)
+        else:
+            self.progress.stop()
+            self.progress.pack_forget()
+            self.cancel_button.pack_forget()
+
+    def cancel_queries(self):
+        """Отмена всех выполняющихся запросов на сервере"""
+        self.executor.cancel_all()
+        self.pending_pages.clear()
+        self.status_var.set("Запрос отменен")
+
+    def build_filter_clause(self, seek=None, seek_params=()):
+        """Условие WHERE и параметры текущего фильтра и условия seek по ключу страницы.
+
+        SQL собирается в строку в фоновом потоке.
+        """
+        condition = self.current_filter_condition
+        if condition and seek:
+            if isinstance(condition, str):
+                condition = sql.SQL(condition)
+            return (sql.SQL(" WHERE ({}) AND {}").format(condition, sql.SQL(seek)),
+                    tuple(self.current_filter_params or ()) + tuple(seek_params))
+        if condition:
+            if isinstance(condition, str):
+                condition = sql.SQL(condition)
+            return sql.SQL(" WHERE {}").format(condition), self.current_filter_params
+        if seek:
+            return sql.SQL(" WHERE " + seek), tuple(seek_params)
+        return sql.SQL(""), None
+
+    def filter_key(self):
+        """Условие текущего фильтра для ключа кэша: sql.Composed не хешируется, его repr не требует соединения"""
+        condition = self.current_filter_condition
+        return condition if condition is None or isinstance(condition, str) else repr(condition)
+
+    def result_key(self):
+        """Ключ текущего результата в кэше"""
+        return ResultCache.make_key(self.filter_key(), self.current_filter_params,
+                                    self.current_sort_column, self.current_sort_direction)
+
+    def sorted_from_cache(self):
+        """Результат текущей сортировки из полностью загруженного результата с тем же фильтром"""
+        source = self.result_cache.find_complete(self.filter_key(), self.current_filter_params, self.page_size)
+        if source is None:
+            return None
+        index = SORT_COLUMN_INDEX[self.current_sort_column or "e.id"]
+        rows = sort_rows(source.all_rows(self.page_size), index, self.current_sort_direction == "DESC")
+        return ResultEntry(source.total, split_pages(rows, self.page_size))
+
+    def load_employees(self, keep_position=False):
         """Загрузка сотрудников с сохранением параметров  фильтрации и сортировки"""
-        query = """
-          SELECT e.id, e.full_name, e.position, e.hire_date, e.salary, 
-                 b.full_name AS boss_name
-          FROM employees e
-          LEFT JOIN employees b ON e.boss_id = b.id
-          """
-
-        # Добавление условий фильтрации (если есть сохраненные)
-        if self.current_filter_condition:
-            query += f" WHERE {self.current_filter_condition}"
-            params = self.current_filter_params
+        # Запросы предыдущего фильтра или сортировки больше не нужны - отменяем их на сервере
+        self.executor.cancel_group("table")
+        self.pending_pages = set()
+        if not keep_position:
+            self.view_offset = 0
+
+        key = self.result_key()
+        entry = self.result_cache.get(key)
+        if entry is None:
+            # Смена сортировки или направления уже загруженного результата - без запроса к БД
+            entry = self.sorted_from_cache() or ResultEntry()
+            self.result_cache.put(key, entry)
+        self.result = entry
+        self.row_pages = entry.pages
+
+        if entry.total is not None:
+            self.total_rows = entry.total
+            self.status_var.set(f"Найдено записей: {self.total_rows} (из кэша)")
+            self.request_all_pages(entry)  # Если прежняя полная загрузка была отменена
+            self.render_window()
+            return
+
+        self.status_var.set("Загрузка...")
+        # Количество записей считается отдельным запросом, сами строки подгружаются страницами
+        where, params = self.build_filter_clause()
+        self.execute_query(sql.SQL("SELECT count(*) FROM employees e") + where, params,
+                           lambda result: self.on_count_loaded(entry, result), group="table")
+        self.request_page(0)  # Первая страница загружается параллельно с подсчетом
+
+    def on_count_loaded(self, entry, result):
+        """Получено общее количество записей"""
+        entry.total = result[0][0]
+        if entry is not self.result:
+            return
+        self.total_rows = entry.total
+        self.status_var.set(f"Найдено записей: {self.total_rows}")
+        self.request_all_pages(entry)
+        self.render_window()
+
+    def invalidate_results(self):
+        """Сброс кэша результатов после изменения данных"""
+        self.result_cache.invalidate()
+
+    def poll_notifications(self):
+        """Обработка уведомлений об изменениях таблицы другими клиентами.
+
+        Уведомление об изменении строки (миграция 006) содержит строку до и после изменения
+        и применяется к таблице без запроса к БД; уведомление без строк (массовое изменение,
+        TRUNCATE, restore, миграция 003) перезагружает таблицу.
+        """
+        reload = False
+        changes = []
+        while True:
+            try:
+                payload = self.listener.notifications.get_nowait()
+            except queue.Empty:
+                break
+            change = parse_change_notification(payload)
+            # Собственные изменения уже учтены после фиксации
+            if change["pid"] in self.own_backend_pids:
+                continue
+            if change["op"] == "reload":
+                reload = True
+            else:
+                changes.append((change["old"], change["new"]))
+        if reload:
+            self.invalidate_results()
+            self.load_employees(keep_position=True)
+        elif changes:
+            self.apply_row_changes(changes)
+        self.root.after(500, self.poll_notifications)
+
+    def order_clause(self, reverse=False):
+        """ORDER BY текущей сортировки (reverse - в обратном порядке).
+
+        Сортировка дополняется ID, чтобы границы страниц были однозначными.
+        """
+        id_order = "e.id DESC" if reverse else "e.id"
+        if not self.current_sort_column:
+            return f" ORDER BY {id_order}"
+        direction = self.current_sort_direction
+        if reverse:
+            direction = "ASC" if direction == "DESC" else "DESC"
+        return f" ORDER BY {sort_expression(self.current_sort_column)} {direction}, {id_order}"
+
+    def page_anchor(self, page):
+        """Загруженная страница или конец результата, от которых page читается дешевле, чем OFFSET от начала.
+
+        Возвращает (номер страницы, строка-ключ) или None: перед page - последняя строка страницы,
+        после page - первая; конец результата - (количество страниц, None).
+        """
+        best, best_skip = None, page  # Без опорной страницы пропускается page страниц
+        total = self.result.total if self.result is not None else None
+        if total is not None:
+            # С конца результата страница читается в обратном порядке
+            page_count = (total + self.page_size - 1) // self.page_size
+            if page_count - page - 1 < best_skip:
+                best, best_skip = (page_count, None), page_count - page - 1
+        for anchor, rows in self.row_pages.items():
+            if anchor < page and len(rows) == self.page_size:
+                skip, row = page - anchor - 1, rows[-1]
+            elif anchor > page and rows:
+                skip, row = anchor - page - 1, rows[0]
+            else:
+                continue
+            if skip < best_skip:
+                best, best_skip = (anchor, row), skip
+        return best
+
+    def build_page_query(self, page):
+        """Запрос одной страницы строк с учетом фильтра и сортировки.
+
+        Страница читается от ближайшей загруженной страницы по ключу (поле сортировки, id) или
+        с конца результата: сервер пропускает только строки между ними, а не все строки от начала,
+        как при OFFSET. Возвращает (запрос, параметры, reverse); при reverse строки получены
+        в обратном порядке.
+        """
+        anchor = self.page_anchor(page)
+        if anchor is None or anchor[1] is None:
+            where, params = self.build_filter_clause()
+            params = tuple(params or ())
+            if anchor is None:
+                query = sql.SQL(EMPLOYEES_QUERY) + where + sql.SQL(self.order_clause() + " LIMIT %s OFFSET %s")
+                return query, params + (self.page_size, page * self.page_size), False
+            # От конца результата; последняя страница может быть неполной
+            end = min(self.result.total, (page + 1) * self.page_size)
+            query = sql.SQL(EMPLOYEES_QUERY) + where + sql.SQL(self.order_clause(reverse=True) + " LIMIT %s OFFSET %s")
+            return query, params + (end - page * self.page_size, self.result.total - end), True
+
+        anchor_page, row = anchor
+        column = self.current_sort_column or "e.id"
+        forward = anchor_page < page
+        seek, seek_params = seek_condition(column, row[SORT_COLUMN_INDEX[column]], row[0],
+                                           self.current_sort_direction == "DESC", forward)
+        where, params = self.build_filter_clause(seek, seek_params)
+        skip = page - anchor_page - 1 if forward else anchor_page - page - 1
+        query = (sql.SQL(EMPLOYEES_QUERY) + where
+                 + sql.SQL(self.order_clause(reverse=not forward) + " LIMIT %s OFFSET %s"))
+        return query, tuple(params) + (self.page_size, skip * self.page_size), not forward
+
+    def request_page(self, page):
+        """Фоновая загрузка страницы, если она еще не загружена и не запрошена"""
+        if page in self.row_pages or page in self.pending_pages:
+            return
+        self.pending_pages.add(page)
+        query, params, reverse = self.build_page_query(page)
+        entry = self.result
+
+        def on_loaded(rows, page=page):
+            self.on_page_loaded(entry, page, rows[::-1] if reverse else rows)
+
+        def on_error(error, page=page):
+            self.pending_pages.discard(page)
+            self.show_db_error(error)
+
+        self.execute_query(query, params, on_loaded, group="table", on_error=on_error)
+
+    def request_all_pages(self, entry):
+        """Фоновая загрузка небольшого результата одним запросом.
+
+        Полностью загруженный результат сортируется по другой колонке или в другом направлении
+        в памяти (sorted_from_cache), поэтому его страницы не вытесняются.
+        """
+        if entry.total is None or entry.total > self.full_load_rows or entry.is_complete(self.page_size):
+            return
+        pages = set(range((entry.total + self.page_size - 1) // self.page_size)) - set(entry.pages)
+        if pages <= self.pending_pages:
+            return  # Полная загрузка уже запрошена
+        # Отдельные страницы этого результата больше не запрашиваются
+        self.pending_pages.update(pages)
+        where, params = self.build_filter_clause()
+        query = sql.SQL(EMPLOYEES_QUERY) + where + sql.SQL(self.order_clause())
+
+        def on_loaded(rows):
+            # Все страницы - из одного запроса, поэтому количество берется по полученным строкам
+            entry.pages.clear()
+            entry.pages.update(split_pages(rows, self.page_size))
+            entry.total = len(rows)
+            if entry is not self.result:
+                return
+            self.pending_pages.difference_update(pages)
+            self.total_rows = entry.total
+            self.render_window()
+
+        def on_error(error):
+            self.pending_pages.difference_update(pages)
+            self.show_db_error(error)
+
+        self.execute_query(query, params, on_loaded, group="table", on_error=on_error)
+
+    def on_page_loaded(self, entry, page, rows):
+        """Страница получена из БД"""
+        entry.pages[page] = rows
+        if entry is not self.result:
+            return
+        self.pending_pages.discard(page)
+        if entry.total is not None and entry.total <= self.full_load_rows:
+            self.render_window()
+            return  # Небольшой результат хранится целиком
+
+        # Освобождаем страницы, наиболее удаленные от текущего окна
+        current_page = self.view_offset // self.page_size
+        while len(self.row_pages) > self.max_cached_pages:
+            farthest = max(self.row_pages, key=lambda p: abs(p - current_page))
+            del self.row_pages[farthest]
+        self.render_window()
+
+    def get_rows(self, first, last):
+        """Строки с индексами [first, last); для незагруженных строк - None"""
+        rows = []
+        for index in range(first, last):
+            page_rows = self.row_pages.get(index // self.page_size)
+            position = index % self.page_size
+            if page_rows is None:
+                self.request_page(index // self.page_size)
+                rows.append(None)
+            elif position < len(page_rows):
+                rows.append(page_rows[position])
+        return rows
+
+    def visible_row_count(self):
+        """Количество строк, помещающихся в видимой области таблицы"""
+        try:
+            row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        except (tk.TclError, ValueError):
+            row_height = 20
+        # Вычитаем строку заголовка
+        return max(1, self.tree.winfo_height() // row_height - 1)
+
+    def render_window(self):
+        """Отрисовка видимого окна строк"""
+        visible = self.visible_row_count()
+        # Ограничиваем смещение размерами результата
+        self.view_offset = max(0, min(self.view_offset, self.total_rows - visible))
+        first = self.view_offset
+        last = min(self.total_rows, first + visible)
+
+        # Подгружаем окно вместе с буфером, чтобы прокрутка не ждала БД
+        if self.total_rows:
+            buffer_first = max(0, first - self.buffer_rows)
+            buffer_last = min(self.total_rows, last + self.buffer_rows)
+            for page in range(buffer_first // self.page_size, (buffer_last - 1) // self.page_size + 1):
+                self.request_page(page)
+        rows = self.get_rows(first, last) if last > first else []
+        profile = self.profiler.start("Таблица", len(rows))
+
+        # Форматирование выполняется только для видимых строк
+        with profile.phase("format"):
+            items = [self.format_row(i, emp) for i, emp in enumerate(rows, start=first + 1)]
+
+        selected = self.tree.selection()
+        # Очистка таблицы (в ней только видимое окно)
+        with profile.phase("clear"):
+            children = self.tree.get_children()
+            if children:
+                self.tree.delete(*children)
+
+        with profile.phase("insert"):
+            for iid, values, tags in items:
+                self.tree.insert("", tk.END, iid=iid, values=values, tags=tags)
+
+        # Восстанавливаем выделение, если строка осталась в окне
+        still_visible = [item for item in selected if self.tree.exists(item)]
+        if still_visible:
+            self.tree.selection_set(still_visible)
+
+        # Положение ползунка соответствует окну относительно всего результата
+        if self.total_rows:
+            self.scrollbar.set(first / self.total_rows, last / self.total_rows)
         else:
-            params = None
-        # Добавление сортировки (если указан столбец)
-        if self.current_sort_column:
-            query += f" ORDER BY {self.current_sort_column} {self.current_sort_direction}"
-
-        # Выполнение запроса
-        employees = self.execute_query(query, params)
-
-        # Очистка таблицы
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
-        # Обновление статусной строки
-        count = len(employees) if employees else 0
-        self.status_var.set(f"Найдено записей: {count}")
-
-        # Заполнение таблицы с добавлением порядкового номера
-        if employees:
-            for i, emp in enumerate(employees, start=1):
-                # Форматирование данных
-                formatted_emp = list(emp)
-                formatted_emp[3] = formatted_emp[3].strftime("%Y-%m-%d")  # Формат даты
-                formatted_emp[4] = f"{formatted_emp[4]:,}"  # Формат зарплаты
-                # Определяем тег для строки (чередование цветов)
-                tag = "evenrow" if i % 2 == 0 else "oddrow"
-                # Добавляем порядковый номер в начало
-                row_data = [i] + formatted_emp
-                # Вставка данных в таблицу
-                self.tree.insert("", tk.END, values=row_data, tags=(tag,))
-                # Добавляем горизонтальную линию после каждой строки
-                #if i < len(employees):  # Не добавляем после последней строки
-                #    # ИСПРАВЛЕНО: используем self.columns
-                #    self.tree.insert("", tk.END, values=[""] * len(self.columns), tags=("gridline",))
+            self.scrollbar.set(0, 1)
+        profile.finish()
+
+    def format_row(self, number, emp):
+        """Идентификатор, значения и теги строки Treeview с порядковым номером number"""
+        if emp is None:
+            # Страница еще загружается - показываем строку-заполнитель
+            return f"loading-{number}", [number, "", "Загрузка..."], ("oddrow",)
+        formatted_emp = list(emp[:6])  # boss_id не отображается
+        formatted_emp[3] = formatted_emp[3].strftime("%Y-%m-%d")  # Формат даты
+        formatted_emp[4] = f"{formatted_emp[4]:,}"  # Формат зарплаты
+        # Определяем тег для строки (чередование цветов)
+        tag = "evenrow" if number % 2 == 0 else "oddrow"
+        # Добавляем порядковый номер в начало, ID сотрудника используем как идентификатор строки
+        return str(emp[0]), [number] + formatted_emp, (tag,)
+
+    def scroll_rows(self, delta):
+        """Сдвиг видимого окна на delta строк"""
+        self.view_offset += delta
+        self.render_window()
+        return "break"  # Встроенная прокрутка Treeview не используется
+
+    def on_table_scroll(self, action, amount, unit=None):
+        """Обработка команд полосы прокрутки"""
+        if action == "moveto":
+            self.view_offset = int(float(amount) * self.total_rows)
+            self.render_window()
+        elif action == "scroll":
+            step = self.visible_row_count() if unit == "pages" else 1
+            self.scroll_rows(int(amount) * step)
+
+    def on_mouse_wheel(self, event):
+        """Прокрутка колесом мыши"""
+        return self.scroll_rows(-3 if event.delta > 0 else 3)
+
+    def on_arrow_key(self, direction):
+        """Перемещение выделения стрелками с прокруткой окна на границах"""
+        children = self.tree.get_children()
+        if not children:
+            return "break"
+        selected = self.tree.selection()
+        index = children.index(selected[0]) if selected and selected[0] in children else -1
+        target = index + direction
+        if 0 <= target < len(children):
+            item = children[target]
+        else:
+            # Выходим за границу окна - сдвигаем окно на одну строку
+            self.scroll_rows(direction)
+            children = self.tree.get_children()
+            if not children:
+                return "break"
+            item = children[-1] if direction > 0 else children[0]
+        self.tree.selection_set(item)
+        self.tree.focus(item)
+        return "break"
 
     def sort_treeview(self, column):
         """Сортировка по выбранной колонке (исключая колонку с номером), с учетом текущего фильтра"""
@@ -382,27 +1000,24 @@ class EmployeeDBApp:
         filter_type = self.filter_var.get()  # Тип фильтра
         filter_val = self.filter_value.get().strip()  # Значение фильтра
 
-        condition = None  # Условие WHERE
-        params = None  # Параметры для запроса
+        # Каждый вариант строит дерево условия filter_lang, SQL получается одним компилятором
+        node = None  # Условие фильтра (None - все записи)
 
         if filter_type == "Все":  # Без фильтра
-            condition = "1=1"  # Все записи
+            node = None  # Все записи
         elif filter_type == "Должность" and filter_val:  # Фильтр по должности
-            condition = "e.position ILIKE %s"
-            params = (f"%{filter_val}%",)
+            node = filter_lang.Like("position", f"%{filter_val}%", ignore_case=True)
         elif filter_type == "Зарплата >" and filter_val:  # Зарплата больше
             try:
                 salary = int(filter_val)
-                condition = "e.salary > %s"
-                params = (salary,)
+                node = filter_lang.Comparison("salary", ">", salary)
             except ValueError:
                 messagebox.showerror("Ошибка", "Зарплата должна быть числом")
                 return
         elif filter_type == "Зарплата <" and filter_val:  # Зарплата меньше
             try:
                 salary = int(filter_val)
-                condition = "e.salary < %s"
-                params = (salary,)
+                node = filter_lang.Comparison("salary", "<", salary)
             except ValueError:
                 messagebox.showerror("Ошибка", "Зарплата должна быть числом")
                 return
@@ -421,8 +1036,7 @@ class EmployeeDBApp:
                 if min_salary > max_salary:
                     min_salary, max_salary = max_salary, min_salary
 
-                condition = "e.salary BETWEEN %s AND %s"
-                params = (min_salary, max_salary)
+                node = filter_lang.Between("salary", min_salary, max_salary)
             except ValueError as e:
                 messagebox.showerror("Ошибка", f"Некорректный диапазон зарплат:\n{str(e)}")
                 return
@@ -430,15 +1044,13 @@ class EmployeeDBApp:
             # обработка года (4 цифры) или года-месяца
             if len(filter_val) == 4 and filter_val.isdigit():
                 # если указан только год-фильтр за весь год и позже
-                condition = "e.hire_date >= %s"
-                params = (f"{filter_val}-01-01",)
+                node = filter_lang.Comparison("hire_date", ">=", hire_date(f"{filter_val}-01-01"))
             elif len(filter_val) == 7 and filter_val[4] == '-':  # Формат ГГГГ-ММ
                 try:
                     year, month = filter_val.split('-')
                     # Проверка валидности месяца
                     if 1 <= int(month) <= 12:
-                        condition = "e.hire_date >= %s"
-                        params = (f"{year}-{month}-01",)
+                        node = filter_lang.Comparison("hire_date", ">=", hire_date(f"{year}-{month}-01"))
                     else:
                         raise ValueError("Некорректный месяц")
                 except ValueError:
@@ -448,8 +1060,7 @@ class EmployeeDBApp:
                 try:
                     # Проверка формата полной даты
                     datetime.strptime(filter_val, "%Y-%m-%d")
-                    condition = "e.hire_date > %s"
-                    params = (filter_val,)
+                    node = filter_lang.Comparison("hire_date", ">", hire_date(filter_val))
                 except ValueError:
                     messagebox.showerror("Ошибка", "Используйте формат ГГГГ, ГГГГ-ММ или ГГГГ-ММ-ДД")
                     return
@@ -457,8 +1068,7 @@ class EmployeeDBApp:
         elif filter_type == "Дата приема <" and filter_val:  # Дата приема до
             if len(filter_val) == 4 and filter_val.isdigit():
                 # если указан только год-фильтр до начала года
-                condition = "e.hire_date < %s"
-                params = (f"{filter_val}-01-01",)
+                node = filter_lang.Comparison("hire_date", "<", hire_date(f"{filter_val}-01-01"))
             elif len(filter_val) == 7 and filter_val[4] == '-':  # Формат ГГГГ-ММ
                 try:
                     year, month = filter_val.split('-')
@@ -467,8 +1077,8 @@ class EmployeeDBApp:
                         # Рассчитываем последний день месяца
                         next_month = int(month) % 12 + 1
                         next_year = int(year) + (int(month) // 12)
-                        condition = "e.hire_date < %s"
-                        params = (f"{next_year}-{next_month:02d}-01",)
+                        node = filter_lang.Comparison("hire_date", "<",
+                                                      hire_date(f"{next_year}-{next_month:02d}-01"))
                     else:
                         raise ValueError("Некорректный месяц")
                 except ValueError:
@@ -477,8 +1087,7 @@ class EmployeeDBApp:
             else:
                 try:
                     datetime.strptime(filter_val, "%Y-%m-%d")
-                    condition = "e.hire_date < %s"
-                    params = (filter_val,)
+                    node = filter_lang.Comparison("hire_date", "<", hire_date(filter_val))
                 except ValueError:
                     messagebox.showerror("Ошибка", "Используйте формат ГГГГ, ГГГГ-ММ или ГГГГ-ММ-ДД")
                     return
@@ -530,8 +1139,7 @@ class EmployeeDBApp:
                 datetime.strptime(end_date, "%Y-%m-%d")
 
                 # Установка диапазона
-                condition = "e.hire_date BETWEEN %s AND %s"
-                params = (start_date, end_date)
+                node = filter_lang.Between("hire_date", hire_date(start_date), hire_date(end_date))
             except ValueError as e:
                 messagebox.showerror("Ошибка", f"Некорректный диапазон дат:\n{str(e)}")
                 return
@@ -540,58 +1148,220 @@ class EmployeeDBApp:
             try:
                 # Получаем ID руководителя как число
                 boss_id_val = int(filter_val)
-                # Проверка существования руководителя
-                check_query = "SELECT id FROM employees WHERE id = %s"
-                cur = self.conn.cursor()
-                cur.execute(check_query, (boss_id_val,))
-                if not cur.fetchone():
-                    messagebox.showerror("Ошибка", "Руководитель с таким ID не найден")
-                    cur.close()
-                    return
-                cur.close()
-
-                # Рекурсивный запрос для получения подчиненных
-                recursive_query = """
-                WITH RECURSIVE subordinates AS (
-                    SELECT id
-                    FROM employees
-                    WHERE boss_id = %s
-                    UNION ALL
-                    SELECT e.id
-                    FROM employees e
-                    INNER JOIN subordinates s ON e.boss_id = s.id
-                )
-                SELECT id FROM subordinates
-                """
-                cur = self.conn.cursor()
-                cur.execute(recursive_query, (boss_id_val,))
-
-                # Получаем ID как целые числа
-                ids = [row[0] for row in cur.fetchall()]
-                cur.close()
-
-                if ids:
-                    # Формируем список ID в виде кортежа
-                    id_tuple = tuple(ids)
-                    condition = "e.id IN %s"
-                    params = (id_tuple,)
-                else:
-                    condition = "1=0"  # Нет результатов
-                    params = None
             except ValueError:
                 messagebox.showerror("Ошибка", "ID руководителя должен быть числом")
                 return
 
+            def on_boss_checked(found):
+                if not found:
+                    messagebox.showerror("Ошибка", "Руководитель с таким ID не найден")
+                    return
+                # Все подчиненные (включая косвенных) - одно условие по материализованному пути (ltree),
+                # без рекурсивного запроса и передачи списка ID с клиента
+                self.set_filter_node(filter_lang.Under(boss_id_val))
+
+            # Проверка существования руководителя выполняется в фоне;
+            # новый фильтр отменяет предыдущий запрос
+            self.executor.cancel_group("table")
+            self.execute_query("SELECT id FROM employees WHERE id = %s", (boss_id_val,),
+                               on_boss_checked, group="table")
+            return
+
+        elif filter_type == "Выражение" and filter_val:  # Выражение на языке фильтров
+            try:
+                node = filter_lang.parse(filter_val)
+            except filter_lang.FilterError as e:
+                messagebox.showerror("Ошибка", f"Некорректное выражение фильтра:\n{e}")
+                return
+
         # Загрузка данных с примененным фильтром
+        self.set_filter_node(node)
+
+    def set_filter_node(self, node):
+        """Компиляция дерева условия в SQL (таблица employees с псевдонимом e) и применение фильтра"""
+        if node is None:
+            self.set_filter(None, None)
+            return
+        condition, params = filter_lang.compile_sql(node, "e")
+        # Условие остается sql.Composed: в строку запрос собирается на соединении фонового потока
+        self.set_filter(condition, tuple(params), node)
+
+    def on_search_changed(self):
+        """Ввод в поле поиска: запрос подсказок после паузы ввода"""
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+            self.search_after_id = None
+        text = self.search_var.get().strip()
+        if len(text) < self.search_min_length:
+            self.executor.cancel_group("search")
+            self.hide_suggestions()
+            return
+        # Каждое нажатие клавиши не порождает запрос - только пауза в вводе
+        self.search_after_id = self.root.after(self.search_delay, lambda: self.request_suggestions(text))
+
+    def request_suggestions(self, text):
+        """Фоновый запрос лучших совпадений; предыдущий незавершенный запрос отменяется на сервере"""
+        self.search_after_id = None
+        self.executor.cancel_group("search")
+
+        def on_error(error):
+            self.hide_suggestions()
+            self.status_var.set(f"Поиск по ФИО недоступен (выполните migrate): {str(error).strip()}")
+
+        self.execute_query(db_schema.NAME_SEARCH_QUERY, db_schema.name_search_params(text, self.suggestion_limit),
+                           lambda rows: self.on_suggestions_loaded(text, rows), group="search", on_error=on_error)
+
+    def on_suggestions_loaded(self, text, rows):
+        """Подсказки получены; ответ на уже измененную строку не показывается"""
+        if text != self.search_var.get().strip():
+            return
+        self.search_listbox.delete(0, tk.END)
+        self.search_suggestions = [row[0] for row in rows]
+        for employee_id, full_name, position, *_ in rows:
+            self.search_listbox.insert(tk.END, f"{full_name} - {position} (ID {employee_id})")
+        if rows:
+            self.search_listbox.grid()
+        else:
+            self.hide_suggestions()
+
+    def hide_suggestions(self):
+        """Скрытие списка подсказок"""
+        self.search_listbox.delete(0, tk.END)
+        self.search_suggestions = []
+        self.search_listbox.grid_remove()
+
+    def focus_suggestions(self):
+        """Переход к списку подсказок клавишей "вниз" """
+        if self.search_suggestions:
+            self.search_listbox.focus_set()
+            self.search_listbox.selection_set(0)
+            self.search_listbox.activate(0)
+
+    def on_suggestion_selected(self):
+        """Выбрана подсказка: в таблице остается выбранный сотрудник"""
+        selection = self.search_listbox.curselection()
+        if not selection:
+            return
+        employee_id = self.search_suggestions[selection[0]]
+        self.hide_suggestions()
+        self.set_filter_node(filter_lang.Comparison("id", "=", employee_id))
+
+    def apply_name_search(self):
+        """Все совпадения по ФИО в таблице (с текущей сортировкой); пустая строка сбрасывает фильтр"""
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+            self.search_after_id = None
+        self.executor.cancel_group("search")
+        self.hide_suggestions()
+        text = self.search_var.get().strip()
+        if text:
+            self.set_filter(db_schema.NAME_SEARCH_CONDITION, db_schema.name_search_params(text))
+        else:
+            self.set_filter(None, None)
+
+    def set_filter(self, condition, params, node=None):
+        """Сохранение условия фильтра и перезагрузка таблицы (node - то же условие деревом filter_lang)"""
         if condition:
             #сохраняем параметры фильтра перед загрузкой
             self.current_filter_condition = condition
             self.current_filter_params = params
+            self.current_filter_node = node
         else:
             #сбрасываем фильтр при выборе "все"
             self.current_filter_condition = None
             self.current_filter_params = None
+            self.current_filter_node = None
         self.load_employees()
+
+    def row_matches_filter(self, row):
+        """Подходит ли строка под текущий фильтр; None - по одной строке это не проверить"""
+        if self.current_filter_condition is None:
+            return True
+        node = self.current_filter_node
+        # Поиск по ФИО и under(...) требуют индексов и иерархии в БД
+        if node is None or not filter_lang.is_row_local(node):
+            return None
+        return node.matches(row, filter_lang.RowContext(ROW_COLUMNS, [row])) is True
+
+    def apply_row_change(self, old_row, new_row):
+        """Обновление таблицы после изменения одной строки без повторного запроса.
+
+        old_row - строка до изменения (None при добавлении), new_row - после (None при удалении).
+        """
+        self.apply_row_changes([(old_row, new_row)])
+
+    def apply_row_changes(self, changes):
+        """Применение изменений строк (old_row, new_row) к текущему результату.
+
+        Если место какой-либо строки определить нельзя, таблица перезагружается.
+        """
+        entry = self.result
+        # Страницы, запрошенные до изменения, могут прийти уже с новыми данными - запросим их заново
+        self.executor.cancel_group("table")
+        self.pending_pages = set()
+
+        patched = entry is not None and entry.total is not None
+        redraw = False  # Изменился порядок или количество строк - перерисовка окна
+        in_place_rows = []  # Строки, замененные на месте
+        for old_row, new_row in changes:
+            if not patched:
+                break
+            patched, in_place = self.patch_result(entry, old_row, new_row)
+            if in_place:
+                in_place_rows.append(new_row)
+            else:
+                redraw = True
+
+        # Остальные результаты в кэше по одной строке не обновить
+        self.result_cache.invalidate()
+        if not patched:
+            self.load_employees(keep_position=True)
+            return
+        self.result_cache.put(self.result_key(), entry)
+        self.total_rows = entry.total
+        self.status_var.set(f"Найдено записей: {self.total_rows}")
+
+        if redraw:
+            self.render_window()
+            return
+        for new_row in in_place_rows:
+            iid = str(new_row[0])
+            if self.tree.exists(iid):
+                # Видимая строка обновляется без перерисовки окна
+                number = self.tree.item(iid, "values")[0]
+                _, values, tags = self.format_row(int(number), new_row)
+                self.tree.item(iid, values=values, tags=tags)
+
+    def patch_result(self, entry, old_row, new_row):
+        """Изменение одной строки в загруженных страницах: (удалось ли, заменена ли строка на месте)"""
+        old_match = self.row_matches_filter(old_row) if old_row else False
+        new_match = self.row_matches_filter(new_row) if new_row else False
+        if None in (old_match, new_match):
+            return False, False
+        index = SORT_COLUMN_INDEX[self.current_sort_column or "e.id"]
+        descending = self.current_sort_direction == "DESC"
+
+        patched, in_place = True, False
+        if old_match and new_match and old_row[index] == new_row[index]:
+            # Порядок не изменился - строка заменяется на месте
+            entry.replace_rows(lambda row: row[0] == new_row[0], lambda row: new_row)
+            in_place = True
+        else:
+            if old_match:
+                patched = entry.remove_row(old_row, index, descending, self.page_size)
+            if patched and new_match:
+                patched = entry.insert_row(new_row, index, descending, self.page_size)
+
+        if patched and old_row and new_row and old_row[1] != new_row[1]:
+            # Новое имя руководителя у загруженных строк его подчиненных
+            renamed = entry.replace_rows(lambda row: row[6] == new_row[0],
+                                         lambda row: row[:5] + (new_row[1],) + row[6:])
+            if renamed and index == SORT_COLUMN_INDEX["b.full_name"]:
+                patched = False  # Подчиненные меняют место при сортировке по руководителю
+            elif renamed:
+                in_place = False
+        return patched, in_place
+
     def apply_sort(self):
         """Применение выбранной сортировки"""
         sort_column = self.sort_var.get()  # Выбранная колонка для сортировки
@@ -614,7 +1384,8 @@ class EmployeeDBApp:
 
     def show_hierarchy(self):
         """Отображение иерархии подчиненных для выбранного сотрудника"""
-        selected = self.tree.selection()  # Выбранный элемент в таблице
+        # Выбранный элемент в таблице (строки-заполнители не учитываются)
+        selected = [item for item in self.tree.selection() if not item.startswith("loading-")]
         if not selected:
             messagebox.showwarning("Внимание", "Выберите сотрудника")
             return
@@ -636,7 +1407,8 @@ class EmployeeDBApp:
         container.pack(fill=tk.BOTH, expand=True)
 
         # Создание Treeview для отображения иерархии
-        tree = ttk.Treeview(container, columns=("id", "full_name", "position"), show="tree headings")
+        tree = ttk.Treeview(container, columns=("id", "full_name", "position", "subordinates"),
+                            show="tree headings")
 
         tree.heading("#0", text="Сотрудник")  # Заголовок древовидного представления
         tree.column("#0", width=250)  # Ширина колонки
@@ -646,6 +1418,8 @@ class EmployeeDBApp:
         tree.column("full_name", width=250)  # Ширина колонки
         tree.heading("position", text="Должность")  # Заголовок колонки должности
         tree.column("position", width=200)  # Ширина колонки
+        tree.heading("subordinates", text="Подчиненных")  # Количество прямых подчиненных
+        tree.column("subordinates", width=90, anchor=tk.CENTER)
 
         # Вертикальный скроллбар
         vsb = ttk.Scrollbar(container, orient="vertical", command=tree.yview)
@@ -696,60 +1470,80 @@ class EmployeeDBApp:
         close_button = ttk.Button(main_frame, text="Закрыть", command=hierarchy_window.destroy)
         close_button.pack(pady=10)
 
-        try:
-            with self.conn.cursor() as cur:
-                # Рекурсивный запрос для получения иерархии подчиненных
-                hierarchy_query = """
-                WITH RECURSIVE employee_hierarchy AS (
-                    SELECT id, full_name, position, boss_id, 1 AS level
-                    FROM employees
-                    WHERE id = %s
-                    UNION ALL
-                    SELECT e.id, e.full_name, e.position, e.boss_id, eh.level + 1
-                    FROM employees e
-                    INNER JOIN employee_hierarchy eh ON e.boss_id = eh.id
-                )
-                SELECT id, full_name, position, boss_id, level
-                FROM employee_hierarchy
-                ORDER BY level, id
-                """
-                cur.execute(hierarchy_query, (emp_id,))
-                employees = cur.fetchall()  # Получение результатов
-
-                if not employees:
-                    messagebox.showinfo("Информация", "У выбранного сотрудника нет подчиненных")
-                    hierarchy_window.destroy()
-                    return
-
-                # Словарь для хранения узлов дерева
-                nodes = {}
-
-                for emp in employees:
-                    emp_id, full_name, position, boss_id, level = emp
-
-
-                    # Определяем тег для строки (чередование цветов)
-                    tag = f"level{level}" if level in level_colors else ""
-
-                    # Корневой элемент (выбранный сотрудник)
-                    if level == 1:
-                        node = tree.insert("", "end", iid=emp_id, text=f"{full_name} ({position})",
-                                           values=(emp_id, full_name, position), tags=(tag,),open=True)
-                        nodes[emp_id] = node
-                    else:
-                        # Поиск родительского узла
-                        parent_node = nodes.get(boss_id)
-                        if parent_node:
-                            # Добавление дочернего узла
-                            node = tree.insert(parent_node, "end", iid=emp_id, text=f"{full_name} ({position})",
-                                               values=(emp_id, full_name, position),tags=(tag,))
-                            nodes[emp_id] = node
+        loaded = set()  # Узлы, прямые подчиненные которых уже загружены (повторное раскрытие бесплатно)
+        group = f"hierarchy-{hierarchy_window}"  # Группа фоновых запросов окна
+
+        def insert_nodes(parent, rows, level):
+            """Добавление узлов уровня; у узлов с подчиненными - заглушка для раскрытия"""
+            profile = self.profiler.start(f"Иерархия, уровень {level}", len(rows))
+            tag = f"level{level}" if level in level_colors else ""
+            with profile.phase("format"):
+                items = [(child_id, f"{full_name} ({position})", (child_id, full_name, position, child_count))
+                         for child_id, full_name, position, child_count in rows]
+            with profile.phase("clear"):
+                if tree.exists(f"{parent}-loading"):
+                    tree.delete(f"{parent}-loading")
+            with profile.phase("insert"):
+                for child_id, text, values in items:
+                    node = tree.insert(parent, "end", iid=child_id, text=text, values=values, tags=(tag,))
+                    if values[3]:
+                        tree.insert(node, "end", iid=f"{child_id}-loading", text="Загрузка...")
+            profile.finish()
+
+        def load_children(node, level, open_node=False):
+            """Фоновая загрузка прямых подчиненных узла"""
+            loaded.add(node)
+
+            def on_loaded(rows):
+                if not hierarchy_window.winfo_exists():
+                    return  # Окно закрыто до получения результата
+                insert_nodes(node, rows, level)  # Заглушка раскрытия удаляется там же
+                if open_node:
+                    tree.item(node, open=True)
+
+            def on_error(error):
+                loaded.discard(node)  # Повторим загрузку при следующем раскрытии
+                messagebox.showerror("Ошибка БД", f"Ошибка получения иерархии:\n{str(error)}")
+
+            self.execute_query(HIERARCHY_CHILDREN_QUERY + " WHERE e.boss_id = %s ORDER BY e.id", (node,),
+                               on_loaded, group=group, on_error=on_error)
+
+        def on_open(event):
+            node = tree.focus()
+            if node and node not in loaded:
+                # Уровень узла определяется глубиной в дереве
+                level, parent = 2, tree.parent(node)
+                while parent:
+                    level, parent = level + 1, tree.parent(parent)
+                load_children(node, level)
+
+        def on_root_loaded(rows):
+            if not hierarchy_window.winfo_exists():
+                return
+            if not rows:
+                messagebox.showinfo("Информация", "Сотрудник не найден")
+                hierarchy_window.destroy()
+                return
+            insert_nodes("", rows, 1)
+            if rows[0][3]:
+                load_children(str(rows[0][0]), 2, open_node=True)  # Сразу показываем прямых подчиненных
+            else:
+                messagebox.showinfo("Информация", "У выбранного сотрудника нет подчиненных")
 
+        def on_error(error):
+            messagebox.showerror("Ошибка БД", f"Ошибка получения иерархии:\n{str(error)}")
+            if hierarchy_window.winfo_exists():
+                hierarchy_window.destroy()  # Закрытие окна при ошибке
 
+        def on_destroy(event):
+            # Незавершенные запросы закрытого окна отменяются на сервере
+            if event.widget is hierarchy_window:
+                self.executor.cancel_group(group)
 
-        except psycopg2.Error as e:
-            messagebox.showerror("Ошибка БД", f"Ошибка получения иерархии:\n{str(e)}")
-            hierarchy_window.destroy()  # Закрытие окна при ошибке
+        tree.bind("<<TreeviewOpen>>", on_open)
+        hierarchy_window.bind("<Destroy>", on_destroy)
+        self.execute_query(HIERARCHY_CHILDREN_QUERY + " WHERE e.id = %s", (emp_id,), on_root_loaded,
+                           group=group, on_error=on_error)
 
     def add_employee(self):
         """Добавление нового сотрудника"""
@@ -758,10 +1552,7 @@ class EmployeeDBApp:
         self.root.wait_window(dialog.top)  # Ожидание закрытия диалога
 
         if dialog.result:  # Если данные введены
-            query = """
-            INSERT INTO employees (full_name, position, hire_date, salary, boss_id)
-            VALUES (%s, %s, %s, %s, %s)
-            """
+            query = ADD_EMPLOYEE_QUERY
             params = (
                 dialog.result["full_name"],
                 dialog.result["position"],
@@ -770,13 +1561,16 @@ class EmployeeDBApp:
                 dialog.result["boss_id"]
             )
 
-            if self.execute_query(query, params):
-                self.load_employees()  # Обновление данных
-                messagebox.showinfo("Успех", "Сотрудник добавлен")  # Уведомление
+            def on_added(result):
+                self.apply_row_change(None, result[0])  # Новая строка - на место по сортировке
+                messagebox.showinfo("Успех", f"Сотрудник добавлен (ID: {result[0][0]})")  # Уведомление
+
+            self.execute_query(query, params, on_added)
 
     def edit_employee(self):
         """Редактирование данных сотрудника"""
-        selected = self.tree.selection()  # Выбранный сотрудник
+        # Выбранный сотрудник (строки-заполнители не учитываются)
+        selected = [item for item in self.tree.selection() if not item.startswith("loading-")]
         if not selected:
             messagebox.showwarning("Внимание", "Выберите сотрудника")
             return
@@ -785,10 +1579,12 @@ class EmployeeDBApp:
         # ID сотрудника находится во втором столбце
         emp_id = self.tree.item(item, "values")[1]
 
-        # Получение данных сотрудника
-        query = "SELECT * FROM employees WHERE id = %s"
-        employee = self.execute_query(query, (emp_id,))
+        # Получение данных сотрудника (в фоне), диалог открывается по готовности
+        query = "SELECT id, full_name, position, hire_date, salary, boss_id FROM employees WHERE id = %s"
+        self.execute_query(query, (emp_id,), lambda employee: self.open_edit_dialog(emp_id, employee))
 
+    def open_edit_dialog(self, emp_id, employee):
+        """Диалог редактирования с текущими данными сотрудника"""
         if employee:
             # Создание диалога с текущими данными
             dialog = EmployeeDialog(
@@ -806,12 +1602,7 @@ class EmployeeDBApp:
             self.root.wait_window(dialog.top)  # Ожидание закрытия диалога
 
             if dialog.result:
-                query = """
-                UPDATE employees
-                SET full_name = %s, position = %s, hire_date = %s, 
-                    salary = %s, boss_id = %s
-                WHERE id = %s
-                """
+                query = UPDATE_EMPLOYEE_QUERY
                 params = (
                     dialog.result["full_name"],
                     dialog.result["position"],
@@ -821,13 +1612,22 @@ class EmployeeDBApp:
                     emp_id
                 )
 
-                if self.execute_query(query, params):
-                    self.load_employees()  # Обновление данных
+                def on_updated(result):
+                    if not result:
+                        messagebox.showwarning("Внимание", "Сотрудник не найден (возможно, удален)")
+                        self.invalidate_results()
+                        self.load_employees(keep_position=True)
+                        return
+                    # Строка после изменения и до него
+                    self.apply_row_change(tuple(result[0][7:]), tuple(result[0][:7]))
                     messagebox.showinfo("Успех", "Данные обновлены")  # Уведомление
 
+                self.execute_query(query, params, on_updated)
+
     def delete_employee(self):
         """Удаление сотрудника"""
-        selected = self.tree.selection()  # Выбранный сотрудник
+        # Выбранный сотрудник (строки-заполнители не учитываются)
+        selected = [item for item in self.tree.selection() if not item.startswith("loading-")]
         if not selected:
             messagebox.showwarning("Внимание", "Выберите сотрудника")
             return
@@ -843,15 +1643,24 @@ class EmployeeDBApp:
                 "Подтверждение",
                 f"Удалить {emp_name} (ID: {emp_id})?"
         ):
-            query = "DELETE FROM employees WHERE id = %s"  # Запрос на удаление
-            if self.execute_query(query, (emp_id,)):
-                self.load_employees()  # Обновление данных
+            query = DELETE_EMPLOYEE_QUERY  # Запрос на удаление (возвращает удаленную строку)
+
+            def on_deleted(result):
+                if result:
+                    self.apply_row_change(result[0], None)
+                else:
+                    self.invalidate_results()
+                    self.load_employees(keep_position=True)
                 messagebox.showinfo("Успех", "Сотрудник удален")  # Уведомление
 
+            self.execute_query(query, (emp_id,), on_deleted)
+
     def __del__(self):
-        """Закрытие соединения с БД при уничтожении объекта"""
-        if self.conn:
-            self.conn.close()  # Закрытие соединения
+        """Остановка фоновых запросов при уничтожении объекта"""
+        if self.listener:
+            self.listener.stop()
+        if self.executor:
+            self.executor.shutdown()  # Соединения пула закрываются при выходе (db.close_pool)
 
 
 class EmployeeDialog:
@@ -0,0 +1,136 @@
+import queue  # Очереди заданий и результатов
+import threading  # Фоновые потоки выполнения запросов
+
+import psycopg2  # Библиотека для работы с PostgreSQL
+
+
+class QueryJob:
+    """Задание для фонового выполнения"""
+
+    def __init__(self, func, on_success, on_error, group):
+        self.func = func  # Функция, получающая соединение и возвращающая результат
+        self.on_success = on_success  # Обработчик результата (вызывается в потоке Tk)
+        self.on_error = on_error  # Обработчик ошибки (вызывается в потоке Tk)
+        self.group = group  # Группа заданий для совместной отмены
+        self.cancelled = False  # Признак отмены
+
+
+class QueryExecutor:
+    """Выполнение SQL-запросов в фоновых потоках с передачей результатов в главный цикл Tk"""
+
+    def __init__(self, root, acquire, release, workers=2, on_busy=None, poll_interval=50):
+        self.root = root  # Корневое окно для root.after
+        self.acquire = acquire  # Получение соединения (из пула) на время задания
+        self.release = release  # Возврат соединения
+        self.on_busy = on_busy  # Вызывается с True/False при смене состояния занятости
+        self.poll_interval = poll_interval  # Интервал опроса очереди результатов (мс)
+
+        self.jobs = queue.Queue()  # Задания, ожидающие выполнения
+        self.results = queue.Queue()  # Готовые результаты для потока Tk
+        self.lock = threading.Lock()
+        self.running = {}  # Выполняющиеся задания: задание -> соединение
+        self.queued = []  # Задания в очереди (для отмены до начала выполнения)
+        self.active = 0  # Количество незавершенных заданий
+        self.busy = False
+
+        self.threads = []
+        for _ in range(workers):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, func, on_success=None, on_error=None, group=None):
+        """Постановка задания в очередь; func(conn) выполняется в фоновом потоке"""
+        job = QueryJob(func, on_success, on_error, group)
+        with self.lock:
+            self.queued.append(job)
+            self.active += 1
+        self.jobs.put(job)
+        self._update_busy()
+        return job
+
+    def cancel_group(self, group):
+        """Отмена всех заданий группы, в том числе выполняющихся на сервере"""
+        self._cancel(lambda job: job.group == group)
+
+    def cancel_all(self):
+        """Отмена всех заданий"""
+        self._cancel(lambda job: True)
+
+    def _cancel(self, predicate):
+        with self.lock:
+            for job in self.queued:
+                if predicate(job):
+                    job.cancelled = True
+            for job, conn in self.running.items():
+                if predicate(job) and not job.cancelled:
+                    job.cancelled = True
+                    try:
+                        conn.cancel()  # Прерывание запроса на стороне сервера
+                    except psycopg2.Error:
+                        pass
+
+    def _worker(self):
+        """Цикл фонового потока: соединение берется из пула на время каждого задания"""
+        while True:
+            job = self.jobs.get()
+            if job is None:  # Сигнал завершения
+                break
+            with self.lock:
+                self.queued.remove(job)
+                if job.cancelled:
+                    self.results.put((job, None, None))
+                    continue
+            conn = None
+            try:
+                conn = self.acquire()
+                with self.lock:
+                    self.running[job] = conn
+                result = job.func(conn)
+                conn.commit()  # Завершаем транзакцию, чтобы не держать снимок данных
+                self.results.put((job, result, None))
+            except Exception as e:
+                if conn is not None and not conn.closed:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        pass  # Разорванное соединение будет заменено пулом
+                self.results.put((job, None, e))
+            finally:
+                with self.lock:
+                    self.running.pop(job, None)
+                if conn is not None:
+                    self.release(conn)
+
+    def _poll(self):
+        """Передача готовых результатов обработчикам в потоке Tk"""
+        while True:
+            try:
+                job, result, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            with self.lock:
+                self.active -= 1
+            if job.cancelled:
+                continue  # Результат устаревшего запроса не нужен
+            if error is not None:
+                if job.on_error:
+                    job.on_error(error)
+            elif job.on_success:
+                job.on_success(result)
+        self._update_busy()
+        self.root.after(self.poll_interval, self._poll)
+
+    def _update_busy(self):
+        busy = self.active > 0
+        if busy != self.busy:
+            self.busy = busy
+            if self.on_busy:
+                self.on_busy(busy)
+
+    def shutdown(self):
+        """Остановка фоновых потоков"""
+        self.cancel_all()
+        for _ in self.threads:
+            self.jobs.put(None)
@@ -0,0 +1,116 @@
+"""Профилирование отрисовки оконного приложения.
+
+Каждое обновление таблицы (или уровня окна иерархии) делится на фазы: запрос (execute),
+получение строк (fetch), форматирование, очистка виджета, вставка строк и отрисовка
+(обработка отложенных событий Tk). Разбивка выводится в статусной строке, по желанию
+для каждого действия сохраняется статистика cProfile (файлы .prof, просмотр: python -m pstats).
+"""
+import cProfile
+import os
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+DEFAULT_PROFILE_DIR = "ui_profiles"
+
+# Фазы в порядке вывода и их названия в статусной строке
+PHASES = {
+    "query": "запрос",
+    "fetch": "получение",
+    "format": "форматирование",
+    "clear": "очистка",
+    "insert": "вставка",
+    "redraw": "отрисовка"
+}
+
+
+class ActionProfile:
+    """Замер одного действия: время по фазам в секундах"""
+
+    def __init__(self, profiler, action, rows=0):
+        self.profiler = profiler
+        self.action = action  # Название действия для статусной строки и имени файла
+        self.rows = rows  # Количество выведенных строк
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.cprofile = None
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """Замер фазы; время повторных замеров одной фазы суммируется"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - started
+
+    def finish(self):
+        """Завершение действия: замер отрисовки и вывод разбивки"""
+        self.profiler.finish(self)
+
+    def summary(self):
+        """Разбивка по фазам для статусной строки"""
+        parts = [f"{PHASES[name]} {seconds * 1000:.1f}" for name, seconds in self.phases.items()]
+        total = sum(self.phases.values()) * 1000
+        return f"{self.action} ({self.rows} стр.): {total:.1f} мс = " + ", ".join(parts)
+
+
+class RenderProfiler:
+    """Профилирование действий оконного приложения; выключено по умолчанию"""
+
+    def __init__(self, root, on_report):
+        self.root = root  # Корневое окно: update_idletasks для замера отрисовки
+        self.on_report = on_report  # Вызывается со строкой разбивки после каждого действия
+        self.enabled = False
+        self.cprofile = False  # Сохранять статистику cProfile по действиям
+        self.profile_dir = DEFAULT_PROFILE_DIR
+        self.query_times = None  # (execute, fetch) запроса, результат которого сейчас выводится
+        self.counter = 0  # Номер действия в имени файла статистики
+
+    def configure(self, enabled, cprofile=False, profile_dir=None):
+        """Включение/выключение профилирования"""
+        self.enabled = enabled
+        self.cprofile = enabled and cprofile
+        if profile_dir:
+            self.profile_dir = profile_dir
+
+    @contextmanager
+    def query_result(self, execute_seconds, fetch_seconds):
+        """Время запроса, результат которого обрабатывается внутри блока"""
+        self.query_times = (execute_seconds or 0.0, fetch_seconds or 0.0)
+        try:
+            yield
+        finally:
+            self.query_times = None
+
+    def start(self, action, rows=0):
+        """Начало действия; время запроса берется из обрабатываемого результата"""
+        profile = ActionProfile(self, action, rows)
+        if not self.enabled:
+            return profile
+        if self.query_times:
+            profile.phases["query"], profile.phases["fetch"] = self.query_times
+        if self.cprofile:
+            profile.cprofile = cProfile.Profile()
+            profile.cprofile.enable()
+        return profile
+
+    def finish(self, profile):
+        """Отрисовка отложенных изменений виджетов, сохранение статистики и вывод разбивки"""
+        if not self.enabled:
+            return
+        with profile.phase("redraw"):
+            self.root.update_idletasks()
+        if profile.cprofile is not None:
+            profile.cprofile.disable()
+            self.dump(profile)
+        self.on_report(profile.summary())
+
+    def dump(self, profile):
+        """Сохранение статистики cProfile действия"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self.counter += 1
+        name = re.sub(r"\W+", "_", profile.action).strip("_") or "action"
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        profile.cprofile.dump_stats(os.path.join(self.profile_dir, f"{stamp}-{self.counter:04d}-{name}.prof"))
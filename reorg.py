@@ -0,0 +1,165 @@
+"""Перевод сотрудников к новым руководителям (реорганизация) одной транзакцией.
+
+Перемещения (ID сотрудника -> ID нового руководителя) загружаются во временную таблицу
+и проверяются вместе: существование сотрудников и руководителей, циклы и глубина иерархии
+после всех перемещений. Новые пути (ltree) вычисляются по старым путям без обхода всей
+иерархии: у каждой строки перемещаемых поддеревьев заменяется только префикс пути.
+
+Цикл ищется по графу между перемещениями: для перемещения X "якорь" - ближайший к новому
+руководителю перемещаемый сотрудник на его старом пути (или сам руководитель). Если цепочка
+якорей не доходит до неперемещаемой части иерархии, перемещения образуют цикл.
+"""
+import db_schema
+
+# Допустимая глубина иерархии (количество уровней, CEO - уровень 1)
+MAX_DEPTH = 20
+
+# Цепочки якорей длиннее количества перемещений не бывает, поэтому рекурсия всегда завершается:
+# перемещения, входящие в цикл (и зависящие от них), просто не получают нового пути
+NEW_PATHS = """
+    WITH RECURSIVE anchors AS (
+        SELECT r.id, b.path AS boss_path, a.id AS anchor_id, a.old_path AS anchor_path
+        FROM employees_reorg r
+        LEFT JOIN employees b ON b.id = r.boss_id
+        LEFT JOIN LATERAL (
+            SELECT m.id, m.old_path
+            FROM employees_reorg m
+            WHERE b.path <@ m.old_path
+            ORDER BY nlevel(m.old_path) DESC
+            LIMIT 1
+        ) a ON true
+        WHERE r.old_path IS NOT NULL AND (r.boss_id IS NULL OR b.id IS NOT NULL)
+    ),
+    paths AS (
+        SELECT id, coalesce(boss_path || text2ltree(id::text), text2ltree(id::text)) AS path
+        FROM anchors
+        WHERE anchor_id IS NULL
+        UNION ALL
+        SELECT a.id,
+               p.path
+               || CASE WHEN nlevel(a.boss_path) > nlevel(a.anchor_path)
+                       THEN subpath(a.boss_path, nlevel(a.anchor_path)) ELSE ''::ltree END
+               || text2ltree(a.id::text)
+        FROM anchors a
+        INNER JOIN paths p ON p.id = a.anchor_id
+    )
+    UPDATE employees_reorg r SET path = p.path FROM paths p WHERE r.id = p.id
+"""
+
+# Новый путь каждой строки перемещаемых поддеревьев: префикс старого пути ближайшего
+# перемещаемого руководителя (или самого сотрудника) заменяется его новым путем
+ROW_PATHS = """
+    INSERT INTO employees_reorg_rows (id, move_id, path)
+    SELECT DISTINCT ON (e.id)
+           e.id, r.id,
+           r.path || CASE WHEN e.id = r.id THEN ''::ltree ELSE subpath(e.path, nlevel(r.old_path)) END
+    FROM employees_reorg r
+    INNER JOIN employees e ON e.path <@ r.old_path
+    WHERE r.path IS NOT NULL
+    ORDER BY e.id, nlevel(r.old_path) DESC
+"""
+
+# Проверка всех перемещений одним проходом: (ID сотрудника, описание ошибки)
+VALIDATE = """
+    SELECT r.id, 'сотрудник не найден'
+    FROM employees_reorg r
+    WHERE r.old_path IS NULL
+    UNION ALL
+    SELECT r.id, 'руководитель с ID ' || r.boss_id || ' не найден'
+    FROM employees_reorg r
+    WHERE r.boss_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM employees e WHERE e.id = r.boss_id)
+    UNION ALL
+    SELECT r.id, 'циклическая ссылка: руководитель ' || r.boss_id || ' окажется в подчинении сотрудника'
+    FROM employees_reorg r
+    WHERE r.path IS NULL AND r.old_path IS NOT NULL
+      AND (r.boss_id IS NULL OR EXISTS (SELECT 1 FROM employees e WHERE e.id = r.boss_id))
+    UNION ALL
+    SELECT move_id, 'глубина иерархии после перемещения ' || max(nlevel(path)) || ' больше допустимой ' || %s
+    FROM employees_reorg_rows
+    GROUP BY move_id
+    HAVING max(nlevel(path)) > %s
+    ORDER BY 1
+"""
+
+# Перенос путей и смена руководителей одной командой (построчные триггеры путей отключены)
+APPLY = """
+    UPDATE employees e
+    SET path = p.path,
+        boss_id = CASE WHEN r.id IS NULL THEN e.boss_id ELSE r.boss_id END
+    FROM employees_reorg_rows p
+    LEFT JOIN employees_reorg r ON r.id = p.id
+    WHERE e.id = p.id
+      AND (e.path IS DISTINCT FROM p.path OR (r.id IS NOT NULL AND e.boss_id IS DISTINCT FROM r.boss_id))
+"""
+
+
+class ReorgError(ValueError):
+    """Перемещения не прошли проверку; problems - список (ID сотрудника, описание)"""
+
+    def __init__(self, problems):
+        super().__init__(f"ошибок в перемещениях: {len(problems)}")
+        self.problems = problems
+
+
+def reorganize(conn, moves, max_depth=MAX_DEPTH, dry_run=False):
+    """Применение перемещений {ID сотрудника: ID руководителя или None} одной транзакцией.
+
+    Возвращает (количество сотрудников со сменой руководителя, количество строк с новым путем).
+    При ошибках проверки транзакция откатывается и выбрасывается ReorgError; при dry_run
+    проверенные перемещения не применяются.
+    """
+    ids = list(moves)
+    with conn.cursor() as cursor:
+        try:
+            # Параллельные изменения иерархии могли бы сделать проверку устаревшей
+            cursor.execute("LOCK TABLE employees IN SHARE ROW EXCLUSIVE MODE")
+            cursor.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS employees_reorg (
+                    id INTEGER PRIMARY KEY,
+                    boss_id INTEGER,
+                    old_boss_id INTEGER,
+                    old_path ltree,
+                    path ltree
+                )
+            """)
+            cursor.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS employees_reorg_rows (
+                    id INTEGER PRIMARY KEY,
+                    move_id INTEGER NOT NULL,
+                    path ltree NOT NULL
+                )
+            """)
+            cursor.execute("TRUNCATE employees_reorg, employees_reorg_rows")
+            cursor.execute("""
+                INSERT INTO employees_reorg (id, boss_id, old_boss_id, old_path)
+                SELECT m.id, m.boss_id, e.boss_id, e.path
+                FROM unnest(%s::integer[], %s::integer[]) AS m(id, boss_id)
+                LEFT JOIN employees e ON e.id = m.id
+            """, (ids, [moves[employee_id] for employee_id in ids]))
+            cursor.execute("ANALYZE employees_reorg")
+
+            cursor.execute(NEW_PATHS)
+            cursor.execute(ROW_PATHS)
+            cursor.execute(VALIDATE, (max_depth, max_depth))
+            problems = cursor.fetchall()
+            if problems:
+                raise ReorgError(problems)
+
+            cursor.execute("SELECT count(*) FROM employees_reorg WHERE boss_id IS DISTINCT FROM old_boss_id")
+            moved = cursor.fetchone()[0]
+            if dry_run:
+                cursor.execute("SELECT count(*) FROM employees_reorg_rows r "
+                               "INNER JOIN employees e ON e.id = r.id WHERE e.path IS DISTINCT FROM r.path")
+                updated = cursor.fetchone()[0]
+                conn.rollback()
+                return moved, updated
+
+            cursor.execute("SELECT set_config(%s, 'on', true)", (db_schema.REORG_SETTING,))
+            cursor.execute(APPLY)
+            updated = cursor.rowcount
+            cursor.execute("SELECT set_config(%s, 'off', true)", (db_schema.REORG_SETTING,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return moved, updated
@@ -0,0 +1,205 @@
+from collections import OrderedDict  # LRU-порядок записей кэша
+
+
+class ResultEntry:
+    """Результат запроса таблицы: общее количество строк и загруженные страницы"""
+
+    def __init__(self, total=None, pages=None):
+        self.total = total  # None - количество еще не получено
+        self.pages = pages if pages is not None else {}  # Номер страницы -> список строк
+
+    def is_complete(self, page_size):
+        """Загружены ли все строки результата"""
+        if self.total is None:
+            return False
+        page_count = (self.total + page_size - 1) // page_size
+        return all(page in self.pages for page in range(page_count))
+
+    def all_rows(self, page_size):
+        """Все строки результата по порядку (только для полностью загруженного результата)"""
+        rows = []
+        for page in range((self.total + page_size - 1) // page_size):
+            rows.extend(self.pages[page])
+        return rows
+
+    def runs(self, page_size):
+        """Непрерывные участки загруженных страниц: список [индекс первой строки, строки]"""
+        runs = []
+        for page in sorted(self.pages):
+            if runs and runs[-1][0] + len(runs[-1][1]) == page * page_size:
+                runs[-1][1].extend(self.pages[page])
+            else:
+                runs.append([page * page_size, list(self.pages[page])])
+        return runs
+
+    def set_runs(self, runs, page_size):
+        """Разбиение участков на страницы; неполные страницы (кроме последней) не сохраняются"""
+        pages = {}
+        for start, rows in runs:
+            end = start + len(rows)
+            for page in range((start + page_size - 1) // page_size, end // page_size + 1):
+                page_start = page * page_size
+                page_end = min(page_start + page_size, self.total)
+                if page_start < page_end <= end:
+                    pages[page] = rows[page_start - start:page_end - start]
+        # Словарь страниц изменяется на месте: на него ссылается таблица окна
+        self.pages.clear()
+        self.pages.update(pages)
+
+    def find_row(self, row_id, page_size):
+        """Индекс строки с ID row_id среди загруженных или None"""
+        for page, rows in self.pages.items():
+            for position, row in enumerate(rows):
+                if row[0] == row_id:
+                    return page * page_size + position
+        return None
+
+    def remove_row(self, row, index, descending, page_size):
+        """Удаление строки из результата; False, если ее место определить нельзя (нужна перезагрузка)"""
+        if self.total is None:
+            return False
+        runs = self.runs(page_size)
+        removed = False
+        for run in runs:
+            start, rows = run
+            if removed:
+                run[0] -= 1  # Строки после удаленной сдвигаются
+                continue
+            positions = [i for i, candidate in enumerate(rows) if candidate[0] == row[0]]
+            if positions:
+                del rows[positions[0]]
+                removed = True
+            elif rows and compare_rows(row, rows[0], index, descending) < 0:
+                if start == 0:
+                    return False  # Строка должна быть в начале результата, но ее там нет
+                run[0] -= 1  # Строка была в незагруженной части перед участком
+                removed = True
+            elif rows and compare_rows(row, rows[-1], index, descending) < 0:
+                return False  # Строка должна быть внутри участка, но ее там нет
+        self.total -= 1
+        self.set_runs(runs, page_size)
+        return True
+
+    def insert_row(self, row, index, descending, page_size):
+        """Добавление строки на место по порядку сортировки; False, если нужна перезагрузка"""
+        if self.total is None:
+            return False
+        runs = self.runs(page_size)
+        inserted = False
+        for run in runs:
+            start, rows = run
+            if inserted:
+                run[0] += 1
+                continue
+            # Первая строка участка, идущая после добавляемой
+            position = next((i for i, candidate in enumerate(rows)
+                             if compare_rows(row, candidate, index, descending) < 0), len(rows))
+            if 0 < position < len(rows) or (position == 0 and start == 0):
+                rows.insert(position, row)
+                inserted = True
+            elif position == 0:
+                run[0] += 1  # Строка попадает в незагруженную часть перед участком
+                inserted = True
+            elif start + len(rows) == self.total:
+                rows.append(row)  # Строка - последняя в результате
+                inserted = True
+        self.total += 1
+        self.set_runs(runs, page_size)
+        return True
+
+    def replace_rows(self, predicate, update):
+        """Замена загруженных строк, для которых predicate истинно, на update(строка); количество замен"""
+        count = 0
+        for rows in self.pages.values():
+            for position, row in enumerate(rows):
+                if predicate(row):
+                    rows[position] = update(row)
+                    count += 1
+        return count
+
+
+def compare_rows(a, b, index, descending):
+    """Сравнение строк в порядке ORDER BY колонка ASC|DESC, id: -1, 0 или 1.
+
+    Строки сравниваются по кодовым точкам, как текст с COLLATE "C" в PostgreSQL.
+    """
+    a_value, b_value = a[index], b[index]
+    if (a_value is None) != (b_value is None):
+        # NULL при сортировке по возрастанию - последние, по убыванию - первые
+        result = 1 if a_value is None else -1
+        return -result if descending else result
+    if a_value != b_value and a_value is not None:
+        result = 1 if a_value > b_value else -1
+        return -result if descending else result
+    return (a[0] > b[0]) - (a[0] < b[0])
+
+
+def sort_rows(rows, index, descending):
+    """Сортировка строк так же, как ORDER BY колонка ASC|DESC, id в PostgreSQL.
+
+    NULL при сортировке по возрастанию идут последними, по убыванию - первыми;
+    текстовые колонки - в порядке COLLATE "C" (см. compare_rows).
+    """
+    rows = sorted(rows, key=lambda row: row[0])  # Дополнительный порядок по id
+    # Сортировка устойчива, поэтому при равных значениях сохраняется порядок по id
+    return sorted(rows, key=lambda row: (row[index] is None, row[index]), reverse=descending)
+
+
+def split_pages(rows, page_size):
+    """Разбиение строк на страницы"""
+    return {page: rows[start:start + page_size]
+            for page, start in enumerate(range(0, len(rows), page_size))}
+
+
+def hashable_params(params):
+    """Параметры запроса кортежем; списки (массивы для = ANY(%s)) - тоже кортежами"""
+    return tuple(tuple(value) if isinstance(value, list) else value for value in params or ())
+
+
+class ResultCache:
+    """Кэш результатов таблицы оконного приложения по ключу (фильтр, параметры, сортировка).
+
+    Повторная сортировка уже полностью загруженного результата выполняется в памяти.
+    Кэш сбрасывается после изменений из приложения и по уведомлению LISTEN/NOTIFY
+    об изменениях таблицы другими клиентами.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # Ключ -> ResultEntry
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(condition, params, sort_column, sort_direction):
+        """Ключ результата; параметры приводятся к кортежу"""
+        return condition, hashable_params(params), sort_column, sort_direction
+
+    def get(self, key):
+        """Запись кэша или None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        """Сохранение записи с вытеснением давно не использованных"""
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def find_complete(self, condition, params, page_size):
+        """Полностью загруженный результат с тем же фильтром (при любой сортировке)"""
+        params = hashable_params(params)
+        for (entry_condition, entry_params, _, _), entry in reversed(self.entries.items()):
+            if entry_condition == condition and entry_params == params and entry.is_complete(page_size):
+                return entry
+        return None
+
+    def invalidate(self):
+        """Сброс всех результатов после изменения данных"""
+        self.entries.clear()
@@ -0,0 +1,220 @@
+"""Локальный колоночный снимок таблицы employees для фильтрации без обращения к БД.
+
+Колонки хранятся в файлах .npy и открываются с отображением в память:
+id, salary, boss_id - int32 (NULL в boss_id - NULL_ID), hire_date - datetime64[D],
+position - коды словаря (список должностей в meta.json), full_name - строки фиксированной длины.
+Строки снимка упорядочены по id.
+
+Снимок обновляется инкрементально по водяному знаку xmin: повторно читаются только строки,
+измененные транзакциями начиная с xmin снимка данных на момент прошлой загрузки,
+а удаленные строки определяются по списку id.
+"""
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+# Значение boss_id = NULL в колонке int32
+NULL_ID = -1
+# Количество строк, получаемых с сервера за один раз
+FETCH_SIZE = 10000
+META_FILE = "meta.json"
+COLUMNS = ["id", "full_name", "position", "hire_date", "salary", "boss_id"]
+
+# Операторы фильтров CLI в виде векторных сравнений
+FILTER_OPERATORS = {
+    "=": np.equal,
+    "!=": np.not_equal,
+    ">": np.greater,
+    "<": np.less,
+    ">=": np.greater_equal,
+    "<=": np.less_equal
+}
+
+# Водяной знак и строки - из одного снимка данных
+SNAPSHOT_QUERY = """
+    SELECT id, full_name, position, hire_date, salary, boss_id
+    FROM employees {where}
+    ORDER BY id
+"""
+
+
+class EmployeeSnapshot:
+    """Колоночный снимок таблицы employees"""
+
+    def __init__(self, path, columns, positions, watermark):
+        self.path = path  # Каталог файлов снимка
+        self.columns = columns  # Название колонки -> массив NumPy
+        self.positions = positions  # Словарь должностей: код -> название
+        self.watermark = watermark  # xmin снимка данных последней загрузки (64-битный txid)
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    @classmethod
+    def create(cls, conn, path):
+        """Полная загрузка таблицы из БД и сохранение снимка"""
+        with conn.cursor() as cursor:
+            watermark = read_watermark(cursor)
+        positions = []
+        columns = fetch_columns(conn, "", None, positions)
+        conn.commit()
+        snapshot = cls(path, columns, positions, watermark)
+        snapshot.save()
+        return snapshot
+
+    @classmethod
+    def open(cls, path):
+        """Открытие сохраненного снимка (колонки отображаются в память, а не читаются целиком)"""
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in COLUMNS}
+        return cls(path, columns, meta["positions"], meta["watermark"])
+
+    def save(self):
+        """Запись колонок и метаданных снимка"""
+        os.makedirs(self.path, exist_ok=True)
+        for name in COLUMNS:
+            # Файл заменяется целиком: открытые отображения прежней версии остаются корректными
+            target = os.path.join(self.path, f"{name}.npy")
+            with open(target + ".tmp", "wb") as column_file:
+                np.save(column_file, np.asarray(self.columns[name]))
+            os.replace(target + ".tmp", target)
+        meta = {
+            "positions": self.positions,
+            "watermark": self.watermark,
+            "rows": len(self),
+            "saved_at": datetime.now().isoformat(timespec="seconds")
+        }
+        with open(os.path.join(self.path, META_FILE), "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file, ensure_ascii=False, indent=2)
+
+    def refresh(self, conn):
+        """Инкрементальное обновление снимка, возвращает (изменено строк, удалено строк)
+
+        Если счетчик транзакций перешел в новую эпоху (32-битный xmin строк нельзя сравнить
+        с водяным знаком), снимок загружается заново.
+        """
+        with conn.cursor() as cursor:
+            watermark = read_watermark(cursor)
+            if watermark >> 32 != self.watermark >> 32:
+                conn.rollback()
+                fresh = EmployeeSnapshot.create(conn, self.path)
+                self.columns, self.positions, self.watermark = fresh.columns, fresh.positions, fresh.watermark
+                return len(self), 0
+
+            cursor.execute("SELECT id FROM employees")
+            current_ids = np.fromiter((row[0] for row in cursor), dtype=np.int32)
+
+        positions = list(self.positions)
+        changed = fetch_columns(conn, "WHERE xmin::text::bigint >= %s", (self.watermark & 0xFFFFFFFF,), positions)
+        conn.commit()
+
+        ids = np.asarray(self.columns["id"])
+        keep = np.isin(ids, current_ids) & ~np.isin(ids, changed["id"])
+        deleted = int(len(ids) - np.count_nonzero(np.isin(ids, current_ids)))
+
+        merged = {}
+        for name in COLUMNS:
+            merged[name] = np.concatenate([np.asarray(self.columns[name])[keep], changed[name]])
+        order = np.argsort(merged["id"], kind="stable")
+        self.columns = {name: values[order] for name, values in merged.items()}
+        self.positions = positions
+        self.watermark = watermark
+        self.save()
+        return len(changed["id"]), deleted
+
+    def filter_mask(self, conditions):
+        """Маска строк, удовлетворяющих всем условиям (поле, оператор, значение)"""
+        mask = np.ones(len(self), dtype=bool)
+        for field, op, value in conditions:
+            compare = FILTER_OPERATORS[op]
+            column = self.columns[field]
+            if field == "position":
+                # Условие вычисляется по словарю должностей и переносится на коды
+                matches = compare(np.array(self.positions, dtype=str), str(value))
+                mask &= matches[column] if len(self.positions) else False
+            elif field == "hire_date":
+                mask &= compare(column, np.datetime64(value, "D"))
+            elif field == "full_name":
+                mask &= compare(column, str(value))
+            else:
+                mask &= compare(column, int(value))
+                if field == "boss_id":
+                    mask &= column != NULL_ID  # Сравнение с NULL в SQL не выполняется
+        return mask
+
+    def sort_key(self, sort_by, indices):
+        """Ключ сортировки строк indices по колонке sort_by (NULL - в конце, как в PostgreSQL)"""
+        column = np.asarray(self.columns[sort_by])[indices]
+        if sort_by == "position":
+            # Коды словаря заменяются рангами названий должностей
+            ranks = np.empty(len(self.positions), dtype=np.int32)
+            ranks[np.argsort(np.array(self.positions, dtype=str), kind="stable")] = np.arange(len(self.positions))
+            return ranks[column]
+        if sort_by == "boss_id":
+            return np.where(column == NULL_ID, np.iinfo(np.int32).max, column)
+        return column
+
+    def query(self, conditions, sort_by="id", limit=None):
+        """Строки (как SELECT * ... ORDER BY sort_by, id LIMIT limit) списком кортежей"""
+        indices = np.flatnonzero(self.filter_mask(conditions))
+        if sort_by != "id":
+            # Строки снимка упорядочены по id, устойчивая сортировка сохраняет этот порядок при равенстве
+            indices = indices[np.argsort(self.sort_key(sort_by, indices), kind="stable")]
+        if limit:
+            indices = indices[:limit]
+        return self.rows(indices)
+
+    def rows(self, indices):
+        """Преобразование строк снимка в кортежи Python"""
+        columns = [
+            self.columns["id"][indices].tolist(),
+            self.columns["full_name"][indices].tolist(),
+            [self.positions[code] for code in self.columns["position"][indices].tolist()],
+            self.columns["hire_date"][indices].astype(object).tolist(),
+            self.columns["salary"][indices].tolist(),
+            [None if boss_id == NULL_ID else boss_id for boss_id in self.columns["boss_id"][indices].tolist()]
+        ]
+        return list(zip(*columns))
+
+
+def read_watermark(cursor):
+    """Уровень изоляции REPEATABLE READ и xmin снимка данных текущей транзакции.
+
+    Все транзакции с номером меньше xmin завершены, поэтому строки, измененные позже,
+    имеют xmin не меньше водяного знака.
+    """
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+    cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+    return cursor.fetchone()[0]
+
+
+def fetch_columns(conn, where, params, positions):
+    """Чтение строк серверным курсором в колонки; новые должности добавляются в словарь positions"""
+    codes = {name: code for code, name in enumerate(positions)}
+    ids, names, position_codes, hire_dates, salaries, boss_ids = [], [], [], [], [], []
+
+    with conn.cursor(name="employees_snapshot") as cursor:
+        cursor.itersize = FETCH_SIZE
+        cursor.execute(SNAPSHOT_QUERY.format(where=where), params)
+        for employee_id, full_name, position, hire_date, salary, boss_id in cursor:
+            if position not in codes:
+                codes[position] = len(positions)
+                positions.append(position)
+            ids.append(employee_id)
+            names.append(full_name)
+            position_codes.append(codes[position])
+            hire_dates.append(hire_date)
+            salaries.append(salary)
+            boss_ids.append(NULL_ID if boss_id is None else boss_id)
+
+    return {
+        "id": np.array(ids, dtype=np.int32),
+        "full_name": np.array(names, dtype=str),
+        "position": np.array(position_codes, dtype=np.int16),
+        "hire_date": np.array(hire_dates, dtype="datetime64[D]"),
+        "salary": np.array(salaries, dtype=np.int32),
+        "boss_id": np.array(boss_ids, dtype=np.int32)
+    }
@@ -0,0 +1,287 @@
+import sqlite3
+from datetime import date
+
+import pytest
+from psycopg2 import sql
+
+import filter_lang
+from filter_lang import And, Comparison, FilterError, Not, Or
+
+
+def render(composable):
+    """Текст sql.Composable без соединения с БД (Identifier.as_string требует соединения)"""
+    if isinstance(composable, sql.Composed):
+        return "".join(render(part) for part in composable.seq)
+    if isinstance(composable, sql.Identifier):
+        return ".".join('"' + name.replace('"', '""') + '"' for name in composable.strings)
+    if isinstance(composable, sql.SQL):
+        return composable.string
+    raise TypeError(f"неподдерживаемый элемент: {composable!r}")
+
+
+def compiled(text, alias=None):
+    condition, params = filter_lang.compile_sql(filter_lang.parse(text), alias)
+    return render(condition), params
+
+
+def describe(node):
+    """Структура дерева для сравнения в тестах"""
+    if isinstance(node, (And, Or)):
+        return (type(node).__name__, [describe(item) for item in node.items])
+    if isinstance(node, Not):
+        return ("Not", describe(node.item))
+    if isinstance(node, Comparison):
+        return (node.field, node.op, node.value)
+    return type(node).__name__
+
+
+# Приоритет: NOT выше AND, AND выше OR; скобки меняют порядок
+
+@pytest.mark.parametrize("text, tree", [
+    ("id = 1 OR salary = 2 AND boss_id = 3",
+     ("Or", [("id", "=", 1), ("And", [("salary", "=", 2), ("boss_id", "=", 3)])])),
+    ("id = 1 AND salary = 2 OR boss_id = 3",
+     ("Or", [("And", [("id", "=", 1), ("salary", "=", 2)]), ("boss_id", "=", 3)])),
+    ("(id = 1 OR salary = 2) AND boss_id = 3",
+     ("And", [("Or", [("id", "=", 1), ("salary", "=", 2)]), ("boss_id", "=", 3)])),
+    ("NOT id = 1 AND salary = 2",
+     ("And", [("Not", ("id", "=", 1)), ("salary", "=", 2)])),
+    ("NOT (id = 1 AND salary = 2)",
+     ("Not", ("And", [("id", "=", 1), ("salary", "=", 2)]))),
+    ("NOT NOT id = 1", ("Not", ("Not", ("id", "=", 1)))),
+    ("((id = 1))", ("id", "=", 1)),
+    ("id = 1 and salary = 2 or boss_id = 3",
+     ("Or", [("And", [("id", "=", 1), ("salary", "=", 2)]), ("boss_id", "=", 3)])),
+])
+def test_precedence(text, tree):
+    assert describe(filter_lang.parse(text)) == tree
+
+
+def test_precedence_in_sql():
+    assert compiled("id = 1 OR salary = 2 AND boss_id = 3") == (
+        '("id" = %s) OR (("salary" = %s) AND ("boss_id" = %s))', [1, 2, 3])
+    assert compiled("(id = 1 OR salary = 2) AND boss_id = 3") == (
+        '(("id" = %s) OR ("salary" = %s)) AND ("boss_id" = %s)', [1, 2, 3])
+
+
+# Кавычки и значения без кавычек
+
+@pytest.mark.parametrize("text, value", [
+    ("full_name = 'O''Brien'", "O'Brien"),
+    ('full_name = "Say ""hi"""', 'Say "hi"'),
+    ("position = 'Тимлид AND co'", "Тимлид AND co"),
+    ("position = Старший разработчик", "Старший разработчик"),
+    ("position = ''", ""),
+    ("position = '(x)'", "(x)"),
+    ("hire_date = '2023-01-31'", date(2023, 1, 31)),
+    ("hire_date = 2023-01-31", date(2023, 1, 31)),
+    ("salary = '100'", 100),
+])
+def test_quoting(text, value):
+    node = filter_lang.parse(text)
+    assert node.value == value
+
+
+def test_unquoted_value_stops_at_keyword():
+    node = filter_lang.parse("position = Старший разработчик AND salary > 1")
+    assert describe(node) == ("And", [("position", "=", "Старший разработчик"), ("salary", ">", 1)])
+
+
+def test_not_equal_spellings():
+    assert filter_lang.parse("salary <> 1").op == "!="
+    assert filter_lang.parse("salary != 1").op == "!="
+
+
+# SQL и порядок параметров каждого оператора
+
+@pytest.mark.parametrize("text, expected_sql, params", [
+    ("salary = 1", '"e"."salary" = %s', [1]),
+    ("salary != 1", '"e"."salary" != %s', [1]),
+    ("salary > 1", '"e"."salary" > %s', [1]),
+    ("salary < 1", '"e"."salary" < %s', [1]),
+    ("salary >= 1", '"e"."salary" >= %s', [1]),
+    ("salary <= 1", '"e"."salary" <= %s', [1]),
+    ("position IN ('A', 'B')", '"e"."position" = ANY(%s)', [["A", "B"]]),
+    ("position NOT IN (A)", 'NOT ("e"."position" = ANY(%s))', [["A"]]),
+    ("hire_date BETWEEN 2023-01-01 AND 2023-12-31", '"e"."hire_date" BETWEEN %s AND %s',
+     [date(2023, 1, 1), date(2023, 12, 31)]),
+    ("salary NOT BETWEEN 5 AND 10", '"e"."salary" NOT BETWEEN %s AND %s', [5, 10]),
+    ("full_name LIKE 'Ив%'", '"e"."full_name" LIKE %s', ["Ив%"]),
+    ("full_name NOT LIKE 'Ив%'", '"e"."full_name" NOT LIKE %s', ["Ив%"]),
+    ("full_name ILIKE '%ов'", '"e"."full_name" ILIKE %s', ["%ов"]),
+    ("full_name NOT ILIKE '%ов'", '"e"."full_name" NOT ILIKE %s', ["%ов"]),
+    ("boss_id IS NULL", '"e"."boss_id" IS NULL', []),
+    ("boss_id IS NOT NULL", '"e"."boss_id" IS NOT NULL', []),
+    ("under(2)", '"e"."path" <@ (SELECT path FROM employees WHERE id = %s) AND "e"."id" <> %s', [2, 2]),
+    ("NOT salary = 1", 'NOT ("e"."salary" = %s)', [1]),
+])
+def test_operator_sql(text, expected_sql, params):
+    assert compiled(text, "e") == (expected_sql, params)
+
+
+def test_without_alias():
+    assert compiled("salary > 1") == ('"salary" > %s', [1])
+
+
+def test_params_follow_sql_order():
+    text = ("salary > 1 AND (position IN ('a', 'b') OR hire_date BETWEEN 2023-01-01 AND 2023-12-31)"
+            " AND NOT full_name LIKE 'x%' AND under(7)")
+    condition, params = compiled(text, "e")
+    assert condition == (
+        '("e"."salary" > %s) AND (("e"."position" = ANY(%s)) OR ("e"."hire_date" BETWEEN %s AND %s))'
+        ' AND (NOT ("e"."full_name" LIKE %s))'
+        ' AND ("e"."path" <@ (SELECT path FROM employees WHERE id = %s) AND "e"."id" <> %s)')
+    assert params == [1, ["a", "b"], date(2023, 1, 1), date(2023, 12, 31), "x%", 7, 7]
+
+
+def test_parse_all():
+    assert filter_lang.parse_all([]) is None
+    assert describe(filter_lang.parse_all(["salary > 1"])) == ("salary", ">", 1)
+    assert describe(filter_lang.parse_all(["salary > 1", "id = 2 OR id = 3"])) == (
+        "And", [("salary", ">", 1), ("Or", [("id", "=", 2), ("id", "=", 3)])])
+
+
+# matches() дает тот же результат, что и условие SQL
+
+COLUMNS = ["id", "full_name", "position", "hire_date", "salary", "boss_id"]
+ROWS = [
+    (1, "Иванов Иван", "CEO", date(2010, 5, 1), 900000, None),
+    (2, "Петрова Анна", "Менеджер", date(2015, 3, 15), 400000, 1),
+    (3, "ivanov ivan", "Тимлид", date(2023, 1, 1), 250000, 2),
+    (4, "O'Brien", "Старший разработчик", date(2023, 12, 31), 250001, 3),
+    (5, "Сидоров_Петр", "Разработчик", date(2024, 2, 29), 120000, 3),
+    (6, "100% Иванов", "Разработчик", date(2023, 6, 15), 250000, 4),
+]
+
+EXPRESSIONS = [
+    "salary = 250000",
+    "salary != 250000",
+    "salary > 250000",
+    "salary < 250000",
+    "salary >= 250000",
+    "salary <= 250000",
+    "boss_id = 3",
+    "boss_id != 3",
+    "NOT boss_id = 3",
+    "boss_id IS NULL",
+    "boss_id IS NOT NULL",
+    "boss_id IN (1, 3)",
+    "boss_id NOT IN (1, 3)",
+    "position IN ('Разработчик', CEO)",
+    "hire_date BETWEEN 2023-01-01 AND 2023-12-31",
+    "hire_date NOT BETWEEN 2023-01-01 AND 2023-12-31",
+    "boss_id BETWEEN 2 AND 3",
+    "boss_id NOT BETWEEN 2 AND 3",
+    "full_name LIKE 'Иванов%'",
+    "full_name LIKE '%ivan'",
+    "full_name NOT LIKE '%Иванов%'",
+    "full_name LIKE 'Сидоров_Петр'",
+    "full_name LIKE '_______'",
+    "full_name LIKE '100%'",
+    "full_name ILIKE 'IVANOV%'",
+    "full_name ILIKE 'иванов%'",
+    "full_name NOT ILIKE '%иван%'",
+    "position = Старший разработчик",
+    "salary > 200000 AND boss_id = 3 OR position = CEO",
+    "NOT (boss_id = 3 OR boss_id IS NULL)",
+    "boss_id > 2 OR salary > 500000",
+    "NOT boss_id > 2 AND salary < 500000",
+    "NOT (boss_id > 2 AND salary < 300000)",
+]
+
+
+def sqlite_matches(text):
+    """ID строк, для которых условие SQL истинно; условие выполняется в SQLite.
+
+    Отличия диалекта заменяются эквивалентами: = ANY(массив) - IN (...), ILIKE - LIKE по строкам
+    в нижнем регистре (LIKE с учетом регистра, как в PostgreSQL).
+    """
+    condition, params = compiled(text, "e")
+    values = []
+    pieces = condition.split("%s")
+    query = pieces[0]
+    for piece, param in zip(pieces[1:], params):
+        if isinstance(param, list):
+            query = query[:-len("= ANY(")] + "IN (" + ", ".join("?" * len(param)) + piece
+            values.extend(param)
+        else:
+            query += "?" + piece
+            values.append(param.isoformat() if isinstance(param, date) else param)
+    if " ILIKE " in query:
+        column, _, rest = query.partition(" NOT ILIKE " if " NOT ILIKE " in query else " ILIKE ")
+        negated = "NOT " if " NOT ILIKE " in condition else ""
+        query = f"py_lower({column}) {negated}LIKE py_lower{rest.replace('?', '(?)', 1)}"
+
+    connection = sqlite3.connect(":memory:")
+    connection.execute("PRAGMA case_sensitive_like = ON")
+    connection.create_function("py_lower", 1, lambda value: None if value is None else value.lower())
+    connection.execute("CREATE TABLE employees (id, full_name, position, hire_date, salary, boss_id)")
+    connection.executemany("INSERT INTO employees VALUES (?, ?, ?, ?, ?, ?)",
+                           [row[:3] + (row[3].isoformat(),) + row[4:] for row in ROWS])
+    return [row[0] for row in connection.execute(f"SELECT id FROM employees e WHERE {query} ORDER BY id", values)]
+
+
+@pytest.mark.parametrize("text", EXPRESSIONS)
+def test_matches_agrees_with_sql(text):
+    node = filter_lang.parse(text)
+    expected = sqlite_matches(text)
+    assert [row[0] for row in filter_lang.filter_rows(node, ROWS, COLUMNS)] == expected
+
+
+def test_matches_null_is_unknown():
+    context = filter_lang.RowContext(COLUMNS, ROWS)
+    assert filter_lang.parse("boss_id = 3").matches(ROWS[0], context) is None
+    assert filter_lang.parse("NOT boss_id = 3").matches(ROWS[0], context) is None
+    assert filter_lang.parse("boss_id = 3 OR salary > 1").matches(ROWS[0], context) is True
+    assert filter_lang.parse("boss_id = 3 AND salary < 1").matches(ROWS[0], context) is False
+
+
+def test_under_matches_subordinates():
+    node = filter_lang.parse("under(2)")
+    assert [row[0] for row in filter_lang.filter_rows(node, ROWS, COLUMNS)] == [3, 4, 5, 6]
+    assert not filter_lang.is_row_local(node)
+    assert not filter_lang.is_row_local(filter_lang.parse("salary > 1 AND NOT under(2)"))
+    assert filter_lang.is_row_local(filter_lang.parse("salary > 1 OR boss_id IS NULL"))
+
+
+def test_simple_conditions():
+    assert filter_lang.simple_conditions(None) == []
+    assert filter_lang.simple_conditions(filter_lang.parse_all(["salary > 1 AND id = 2", "boss_id != 3"])) == [
+        ("salary", ">", 1), ("id", "=", 2), ("boss_id", "!=", 3)]
+    assert filter_lang.simple_conditions(filter_lang.parse("salary > 1 OR id = 2")) is None
+    assert filter_lang.simple_conditions(filter_lang.parse("salary > 1 AND boss_id IS NULL")) is None
+
+
+# Сообщения об ошибках
+
+@pytest.mark.parametrize("text, message", [
+    ("", "пустое выражение"),
+    ("   ", "пустое выражение"),
+    ("salary", "неожиданный конец выражения, ожидалось оператор"),
+    ("salary >", "неожиданный конец выражения, ожидалось значение"),
+    ("salary = 1 AND", "неожиданный конец выражения, ожидалось условие"),
+    ("(salary = 1", "неожиданный конец выражения, ожидалось ')'"),
+    ("salary IN (1, 2", "неожиданный конец выражения, ожидалось ')'"),
+    ("salary = 1)", "лишний текст в позиции 11: ')'"),
+    ("foo = 1", "некорректное поле фильтра: foo (допустимы: id, full_name, position, hire_date, salary, boss_id)"),
+    ("AND salary = 1", "ожидалось поле в позиции 1, найдено 'AND'"),
+    ("salary = abc", "некорректное числовое значение для salary: abc"),
+    ("hire_date = 2023-13-01", "некорректная дата для hire_date (формат ГГГГ-ММ-ДД): 2023-13-01"),
+    ("salary LIKE '1%'", "LIKE применим только к текстовым полям, а не к salary"),
+    ("salary ~ 1", "ожидался оператор после salary в позиции 8, найдено '~'"),
+    ("salary NOT = 1", "ожидался оператор после salary в позиции 12, найдено '='"),
+    ("salary IS 1", "ожидалось NULL в позиции 11, найдено '1'"),
+    ("salary IN 1", "ожидалось '(' после IN в позиции 11, найдено '1'"),
+    ("salary BETWEEN 1 OR 2", "ожидалось AND в BETWEEN в позиции 18, найдено 'OR'"),
+    ("salary = AND", "ожидалось значение salary в позиции 10, найдено 'AND'"),
+    ("under 2", "ожидалось '(' после under в позиции 7, найдено '2'"),
+    ("position = 'abc", "непонятный символ в позиции 12: \"'abc\""),
+])
+def test_errors(text, message):
+    with pytest.raises(FilterError) as error:
+        filter_lang.parse(text)
+    assert str(error.value) == message
+
+
+def test_filter_error_is_value_error():
+    assert issubclass(FilterError, ValueError)
@@ -0,0 +1,67 @@
+import base64
+import json
+from datetime import date
+
+import pytest
+
+from employees_cli import EMPLOYEE_COLUMNS, decode_page_cursor, encode_page_cursor
+
+
+def make_token(key):
+    """Токен в формате encode_page_cursor из произвольного значения"""
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+ROWS = [
+    (1, "Иванов Иван Иванович", "CEO", date(2015, 1, 31), 1000000, None),
+    (42, "Smith John", "Team Lead", date(2020, 2, 29), 250000, 7),
+    (100500, "", "Developer", date(1999, 12, 1), 0, 2),
+]
+
+
+@pytest.mark.parametrize("row", ROWS)
+@pytest.mark.parametrize("sort_by", EMPLOYEE_COLUMNS)
+def test_round_trip(sort_by, row):
+    token = encode_page_cursor(sort_by, row, EMPLOYEE_COLUMNS)
+    assert "=" not in token
+    assert decode_page_cursor(token, sort_by) == (row[EMPLOYEE_COLUMNS.index(sort_by)], row[0])
+
+
+def test_round_trip_keeps_date_type():
+    token = encode_page_cursor("hire_date", ROWS[1], EMPLOYEE_COLUMNS)
+    value, last_id = decode_page_cursor(token, "hire_date")
+    assert type(value) is date and value == date(2020, 2, 29)
+    assert last_id == 42
+
+
+def test_round_trip_null_boss():
+    token = encode_page_cursor("boss_id", ROWS[0], EMPLOYEE_COLUMNS)
+    assert decode_page_cursor(token, "boss_id") == (None, 1)
+
+
+def test_other_sort_column_rejected(capsys):
+    token = encode_page_cursor("salary", ROWS[1], EMPLOYEE_COLUMNS)
+    assert decode_page_cursor(token, "hire_date") is None
+    assert "по salary, а не по hire_date" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("token", [
+    "",
+    "не base64",
+    "!!!!",
+    base64.urlsafe_b64encode(b"\xff\xfe").decode("ascii"),
+    make_token("salary"),
+    make_token(["salary", 100]),
+    make_token(["salary", 100, 5, 6]),
+    make_token({"sort": "salary"}),
+    make_token(["hire_date", {"day": "2020-01-01"}, 5]),
+    make_token(["hire_date", {"date": "2020-13-01"}, 5]),
+    make_token(["hire_date", {"date": 20200101}, 5]),
+    make_token(["hire_date", {"date": "2020-01-01"}, "5"]),
+    make_token(["salary", 100, 5.5]),
+    make_token(["salary", 100, None]),
+    make_token(["salary", 100, True]),
+])
+def test_malformed_token(token, capsys):
+    assert decode_page_cursor(token, "hire_date") is None
+    assert "Некорректный курсор страницы" in capsys.readouterr().out
@@ -0,0 +1,236 @@
+from functools import cmp_to_key
+
+import pytest
+
+from result_cache import ResultCache, ResultEntry, compare_rows, sort_rows, split_pages
+
+# Строки (id, значение): значение - колонка сортировки с индексом 1
+ROWS = [(1, 30), (2, None), (3, 10), (4, 30), (5, None), (6, 20), (7, 10)]
+
+
+def ids(rows):
+    return [row[0] for row in rows]
+
+
+@pytest.mark.parametrize("descending, expected", [
+    # По возрастанию NULL - последние, по убыванию - первые; при равных значениях - по id
+    (False, [3, 7, 6, 1, 4, 2, 5]),
+    (True, [2, 5, 1, 4, 6, 3, 7]),
+])
+def test_sort_rows_nulls_and_ties(descending, expected):
+    assert ids(sort_rows(list(reversed(ROWS)), 1, descending)) == expected
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_compare_rows_matches_sort_rows(descending):
+    by_compare = sorted(ROWS, key=cmp_to_key(lambda a, b: compare_rows(a, b, 1, descending)))
+    assert by_compare == sort_rows(ROWS, 1, descending)
+    for a in ROWS:
+        assert compare_rows(a, a, 1, descending) == 0
+
+
+def test_text_sorts_by_code_points():
+    # Порядок COLLATE "C": латиница, Ё, прописные, строчные - как сравнение строк Python
+    rows = [(1, "Яковлев"), (2, "авдеев"), (3, "Ёлкин"), (4, "Zimin"), (5, "Авдеев"), (6, "Ерохин")]
+    assert ids(sort_rows(rows, 1, False)) == [4, 3, 5, 6, 1, 2]
+    assert ids(sort_rows(rows, 1, True)) == [2, 1, 6, 5, 3, 4]
+    assert compare_rows((3, "Ёлкин"), (6, "Ерохин"), 1, False) == -1
+
+
+def test_sort_by_id_column():
+    assert ids(sort_rows(ROWS, 0, True)) == [7, 6, 5, 4, 3, 2, 1]
+
+
+def test_split_pages():
+    assert split_pages(list(range(5)), 2) == {0: [0, 1], 1: [2, 3], 2: [4]}
+    assert split_pages([], 2) == {}
+
+
+def test_is_complete_and_all_rows():
+    entry = ResultEntry()
+    assert not entry.is_complete(2)  # Количество еще не получено
+    entry.total = 5
+    entry.pages.update({0: [1, 2], 2: [5]})
+    assert not entry.is_complete(2)
+    entry.pages[1] = [3, 4]
+    assert entry.is_complete(2)
+    assert entry.all_rows(2) == [1, 2, 3, 4, 5]
+    assert ResultEntry(0).is_complete(2)
+
+
+def test_cache_lru():
+    cache = ResultCache(max_entries=2)
+    first, second, third = ResultEntry(1), ResultEntry(2), ResultEntry(3)
+    cache.put("a", first)
+    cache.put("b", second)
+    assert cache.get("a") is first  # "a" становится последним использованным
+    cache.put("c", third)
+    assert cache.get("b") is None
+    assert cache.get("a") is first and cache.get("c") is third
+    assert (cache.hits, cache.misses) == (3, 1)
+    cache.invalidate()
+    assert cache.get("a") is None
+
+
+def test_make_key_hashes_list_params():
+    key = ResultCache.make_key("e.position = ANY(%s)", [["A", "B"]], "e.salary", "DESC")
+    assert key == ("e.position = ANY(%s)", (("A", "B"),), "e.salary", "DESC")
+    hash(key)
+    assert ResultCache.make_key(None, None, None, "ASC") == (None, (), None, "ASC")
+
+
+def test_find_complete_same_filter_any_sort():
+    cache = ResultCache()
+    partial = ResultEntry(3, {0: [(1, "a"), (2, "b")]})
+    complete = ResultEntry(3, {0: [(1, "a"), (2, "b")], 1: [(3, "c")]})
+    cache.put(ResultCache.make_key("e.salary > %s", [1], "e.id", "ASC"), complete)
+    cache.put(ResultCache.make_key("e.salary > %s", [1], "e.full_name", "DESC"), partial)
+    assert cache.find_complete("e.salary > %s", (1,), 2) is complete
+    assert cache.find_complete("e.salary > %s", [2], 2) is None
+    assert cache.find_complete(None, None, 2) is None
+
+
+# Обновление загруженных страниц на месте (runs, set_runs, insert_row, remove_row)
+
+PAGE_SIZE = 2
+SORTED = [(1, 10), (2, 20), (3, 30), (4, 40), (5, 50), (6, 60), (7, 70)]
+
+
+def make_entry(rows, pages):
+    """Результат из упорядоченных строк, в котором загружены страницы pages"""
+    return ResultEntry(len(rows), {page: rows[page * PAGE_SIZE:(page + 1) * PAGE_SIZE] for page in pages})
+
+
+def page_ids(entry):
+    return {page: ids(rows) for page, rows in entry.pages.items()}
+
+
+def test_runs_joins_adjacent_pages():
+    entry = make_entry(SORTED, [0, 1, 3])
+    runs = entry.runs(PAGE_SIZE)
+    assert [(start, ids(rows)) for start, rows in runs] == [(0, [1, 2, 3, 4]), (6, [7])]
+    runs[0][1].append((9, 99))  # Участки - копии, страницы не меняются
+    assert page_ids(entry) == {0: [1, 2], 1: [3, 4], 3: [7]}
+
+
+def test_set_runs_keeps_whole_pages_and_last_page():
+    entry = make_entry(SORTED, [])
+    pages = entry.pages
+    entry.set_runs([[1, SORTED[1:4]], [4, SORTED[4:]]], PAGE_SIZE)
+    # Участок с середины страницы 0 не дает страницу 0; неполная страница 3 - последняя в результате
+    assert page_ids(entry) == {1: [3, 4], 2: [5, 6], 3: [7]}
+    assert entry.pages is pages  # Словарь изменяется на месте
+
+    entry.set_runs([[0, SORTED[:3]]], PAGE_SIZE)
+    assert page_ids(entry) == {0: [1, 2]}  # Неполная страница 1 не последняя - не сохраняется
+
+
+def test_insert_inside_run_shifts_later_runs():
+    entry = make_entry(SORTED, [0, 1, 3])
+    assert entry.insert_row((8, 35), 1, False, PAGE_SIZE)
+    assert entry.total == 8
+    # Строка 7 сдвинулась на индекс 7, а строка 6 на индексе 6 не загружена - страница 3 отбрасывается
+    assert page_ids(entry) == {0: [1, 2], 1: [3, 8]}
+
+
+def test_insert_at_result_start():
+    entry = make_entry(SORTED, [0])
+    assert entry.insert_row((0, 5), 1, False, PAGE_SIZE)
+    assert page_ids(entry) == {0: [0, 1]}
+
+
+def test_insert_before_run_in_unloaded_part():
+    entry = make_entry(SORTED, [1, 2])
+    assert entry.insert_row((9, 15), 1, False, PAGE_SIZE)
+    # Порядок: 1 2 9 3 4 5 6 7 - загруженными остаются строки 3-6 с индексами 3-6
+    assert entry.total == 8
+    assert page_ids(entry) == {2: [4, 5]}
+
+
+def test_insert_at_result_end_completes_last_page():
+    entry = make_entry(SORTED, [2, 3])
+    assert entry.insert_row((8, 80), 1, False, PAGE_SIZE)
+    assert page_ids(entry) == {2: [5, 6], 3: [7, 8]}
+
+
+def test_insert_after_run_in_unloaded_part():
+    entry = make_entry(SORTED, [0])
+    assert entry.insert_row((8, 80), 1, False, PAGE_SIZE)
+    assert entry.total == 8
+    assert page_ids(entry) == {0: [1, 2]}
+
+
+def test_insert_and_remove_need_total():
+    entry = ResultEntry(None, {0: SORTED[:2]})
+    assert not entry.insert_row((8, 80), 1, False, PAGE_SIZE)
+    assert not entry.remove_row(SORTED[0], 1, False, PAGE_SIZE)
+
+
+@pytest.mark.parametrize("descending, row, expected", [
+    # По возрастанию NULL - в конце (между собой по id), по убыванию - в начале
+    (False, (5, None), [1, 6, 3, 4, 5]),
+    (False, (0, None), [1, 6, 0, 3, 4]),
+    (True, (5, None), [3, 4, 5, 6, 1]),
+    (True, (0, None), [0, 3, 4, 6, 1]),
+    (True, (8, 15), [3, 4, 6, 8, 1]),
+])
+def test_insert_nulls(descending, row, expected):
+    rows = sort_rows([(1, 10), (3, None), (4, None), (6, 20)], 1, descending)
+    entry = make_entry(rows, [0, 1])
+    assert entry.insert_row(row, 1, descending, PAGE_SIZE)
+    assert ids(entry.all_rows(PAGE_SIZE)) == expected
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_insert_and_remove_keep_complete_result_sorted(descending):
+    rows = sort_rows(ROWS, 1, descending)
+    for new_row in [(0, None), (8, None), (9, 10), (10, 5), (11, 30), (12, 99)]:
+        entry = make_entry(rows, range(4))
+        assert entry.insert_row(new_row, 1, descending, PAGE_SIZE)
+        assert entry.is_complete(PAGE_SIZE)
+        assert entry.all_rows(PAGE_SIZE) == sort_rows(rows + [new_row], 1, descending)
+    for old_row in rows:
+        entry = make_entry(rows, range(4))
+        assert entry.remove_row(old_row, 1, descending, PAGE_SIZE)
+        assert entry.is_complete(PAGE_SIZE)
+        assert entry.all_rows(PAGE_SIZE) == [row for row in rows if row != old_row]
+
+
+def test_remove_from_run():
+    entry = make_entry(SORTED, [0, 1, 2, 3])
+    assert entry.remove_row((3, 30), 1, False, PAGE_SIZE)
+    assert entry.total == 6
+    assert page_ids(entry) == {0: [1, 2], 1: [4, 5], 2: [6, 7]}
+
+
+def test_remove_last_row_drops_last_page():
+    entry = make_entry(SORTED, [0, 1, 2, 3])
+    assert entry.remove_row((7, 70), 1, False, PAGE_SIZE)
+    assert page_ids(entry) == {0: [1, 2], 1: [3, 4], 2: [5, 6]}
+
+
+def test_remove_before_run_in_unloaded_part():
+    entry = make_entry(SORTED, [2, 3])
+    assert entry.remove_row((2, 20), 1, False, PAGE_SIZE)
+    # Порядок: 1 3 4 5 6 7 - строки 6 и 7 теперь на индексах 4 и 5
+    assert entry.total == 6
+    assert page_ids(entry) == {2: [6, 7]}
+
+
+def test_remove_after_runs_in_unloaded_part():
+    entry = make_entry(SORTED, [0])
+    assert entry.remove_row((5, 50), 1, False, PAGE_SIZE)
+    assert entry.total == 6
+    assert page_ids(entry) == {0: [1, 2]}
+
+
+@pytest.mark.parametrize("pages, row", [
+    ([0], (0, 5)),  # Строка была бы первой в результате, но первая страница загружена без нее
+    ([0, 1], (9, 25)),  # Строка была бы внутри загруженного участка
+])
+def test_remove_missing_row_needs_reload(pages, row):
+    entry = make_entry(SORTED, pages)
+    before = page_ids(entry)
+    assert not entry.remove_row(row, 1, False, PAGE_SIZE)
+    assert entry.total == 7
+    assert page_ids(entry) == before